@@ -2,6 +2,11 @@ import os
 import sys
 import psycopg
 
+# Lock-aware DDL executor lives with the migration tooling in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', '..', 'scripts'))
+from online_ddl import OnlinePolicy, execute_online, set_lock_timeout
+from sql_lexer import split_statements
+
 DB_URL = os.getenv("DATABASE_URL") or os.getenv("DATABASE_DIRECT_URL")
 if not DB_URL:
     print("ERROR: DATABASE_URL (or DATABASE_DIRECT_URL) not set", file=sys.stderr)
@@ -40,32 +45,44 @@ def index_exists(cur) -> bool:
     )
     return cur.fetchone() is not None
 
+def apply(conn, sql: str, policy: OnlinePolicy) -> dict:
+    """Run one DDL statement with lock_timeout retries; the FK and index are built without blocking writes."""
+    outcome = execute_online(conn, split_statements(sql)[0], policy)
+    if outcome.error is not None:
+        raise outcome.error
+    return {"retries": outcome.retries, "lock_wait_ms": round(outcome.lock_wait_ms, 1)}
+
+policy = OnlinePolicy()
+
 with psycopg.connect(DB_URL) as conn:
-    conn.execute("BEGIN")
     with conn.cursor() as cur:
-        added_column = False
-        added_fk = False
-        added_index = False
-
-        if not column_exists(cur):
-            cur.execute("ALTER TABLE public.skills ADD COLUMN apparatus_id integer NULL")
-            added_column = True
+        need_column = not column_exists(cur)
+        need_fk = not fk_exists(cur)
+        need_index = not index_exists(cur)
+    conn.commit()
 
-        if not fk_exists(cur):
-            # Name the constraint deterministically
-            cur.execute(
-                "ALTER TABLE public.skills ADD CONSTRAINT skills_apparatus_id_fkey FOREIGN KEY (apparatus_id) REFERENCES public.apparatus(id) ON DELETE SET NULL"
-            )
-            added_fk = True
+    # Each change is its own short transaction, so a long-running transaction on
+    # skills or apparatus costs a retry instead of queueing traffic behind us
+    set_lock_timeout(conn, policy)
+    locks = {}
+    if need_column:
+        locks["column"] = apply(conn, "ALTER TABLE public.skills ADD COLUMN apparatus_id integer NULL", policy)
 
-        if not index_exists(cur):
-            cur.execute("CREATE INDEX idx_skills_apparatus_id ON public.skills(apparatus_id)")
-            added_index = True
+    if need_fk:
+        # Name the constraint deterministically
+        locks["fk"] = apply(
+            conn,
+            "ALTER TABLE public.skills ADD CONSTRAINT skills_apparatus_id_fkey FOREIGN KEY (apparatus_id) REFERENCES public.apparatus(id) ON DELETE SET NULL",
+            policy,
+        )
 
-    conn.execute("COMMIT")
+    if need_index:
+        locks["index"] = apply(conn, "CREATE INDEX idx_skills_apparatus_id ON public.skills(apparatus_id)", policy)
+    set_lock_timeout(conn, None)
 
     print({
-        "added_column": added_column,
-        "added_fk": added_fk,
-        "added_index": added_index,
+        "added_column": need_column,
+        "added_fk": need_fk,
+        "added_index": need_index,
+        "lock_waits": locks,
     })
@@ -1,8 +1,35 @@
+import hashlib
 import json
 import os
 import re
 import sys
-from typing import Dict, List, Set
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bump when the index layout changes so stale on-disk caches are rebuilt
+INDEX_VERSION = 1
+
+# One alternation per token kind; comments and whitespace are matched so they can be skipped
+TOKEN_RE = re.compile(
+    r"""
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+    |(?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+    |(?P<template>`(?:[^`\\]|\\.)*`)
+    |(?P<name>[A-Za-z_$][\w$]*)
+    |(?P<number>\d[\w.]*)
+    |(?P<punct>=>|\.\.\.|[^\s])
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+REGEX_LITERAL_RE = re.compile(r"/(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*")
+
+# A '/' after one of these starts a regex literal rather than a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};') | {'=>', 'return'}
+
+OPENERS = {'(': ')', '{': '}', '[': ']'}
+CLOSERS = set(OPENERS.values())
+
+Token = Tuple[str, str]
 
 
 def load_snapshot(path: str) -> Dict:
@@ -10,70 +37,221 @@ def load_snapshot(path: str) -> Dict:
         return json.load(f)
 
 
-def read_shared_schema(path: str) -> str:
-    with open(path, 'r', encoding='utf-8') as f:
-        return f.read()
+def tokenize(ts: str) -> List[Token]:
+    """Split TypeScript source into (kind, value) tokens in a single sweep, dropping comments."""
+    tokens: List[Token] = []
+    pos = 0
+    end = len(ts)
+    while pos < end:
+        if ts[pos] == '/' and (not tokens or tokens[-1][1] in REGEX_PRECEDERS):
+            m = REGEX_LITERAL_RE.match(ts, pos)
+            if m:
+                tokens.append(('regex', m.group()))
+                pos = m.end()
+                continue
+        m = TOKEN_RE.match(ts, pos)
+        kind = m.lastgroup
+        if kind != 'skip':
+            value = m.group()
+            if kind == 'string':
+                value = value[1:-1]
+            tokens.append((kind, value))
+        pos = m.end()
+    return tokens
 
 
-def find_table_block(ts: str, table: str) -> str | None:
-    # Deterministically locate pgTable('<table>', { ... }) and return the content inside { ... }
-    needle_single = f"pgTable('{table}'"
-    needle_double = f'pgTable("{table}"'
-    idx = ts.find(needle_single)
-    if idx == -1:
-        idx = ts.find(needle_double)
-    if idx == -1:
-        return None
-    # Find the first '{' after this point
-    start_brace = ts.find('{', idx)
-    if start_brace == -1:
-        return None
-    # Brace matching to find the corresponding '}'
+def _matching(tokens: List[Token], i: int) -> int:
+    """Index of the bracket closing the one at tokens[i]."""
     depth = 0
-    end_brace = -1
-    for i in range(start_brace, len(ts)):
-        c = ts[i]
-        if c == '{':
+    for j in range(i, len(tokens)):
+        kind, value = tokens[j]
+        if kind != 'punct':
+            continue
+        if value in OPENERS:
             depth += 1
-        elif c == '}':
+        elif value in CLOSERS:
             depth -= 1
             if depth == 0:
-                end_brace = i
-                break
-    if end_brace == -1:
+                return j
+    return len(tokens) - 1
+
+
+def _literal(token: Token) -> Any:
+    kind, value = token
+    if kind == 'number':
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    if kind == 'name' and value in ('true', 'false', 'null'):
+        return json.loads(value)
+    return value
+
+
+def _parse_options(tokens: List[Token]) -> Dict[str, Any]:
+    """Simple `key: literal` pairs of an options object such as { length: 255 }."""
+    options: Dict[str, Any] = {}
+    for k in range(len(tokens) - 2):
+        if tokens[k][0] in ('name', 'string') and tokens[k + 1] == ('punct', ':'):
+            options[tokens[k][1]] = _literal(tokens[k + 2])
+    return options
+
+
+def _parse_column(key: str, expr: List[Token]) -> Optional[Dict[str, Any]]:
+    """Interpret `typeFn("col", {...}).modifier(...)...` as a column entry."""
+    if len(expr) < 3 or expr[0][0] != 'name' or expr[1] != ('punct', '('):
+        return None
+    type_fn = expr[0][1]
+    close = _matching(expr, 1)
+    args = expr[2:close]
+    # Without a name argument drizzle uses the property key as the column name
+    column = args[0][1] if args and args[0][0] == 'string' else key
+    options: Dict[str, Any] = {}
+    if ('punct', '{') in args:
+        k = args.index(('punct', '{'))
+        options = _parse_options(args[k + 1:_matching(args, k)])
+
+    entry: Dict[str, Any] = {
+        'column': column,
+        'key': key,
+        'type': type_fn,
+        'enum': None,
+        'options': options,
+        'modifiers': [],
+        'default': None,
+        'references': None,
+    }
+    k = close + 1
+    while k + 1 < len(expr):
+        if expr[k] == ('punct', '.') and expr[k + 1][0] == 'name':
+            modifier = expr[k + 1][1]
+            entry['modifiers'].append(modifier)
+            k += 2
+            if k < len(expr) and expr[k] == ('punct', '('):
+                call_end = _matching(expr, k)
+                call = expr[k + 1:call_end]
+                if modifier == 'default' and len(call) == 1:
+                    entry['default'] = _literal(call[0])
+                elif modifier == 'references' and ('punct', '=>') in call:
+                    target = call[call.index(('punct', '=>')) + 1:]
+                    entry['references'] = ''.join(v for _, v in target[:3])
+                k = call_end + 1
+        else:
+            k += 1
+    return entry
+
+
+def _parse_table_columns(tokens: List[Token], start: int, end: int) -> Dict[str, Dict[str, Any]]:
+    """Columns of the object literal spanning tokens[start..end] (the braces themselves)."""
+    columns: Dict[str, Dict[str, Any]] = {}
+    k = start + 1
+    while k < end:
+        kind, key = tokens[k]
+        if kind not in ('name', 'string') or tokens[k + 1] != ('punct', ':'):
+            k += 1
+            continue
+        # The value runs to the next top-level ',' or the closing brace
+        expr_start = j = k + 2
+        while j < end and tokens[j] != ('punct', ','):
+            j = _matching(tokens, j) + 1 if tokens[j][0] == 'punct' and tokens[j][1] in OPENERS else j + 1
+        entry = _parse_column(key, tokens[expr_start:j])
+        if entry is not None:
+            columns.setdefault(entry.pop('column'), entry)
+        k = j + 1
+    return columns
+
+
+def build_index(ts: str) -> Dict[str, Any]:
+    """
+    Index every pgTable / pgEnum in one sweep over the token stream:
+    {"tables": {table: {"const": ..., "columns": {column: {...}}}}, "enums": {pg_name: const}}.
+    """
+    tokens = tokenize(ts)
+    enum_consts: Dict[str, str] = {}
+    tables: Dict[str, Dict[str, Any]] = {}
+    i = 0
+    n = len(tokens)
+    while i < n - 3:
+        kind, value = tokens[i]
+        if kind != 'name' or tokens[i + 1] != ('punct', '(') or tokens[i + 2][0] != 'string':
+            i += 1
+            continue
+        const = tokens[i - 2][1] if i >= 2 and tokens[i - 1] == ('punct', '=') else None
+        if value == 'pgEnum' and const:
+            enum_consts[const] = tokens[i + 2][1]
+        elif value == 'pgTable' and tokens[i + 3] == ('punct', ',') and i + 4 < n and tokens[i + 4] == ('punct', '{'):
+            end = _matching(tokens, i + 4)
+            table = tokens[i + 2][1]
+            if table not in tables:
+                tables[table] = {'const': const, 'columns': _parse_table_columns(tokens, i + 4, end)}
+            i = end
+        i += 1
+    # Enums may be declared after the tables using them, so resolve once everything is seen
+    for table in tables.values():
+        for column in table['columns'].values():
+            column['enum'] = enum_consts.get(column['type'])
+    return {'tables': tables, 'enums': {pg: const for const, pg in enum_consts.items()}}
+
+
+def _read_index_cache(cache_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
         return None
-    # Return content inside braces
-    return ts[start_brace + 1:end_brace]
+    return cached if cached.get('version') == INDEX_VERSION else None
+
 
+def load_shared_index(path: str, cache_path: Optional[str]) -> Dict[str, Any]:
+    """
+    Index of `path`, reusing the on-disk cache when the file's mtime and size
+    are unchanged, or (after a touch/checkout) when its content hash matches.
+    The cache is only rewritten when the index had to be rebuilt.
+    """
+    st = os.stat(path)
+    cached = _read_index_cache(cache_path) if cache_path else None
+    if cached and cached['mtime_ns'] == st.st_mtime_ns and cached['size'] == st.st_size:
+        return cached['index']
 
-def extract_columns_from_block(block: str) -> Set[str]:
-    # Find occurrences of typeFn("col") where typeFn is one of supported types
-    pattern = re.compile(
-        r"\b(?:text|integer|serial|timestamp|time|date|boolean|decimal|json|varchar)\s*\(\s*['\"]([a-zA-Z0-9_]+)['\"]",
-        re.DOTALL,
-    )
-    cols: Set[str] = set(m.group(1) for m in pattern.finditer(block))
-    return cols
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    if cached and cached['sha256'] == digest:
+        return cached['index']
+    index = build_index(raw.decode('utf-8'))
+    if cache_path:
+        # The cache is an optimisation only; an unwritable location just means re-parsing next time
+        try:
+            tmp = f'{cache_path}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'mtime_ns': st.st_mtime_ns, 'size': st.st_size,
+                           'sha256': digest, 'index': index}, f)
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            print(f'Warning: could not write index cache {cache_path}: {e}', file=sys.stderr)
+    return index
 
 
 def main():
     repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     snapshot_path = os.getenv('SNAPSHOT', os.path.join(repo_root, 'attached_assets', '_live_schema_snapshot.json'))
-    shared_path = os.path.join(repo_root, 'shared', 'schema.ts')
+    shared_path = os.getenv('SHARED_SCHEMA', os.path.join(repo_root, 'shared', 'schema.ts'))
+    # Kept next to the schema it indexes; set SHARED_INDEX_CACHE to an empty string to always re-parse
+    cache_path = os.getenv('SHARED_INDEX_CACHE', os.path.join(os.path.dirname(shared_path), '_shared_schema_index.json'))
 
     data = load_snapshot(snapshot_path)
-    ts = read_shared_schema(shared_path)
+    index = load_shared_index(shared_path, cache_path or None)
 
     tables = sorted(data.get('tables', {}).keys())
     missing_tables_in_shared: List[str] = []
     column_diffs: Dict[str, Dict[str, List[str]]] = {}
 
     for t in tables:
-        block = find_table_block(ts, t)
-        if not block:
+        shared_table = index['tables'].get(t)
+        if not shared_table:
             missing_tables_in_shared.append(t)
             continue
-        shared_cols = extract_columns_from_block(block)
+        shared_cols = set(shared_table['columns'])
         live_cols = {c['column_name'] for c in data['tables'][t]['columns']}
         missing_in_shared = sorted(list(live_cols - shared_cols))
         missing_in_live = sorted(list(shared_cols - live_cols))
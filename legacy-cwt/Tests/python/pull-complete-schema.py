@@ -1,11 +1,15 @@
 import os
 import sys
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
 
 from dotenv import load_dotenv
-import psycopg2
-import psycopg2.extras
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row, tuple_row
+
+# Aim the sample at roughly this many heap pages so big tables are never scanned
+SAMPLE_PAGES = 8
 
 
 def get_db_url() -> str:
@@ -16,70 +20,119 @@ def get_db_url() -> str:
     return url
 
 
-def fetch_tables(conn) -> List[str]:
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = 'public' AND table_type='BASE TABLE'
-            ORDER BY table_name;
-            """
-        )
-        return [r[0] for r in cur.fetchall()]
-
-
-def fetch_columns(conn, table: str) -> List[Dict[str, Any]]:
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT column_name, data_type, is_nullable, column_default
-            FROM information_schema.columns
-            WHERE table_schema = 'public' AND table_name = %s
-            ORDER BY ordinal_position;
-            """,
-            (table,),
+TABLES_QUERY = """
+    SELECT c.relname, c.relpages, has_table_privilege(c.oid, 'SELECT')
+    FROM pg_class c
+    WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname;
+"""
+
+COLUMNS_QUERY = """
+    SELECT table_name, column_name, data_type, is_nullable, column_default
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+    ORDER BY table_name, ordinal_position;
+"""
+
+
+def fetch_metadata(conn) -> Tuple[List[Tuple[str, int, bool]], Dict[str, List[Dict[str, Any]]]]:
+    """Tables (name, relpages, readable) and every table's columns, in a single pipelined round trip."""
+    with conn.pipeline():
+        tables_cur = conn.cursor(row_factory=tuple_row)
+        columns_cur = conn.cursor(row_factory=tuple_row)
+        tables_cur.execute(TABLES_QUERY)
+        columns_cur.execute(COLUMNS_QUERY)
+        tables = tables_cur.fetchall()
+        column_rows = columns_cur.fetchall()
+
+    columns: Dict[str, List[Dict[str, Any]]] = {}
+    for r in column_rows:
+        columns.setdefault(r[0], []).append(
+            {
+                "column_name": r[1],
+                "data_type": r[2],
+                "is_nullable": r[3],
+                "column_default": None if r[4] is None else str(r[4]),
+            }
         )
-        rows = cur.fetchall()
-        cols = []
-        for r in rows:
-            cols.append(
-                {
-                    "column_name": r[0],
-                    "data_type": r[1],
-                    "is_nullable": r[2],
-                    "column_default": None if r[3] is None else str(r[3]),
-                }
-            )
-        return cols
-
-
-def fetch_sample_record(conn, table: str) -> Dict[str, Any] | None:
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+    return tables, columns
+
+
+def sample_query(table: str, relpages: int) -> sql.Composed:
+    percent = min(100.0, 100.0 * SAMPLE_PAGES / max(relpages, 1))
+    return sql.SQL("SELECT * FROM public.{} TABLESAMPLE SYSTEM ({}) REPEATABLE (0) LIMIT 1").format(
+        sql.Identifier(table), sql.Literal(percent)
+    )
+
+
+def first_row_query(table: str) -> sql.Composed:
+    """Fallback for a sample that picked no page: on big tables the percentage can round to nothing."""
+    return sql.SQL("SELECT * FROM public.{} LIMIT 1").format(sql.Identifier(table))
+
+
+def fetch_sample_record(conn, query: sql.Composed) -> Optional[Dict[str, Any]]:
+    with conn.cursor(row_factory=dict_row) as cur:
         try:
-            cur.execute(f"SELECT * FROM public.{table} LIMIT 1;")
+            cur.execute(query)
             rec = cur.fetchone()
             return dict(rec) if rec else None
         except Exception:
             return None
 
 
+def fetch_sample_records(conn, tables: List[Tuple[str, int, bool]]) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Yield (table, sample) in table order as results arrive.
+
+    All sample queries go out in one pipeline. An error aborts the rest of the
+    pipeline, so the tables still pending are then sampled one at a time. A
+    table whose sample comes back empty is read with a plain LIMIT 1.
+    """
+    # Tables we cannot read get no query (and would otherwise abort the pipeline)
+    pending = [(name, sample_query(name, relpages) if readable else None) for name, relpages, readable in tables]
+    done = 0
+    try:
+        with conn.pipeline():
+            cursors = []
+            for name, query in pending:
+                cur = None
+                if query is not None:
+                    cur = conn.cursor(row_factory=dict_row)
+                    cur.execute(query)
+                cursors.append((name, cur))
+            for name, cur in cursors:
+                sample = None
+                if cur is not None:
+                    rec = cur.fetchone()
+                    sample = dict(rec) if rec else fetch_sample_record(conn, first_row_query(name))
+                done += 1
+                yield name, sample
+    except psycopg.Error:
+        for name, query in pending[done:]:
+            sample = None
+            if query is not None:
+                sample = fetch_sample_record(conn, query) or fetch_sample_record(conn, first_row_query(name))
+            yield name, sample
+
+
+def write_schema(conn, out: TextIO) -> None:
+    """Stream the schema document to `out`, one table at a time."""
+    tables, columns = fetch_metadata(conn)
+    out.write('{\n  "tables": {')
+    first = True
+    for name, sample in fetch_sample_records(conn, tables):
+        entry = {"columns": columns.get(name, []), "sample_record": sample}
+        body = json.dumps(entry, indent=2, default=str).replace("\n", "\n    ")
+        out.write(("\n" if first else ",\n") + f"    {json.dumps(name)}: {body}")
+        out.flush()
+        first = False
+    out.write(("\n  },\n" if not first else "},\n") + f'  "timestamp": {json.dumps(os.getenv("SCHEMA_SNAPSHOT_TIME"))}\n}}\n')
+
+
 def main():
     url = get_db_url()
-    conn = psycopg2.connect(url)
-    try:
-        tables = fetch_tables(conn)
-        data = {"tables": {}, "timestamp": os.getenv("SCHEMA_SNAPSHOT_TIME")}
-        for t in tables:
-            cols = fetch_columns(conn, t)
-            sample = fetch_sample_record(conn, t)
-            data["tables"][t] = {
-                "columns": cols,
-                "sample_record": sample,
-            }
-        print(json.dumps(data, indent=2, default=str))
-    finally:
-        conn.close()
+    with psycopg.connect(url, autocommit=True) as conn:
+        write_schema(conn, sys.stdout)
 
 
 if __name__ == "__main__":
@@ -22,7 +22,9 @@ def get_bookings_columns() -> List[Dict[str, str]]:
 		with conn.cursor() as cur:
 			cur.execute(
 				"""
-				SELECT column_name, data_type, is_nullable, column_default
+				SELECT column_name,
+					CASE WHEN data_type = 'USER-DEFINED' THEN udt_name ELSE data_type END,
+					is_nullable, column_default
 				FROM information_schema.columns
 				WHERE table_schema = 'public' AND table_name = 'bookings'
 				ORDER BY ordinal_position;
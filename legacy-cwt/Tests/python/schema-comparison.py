@@ -7,23 +7,17 @@ from typing import Dict, Any
 from dotenv import load_dotenv
 
 
-REQUIRED_COLUMNS = {
-	"session_confirmation_email_sent": {
-		"data_type": "boolean",
-		"is_nullable": "NO",
-		"default_contains": "false",
-	},
-	"session_confirmation_email_sent_at": {
-		# In Postgres/Supabase, timestamptz shows as 'timestamp with time zone'
-		# timestamp without tz shows as 'timestamp without time zone'
-		# We'll accept either here and let the attached schema be the source of truth for tz decision
-		"data_type_any_of": [
-			"timestamp with time zone",
-			"timestamp without time zone",
-		],
-		"is_nullable": "YES",
-	},
-}
+# Column contracts shared with scripts/check_schema_contracts.py, which checks the whole schema
+# in one query; this script checks a single table's columns piped in from pull-supabase-schema.py
+CONTRACTS_PATH = os.getenv(
+	"SCHEMA_CONTRACTS",
+	os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "attached_assets", "schema_contracts.json"),
+)
+
+
+def load_required_columns(table: str) -> Dict[str, Any]:
+	with open(CONTRACTS_PATH, "r", encoding="utf-8") as f:
+		return json.load(f).get(table, {})
 
 
 def read_supabase_schema_json(path: str) -> Dict[str, Any]:
@@ -58,43 +52,29 @@ def parse_attached_schema_txt(path: str) -> Dict[str, Any]:
 
 
 def compare(cols_json: Dict[str, Any]) -> int:
+	table = cols_json.get("table", "bookings")
+	required = load_required_columns(table)
 	columns = {c["column_name"]: c for c in cols_json.get("columns", [])}
 	failures = []
 
-	# bookings.session_confirmation_email_sent
-	sent = columns.get("session_confirmation_email_sent")
-	if not sent:
-		failures.append("Missing column: session_confirmation_email_sent")
-	else:
-		if sent.get("data_type") != REQUIRED_COLUMNS["session_confirmation_email_sent"]["data_type"]:
-			failures.append(
-				f"session_confirmation_email_sent data_type expected 'boolean' got '{sent.get('data_type')}'"
-			)
-		if sent.get("is_nullable") != REQUIRED_COLUMNS["session_confirmation_email_sent"]["is_nullable"]:
-			failures.append(
-				f"session_confirmation_email_sent is_nullable expected 'NO' got '{sent.get('is_nullable')}'"
-			)
-		default = (sent.get("column_default") or "").lower()
-		if "default_contains" in REQUIRED_COLUMNS["session_confirmation_email_sent"]:
-			if "false" not in default:
-				failures.append(
-					f"session_confirmation_email_sent default should include 'false' got '{sent.get('column_default')}'"
-				)
-
-	# bookings.session_confirmation_email_sent_at
-	sent_at = columns.get("session_confirmation_email_sent_at")
-	if not sent_at:
-		failures.append("Missing column: session_confirmation_email_sent_at")
-	else:
-		allowed = set(REQUIRED_COLUMNS["session_confirmation_email_sent_at"]["data_type_any_of"])  # type: ignore
-		if sent_at.get("data_type") not in allowed:
-			failures.append(
-				f"session_confirmation_email_sent_at data_type expected one of {sorted(allowed)} got '{sent_at.get('data_type')}'"
-			)
-		if sent_at.get("is_nullable") != REQUIRED_COLUMNS["session_confirmation_email_sent_at"]["is_nullable"]:
-			failures.append(
-				f"session_confirmation_email_sent_at is_nullable expected 'YES' got '{sent_at.get('is_nullable')}'"
-			)
+	for name, expected in sorted(required.items()):
+		col = columns.get(name)
+		if not col:
+			failures.append(f"Missing column: {name}")
+			continue
+		if "data_type" in expected:
+			allowed = expected["data_type"] if isinstance(expected["data_type"], list) else [expected["data_type"]]
+			if col.get("data_type") not in allowed:
+				failures.append(f"{name} data_type expected one of {sorted(allowed)} got '{col.get('data_type')}'")
+		if "nullable" in expected:
+			want = "YES" if expected["nullable"] else "NO"
+			if col.get("is_nullable") != want:
+				failures.append(f"{name} is_nullable expected '{want}' got '{col.get('is_nullable')}'")
+		default = col.get("column_default")
+		if "default" in expected and default != expected["default"]:
+			failures.append(f"{name} default expected '{expected['default']}' got '{default}'")
+		if "default_contains" in expected and expected["default_contains"].lower() not in (default or "").lower():
+			failures.append(f"{name} default should include '{expected['default_contains']}' got '{default}'")
 
 	if failures:
 		print("Schema parity check: FAIL")
@@ -102,7 +82,7 @@ def compare(cols_json: Dict[str, Any]) -> int:
 			print(f"- {f}")
 		return 1
 	else:
-		print("Schema parity check: PASS — bookings has both session confirmation columns with expected shapes")
+		print(f"Schema parity check: PASS — {table} matches its {len(required)} column contracts")
 		return 0
 
 
@@ -4,13 +4,57 @@ Comprehensive Database Schema Analyzer
 Extracts complete schema information from PostgreSQL database to match Drizzle schema
 """
 
+import argparse
+import hashlib
 import os
 import psycopg2
 import json
+import re
+import sys
+import time
+from functools import lru_cache
 from dotenv import load_dotenv
 
+# Indexed snapshot reader lives with the schema tooling in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'))
+from snapshot_file import MAGIC as SNAPSHOT_MAGIC, SnapshotFile
+
 load_dotenv()
 
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated_schema.ts')
+
+# Bump when generate_drizzle_table_definition / map_postgres_to_drizzle_type
+# change so cached table definitions are regenerated
+CODEGEN_VERSION = 1
+
+SCHEMA_HEADER = '''import { relations } from "drizzle-orm";
+import { boolean, date, decimal, integer, json, jsonb, pgEnum, pgTable, serial, text, time, timestamp, varchar, uuid, bigserial, bigint } from "drizzle-orm/pg-core";
+import { createInsertSchema } from "drizzle-zod";
+import { z } from "zod";
+
+'''
+
+# Standard PostgreSQL types -> Drizzle types
+TYPE_MAPPING = {
+    'integer': 'integer',
+    'bigint': 'bigint',
+    'serial': 'serial',
+    'bigserial': 'bigserial',
+    'text': 'text',
+    'character varying': 'varchar',
+    'varchar': 'varchar',
+    'boolean': 'boolean',
+    'timestamp without time zone': 'timestamp',
+    'timestamp with time zone': 'timestamp',
+    'date': 'date',
+    'time without time zone': 'time',
+    'numeric': 'decimal',
+    'json': 'json',
+    'jsonb': 'jsonb',
+    'uuid': 'uuid',
+    'ARRAY': 'text' # Handle arrays as text for now
+}
+
 def get_database_connection():
     """Get database connection using DIRECT_DATABASE_URL"""
     try:
@@ -20,124 +64,80 @@ def get_database_connection():
         print(f"Database connection error: {e}")
         return None
 
-def get_all_tables(cursor):
-    """Get all user tables (excluding system tables)"""
-    cursor.execute("""
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public' 
-        AND table_type = 'BASE TABLE'
-        ORDER BY table_name;
-    """)
-    return [row[0] for row in cursor.fetchall()]
-
-def get_table_columns(cursor, table_name):
-    """Get detailed column information for a table"""
-    cursor.execute("""
-        SELECT 
-            column_name,
-            data_type,
-            is_nullable,
-            column_default,
-            character_maximum_length,
-            numeric_precision,
-            numeric_scale,
-            udt_name
-        FROM information_schema.columns 
-        WHERE table_schema = 'public' 
-        AND table_name = %s
-        ORDER BY ordinal_position;
-    """, (table_name,))
-    
-    columns = []
-    for row in cursor.fetchall():
-        column_info = {
-            'name': row[0],
-            'data_type': row[1],
-            'is_nullable': row[2] == 'YES',
-            'default': row[3],
-            'max_length': row[4],
-            'precision': row[5],
-            'scale': row[6],
-            'udt_name': row[7]
-        }
-        columns.append(column_info)
-    
-    return columns
-
-def get_primary_keys(cursor, table_name):
-    """Get primary key columns for a table"""
-    cursor.execute("""
-        SELECT column_name
-        FROM information_schema.table_constraints tc
-        JOIN information_schema.key_column_usage kcu 
-            ON tc.constraint_name = kcu.constraint_name
-        WHERE tc.table_schema = 'public'
-        AND tc.table_name = %s
-        AND tc.constraint_type = 'PRIMARY KEY';
-    """, (table_name,))
-    
-    return [row[0] for row in cursor.fetchall()]
-
-def get_foreign_keys(cursor, table_name):
-    """Get foreign key relationships for a table"""
-    cursor.execute("""
-        SELECT 
-            kcu.column_name,
-            ccu.table_name AS referenced_table,
-            ccu.column_name AS referenced_column
-        FROM information_schema.table_constraints AS tc 
-        JOIN information_schema.key_column_usage AS kcu
-            ON tc.constraint_name = kcu.constraint_name
-        JOIN information_schema.constraint_column_usage AS ccu
-            ON ccu.constraint_name = tc.constraint_name
-        WHERE tc.table_schema = 'public'
-        AND tc.table_name = %s
-        AND tc.constraint_type = 'FOREIGN KEY';
-    """, (table_name,))
-    
-    foreign_keys = {}
-    for row in cursor.fetchall():
-        foreign_keys[row[0]] = {
-            'referenced_table': row[1],
-            'referenced_column': row[2]
-        }
-    
-    return foreign_keys
-
-def get_unique_constraints(cursor, table_name):
-    """Get unique constraints for a table"""
-    cursor.execute("""
-        SELECT column_name
-        FROM information_schema.table_constraints tc
-        JOIN information_schema.key_column_usage kcu 
-            ON tc.constraint_name = kcu.constraint_name
-        WHERE tc.table_schema = 'public'
-        AND tc.table_name = %s
-        AND tc.constraint_type = 'UNIQUE';
-    """, (table_name,))
-    
-    return [row[0] for row in cursor.fetchall()]
-
-def get_enums(cursor):
-    """Get all custom enum types"""
-    cursor.execute("""
-        SELECT 
-            t.typname as enum_name,
-            array_agg(e.enumlabel ORDER BY e.enumsortorder) as enum_values
-        FROM pg_type t 
-        JOIN pg_enum e ON t.oid = e.enumtypid  
-        JOIN pg_catalog.pg_namespace n ON n.oid = t.typnamespace
-        WHERE n.nspname = 'public'
-        GROUP BY t.typname
-        ORDER BY t.typname;
-    """)
-    
-    enums = {}
-    for row in cursor.fetchall():
-        enums[row[0]] = row[1]
-    
-    return enums
+# Every table's columns, keys and the enums in one round trip. Columns still come
+# from information_schema (in a single scan) so max_length/precision/scale keep
+# the values map_postgres_to_drizzle_type expects; keys come from pg_constraint.
+CATALOG_QUERY = """
+    WITH rels AS (
+        SELECT c.oid, c.relname
+        FROM pg_class c
+        WHERE c.relnamespace = 'public'::regnamespace
+        AND c.relkind IN ('r', 'p')
+    ),
+    cols AS (
+        SELECT
+            table_name,
+            json_agg(json_build_object(
+                'name', column_name,
+                'data_type', data_type,
+                'is_nullable', is_nullable = 'YES',
+                'default', column_default,
+                'max_length', character_maximum_length,
+                'precision', numeric_precision,
+                'scale', numeric_scale,
+                'udt_name', udt_name
+            ) ORDER BY ordinal_position) AS columns
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+        GROUP BY table_name
+    ),
+    keys AS (
+        SELECT
+            con.conrelid,
+            coalesce(json_agg(DISTINCT a.attname) FILTER (WHERE con.contype = 'p'), '[]') AS primary_keys,
+            coalesce(json_agg(DISTINCT a.attname) FILTER (WHERE con.contype = 'u'), '[]') AS unique_columns,
+            coalesce(json_object_agg(a.attname, json_build_object(
+                'referenced_table', fr.relname,
+                'referenced_column', fa.attname
+            )) FILTER (WHERE con.contype = 'f'), '{}') AS foreign_keys
+        FROM pg_constraint con
+        JOIN rels r ON r.oid = con.conrelid
+        CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(attnum, fattnum)
+        JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+        LEFT JOIN pg_class fr ON fr.oid = con.confrelid
+        LEFT JOIN pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.fattnum
+        WHERE con.contype IN ('p', 'u', 'f')
+        GROUP BY con.conrelid
+    )
+    SELECT json_build_object(
+        'enums', coalesce((
+            SELECT json_object_agg(t.typname, (
+                SELECT json_agg(e.enumlabel ORDER BY e.enumsortorder)
+                FROM pg_enum e
+                WHERE e.enumtypid = t.oid
+            ) ORDER BY t.typname)
+            FROM pg_type t
+            WHERE t.typnamespace = 'public'::regnamespace
+            AND t.typtype = 'e'
+        ), '{}'),
+        'tables', coalesce((
+            SELECT json_object_agg(r.relname, json_build_object(
+                'columns', coalesce(cols.columns, '[]'),
+                'primary_keys', coalesce(keys.primary_keys, '[]'),
+                'foreign_keys', coalesce(keys.foreign_keys, '{}'),
+                'unique_columns', coalesce(keys.unique_columns, '[]')
+            ) ORDER BY r.relname)
+            FROM rels r
+            LEFT JOIN cols ON cols.table_name = r.relname
+            LEFT JOIN keys ON keys.conrelid = r.oid
+        ), '{}')
+    );
+"""
+
+def load_catalog(cursor):
+    """Load enums and every table's columns, primary/foreign keys and unique columns in one query"""
+    cursor.execute(CATALOG_QUERY)
+    return cursor.fetchone()[0]
 
 def map_postgres_to_drizzle_type(column_info, enums):
     """Map PostgreSQL data types to Drizzle ORM types"""
@@ -148,28 +148,9 @@ def map_postgres_to_drizzle_type(column_info, enums):
     if udt_name in enums:
         return f"{udt_name}Enum(\"{column_info['name']}\")"
     
-    # Map standard PostgreSQL types to Drizzle types
-    type_mapping = {
-        'integer': 'integer',
-        'bigint': 'bigserial' if 'nextval' in (column_info['default'] or '') else 'bigint',
-        'serial': 'serial',
-        'bigserial': 'bigserial',
-        'text': 'text',
-        'character varying': 'varchar',
-        'varchar': 'varchar',
-        'boolean': 'boolean',
-        'timestamp without time zone': 'timestamp',
-        'timestamp with time zone': 'timestamp',
-        'date': 'date',
-        'time without time zone': 'time',
-        'numeric': 'decimal',
-        'json': 'json',
-        'jsonb': 'jsonb',
-        'uuid': 'uuid',
-        'ARRAY': 'text' # Handle arrays as text for now
-    }
-    
-    base_type = type_mapping.get(data_type, 'text')
+    base_type = TYPE_MAPPING.get(data_type, 'text')
+    if base_type == 'bigint' and 'nextval' in (column_info['default'] or ''):
+        base_type = 'bigserial'
     
     # Handle specific cases
     if base_type == 'serial' and 'nextval' in (column_info['default'] or ''):
@@ -255,96 +236,296 @@ def camel_case(snake_str):
     components = snake_str.split('_')
     return components[0] + ''.join(word.capitalize() for word in components[1:])
 
-def analyze_complete_schema():
+def table_structure_hash(table_name, table, enums):
+    """Hash of everything generate_drizzle_table_definition reads for one table"""
+    enum_columns = sorted(c['udt_name'] for c in table['columns'] if c['udt_name'] in enums)
+    payload = json.dumps([CODEGEN_VERSION, table_name, table, enum_columns], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def load_codegen_cache(path):
+    """Per-table cache: {table_name: {"hash": ..., "definition": ...}}"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_codegen_cache(path, cache):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def generate_table_definitions(catalog, cache):
+    """
+    Drizzle definitions for every table, reusing cached output for tables whose
+    structure hash is unchanged. Returns (definitions, new cache, regenerated tables).
+    """
+    enums = catalog['enums']
+    definitions = []
+    new_cache = {}
+    regenerated = []
+    for table_name, table in sorted(catalog['tables'].items()):
+        digest = table_structure_hash(table_name, table, enums)
+        cached = cache.get(table_name)
+        if cached and cached.get('hash') == digest:
+            definition = cached['definition']
+        else:
+            definition = generate_drizzle_table_definition(
+                table_name, table['columns'], table['primary_keys'], table['foreign_keys'],
+                table['unique_columns'], enums
+            )
+            regenerated.append(table_name)
+        new_cache[table_name] = {'hash': digest, 'definition': definition}
+        definitions.append(definition)
+    return definitions, new_cache, regenerated
+
+def render_schema_module(enums, definitions):
+    schema_output = []
+
+    # Add enum definitions first
+    if enums:
+        schema_output.append("// Custom PostgreSQL Enums")
+        for enum_name, values in enums.items():
+            values_str = ', '.join([f'"{v}"' for v in values])
+            schema_output.append(f'export const {enum_name}Enum = pgEnum("{enum_name}", [{values_str}]);')
+        schema_output.append('')
+
+    return SCHEMA_HEADER + '\n'.join(schema_output + definitions)
+
+def print_table_details(table_name, table):
+    columns = table['columns']
+    print(f"\n--- {table_name} ---")
+    print(f"Columns ({len(columns)}):")
+    for col in columns:
+        nullable = "NULL" if col['is_nullable'] else "NOT NULL"
+        default = f" DEFAULT {col['default']}" if col['default'] else ""
+        print(f"  {col['name']}: {col['data_type']} {nullable}{default}")
+
+    print(f"Primary Keys: {table['primary_keys']}")
+    print(f"Foreign Keys: {table['foreign_keys']}")
+    print(f"Unique Constraints: {table['unique_columns']}")
+
+# Last content written per output path, so repeated runs in one process skip re-reading it
+_written = {}
+
+def write_if_changed(path, content):
+    """Write `content` unless the file already holds it, so watchers only fire on real changes"""
+    if _written.get(path) == content:
+        return False
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                _written[path] = content
+                return False
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    _written[path] = content
+    return True
+
+def emit_schema(catalog, output_path, cache, cache_path=None):
+    """Generate and write the Drizzle module for `catalog`; returns the refreshed per-table cache"""
+    tables = catalog['tables']
+    definitions, new_cache, regenerated = generate_table_definitions(catalog, cache)
+
+    # Only tables whose structure changed since the last run are re-analyzed
+    print("\n=== Detailed Table Analysis ===")
+    for table_name in regenerated:
+        print_table_details(table_name, tables[table_name])
+    print(f"\nRegenerated {len(regenerated)} table(s), {len(tables) - len(regenerated)} unchanged (cached)")
+
+    print("\n=== Writing Complete Schema ===")
+    changed = write_if_changed(output_path, render_schema_module(catalog['enums'], definitions))
+    if cache_path and (regenerated or set(cache) != set(new_cache)):
+        save_codegen_cache(cache_path, new_cache)
+
+    print(f"Complete schema {'written to' if changed else 'unchanged at'}: {output_path}")
+    return new_cache
+
+def analyze_complete_schema(output_path=DEFAULT_OUTPUT, cache_path=None):
     """Main function to analyze complete database schema"""
     print("=== Complete Database Schema Analysis ===")
-    
+    started = time.perf_counter()
+
     conn = get_database_connection()
     if not conn:
         return
-    
+
     try:
         cursor = conn.cursor()
-        
-        # Get all enums first
-        print("Analyzing custom enums...")
-        enums = get_enums(cursor)
+
+        print("Loading catalog...")
+        catalog = load_catalog(cursor)
+        enums = catalog['enums']
+        tables = catalog['tables']
+
         print(f"Found {len(enums)} custom enums:")
         for enum_name, values in enums.items():
             print(f"  {enum_name}: {values}")
-        
-        # Get all tables
-        print("\nAnalyzing tables...")
-        tables = get_all_tables(cursor)
-        print(f"Found {len(tables)} tables:")
+
+        print(f"\nFound {len(tables)} tables:")
         for table in tables:
             print(f"  {table}")
-        
-        # Analyze each table in detail
-        print("\n=== Detailed Table Analysis ===")
-        
-        schema_output = []
-        
-        # Add enum definitions first
-        if enums:
-            schema_output.append("// Custom PostgreSQL Enums")
-            for enum_name, values in enums.items():
-                values_str = ', '.join([f'"{v}"' for v in values])
-                schema_output.append(f'export const {enum_name}Enum = pgEnum("{enum_name}", [{values_str}]);')
-            schema_output.append('')
-        
-        for table_name in tables:
-            print(f"\n--- {table_name} ---")
-            
-            # Get detailed info
-            columns = get_table_columns(cursor, table_name)
-            primary_keys = get_primary_keys(cursor, table_name)
-            foreign_keys = get_foreign_keys(cursor, table_name)
-            unique_columns = get_unique_constraints(cursor, table_name)
-            
-            print(f"Columns ({len(columns)}):")
-            for col in columns:
-                nullable = "NULL" if col['is_nullable'] else "NOT NULL"
-                default = f" DEFAULT {col['default']}" if col['default'] else ""
-                print(f"  {col['name']}: {col['data_type']} {nullable}{default}")
-            
-            print(f"Primary Keys: {primary_keys}")
-            print(f"Foreign Keys: {foreign_keys}")
-            print(f"Unique Constraints: {unique_columns}")
-            
-            # Generate Drizzle definition
-            table_def = generate_drizzle_table_definition(
-                table_name, columns, primary_keys, foreign_keys, unique_columns, enums
-            )
-            schema_output.append(table_def)
-        
-        # Write complete schema to file
-        print("\n=== Writing Complete Schema ===")
-        
-        # Read current schema header (imports, etc.)
-        schema_header = '''import { relations } from "drizzle-orm";
-import { boolean, date, decimal, integer, json, jsonb, pgEnum, pgTable, serial, text, time, timestamp, varchar, uuid, bigserial, bigint } from "drizzle-orm/pg-core";
-import { createInsertSchema } from "drizzle-zod";
-import { z } from "zod";
 
-'''
-        
-        complete_schema = schema_header + '\n'.join(schema_output)
-        
-        with open('/workspaces/coach-will-gymnastics-clean/generated_schema.ts', 'w') as f:
-            f.write(complete_schema)
-        
-        print("Complete schema written to: generated_schema.ts")
+        emit_schema(catalog, output_path, load_codegen_cache(cache_path), cache_path)
+
+        print(f"Done in {time.perf_counter() - started:.2f}s")
         print("\nReview the generated schema and replace your shared/schema.ts content")
         print("This will ensure your Drizzle schema exactly matches your database!")
-        
+
     except Exception as e:
         print(f"Analysis error: {e}")
         import traceback
         traceback.print_exc()
-    
+
     finally:
         conn.close()
 
+def read_schema_document(path):
+    """
+    Schema document from a snapshot written by scripts/update_schema_file.py:
+    either the indexed .snapshot file or the plain-text export.
+    """
+    with open(path, 'rb') as f:
+        is_snapshot = f.readline().rstrip(b'\n') == SNAPSHOT_MAGIC
+    if is_snapshot:
+        with SnapshotFile(path) as snapshot:
+            return snapshot.load()
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    marker = 'DETAILED SCHEMA DATA:'
+    idx = text.find(marker)
+    if idx == -1:
+        raise RuntimeError(f'{path} is neither a schema snapshot nor a schema text export')
+    json_part = text[idx + len(marker):]
+    return json.loads(json_part[json_part.find('{'):])
+
+def snapshot_column(column):
+    """Snapshot column -> the information_schema-shaped dict map_postgres_to_drizzle_type expects"""
+    data_type = column['data_type']
+    max_length = precision = scale = None
+    # Length/precision only live in the formatted type, e.g. "character varying(255)" or "numeric(10,2)"
+    match = re.search(r'\((\d+)(?:,(\d+))?\)$', column.get('formatted_type') or '')
+    if match and data_type in ('character varying', 'character'):
+        max_length = int(match.group(1))
+    elif match and data_type == 'numeric':
+        precision = int(match.group(1))
+        scale = int(match.group(2) or 0)
+    # Documents without nullability (name + type exports) must not turn every column NOT NULL
+    nullable = column.get('is_nullable', True)
+    return {
+        'name': column['column_name'],
+        'data_type': data_type,
+        'is_nullable': nullable is True or nullable == 'YES',
+        'default': column.get('column_default'),
+        'max_length': max_length,
+        'precision': precision,
+        'scale': scale,
+        'udt_name': column.get('udt_name') or data_type,
+    }
+
+def snapshot_table(table):
+    """Snapshot table -> columns plus primary/foreign keys and unique columns, as load_catalog returns them"""
+    primary_keys, unique_columns, foreign_keys = [], [], {}
+    for con in table.get('constraints', []):
+        columns = con.get('columns') or []
+        if con['type'] == 'PRIMARY KEY':
+            primary_keys.extend(columns)
+        elif con['type'] == 'UNIQUE':
+            unique_columns.extend(columns)
+        elif con['type'] == 'FOREIGN KEY':
+            match = re.search(r'REFERENCES\s+(.+?)\(([^)]*)\)', con.get('definition') or '')
+            if not match:
+                continue
+            ref_table = match.group(1).split('.')[-1].strip('"')
+            ref_columns = [c.strip().strip('"') for c in match.group(2).split(',')]
+            for col, ref_col in zip(columns, ref_columns):
+                foreign_keys[col] = {'referenced_table': ref_table, 'referenced_column': ref_col}
+    return {
+        'columns': [snapshot_column(c) for c in table.get('columns', [])],
+        'primary_keys': sorted(set(primary_keys)),
+        'foreign_keys': foreign_keys,
+        'unique_columns': sorted(set(unique_columns)),
+    }
+
+def check_types_resolved(path, catalog, has_enums):
+    """
+    Refuse documents whose user-defined column types cannot be resolved, rather
+    than silently generating them as text. Without an enums section any type
+    the mapping does not know may be an enum (the plain-text export stores
+    e.g. bookings.status as "booking_status").
+    """
+    enums = catalog['enums']
+    for table_name, table in catalog['tables'].items():
+        for column in table['columns']:
+            if column['data_type'] == 'USER-DEFINED':
+                unresolved = column['udt_name'] not in enums
+            else:
+                unresolved = not has_enums and column['data_type'] not in TYPE_MAPPING
+            if unresolved:
+                raise RuntimeError(
+                    f"{path}: cannot resolve type {column['udt_name']} of {table_name}.{column['name']}"
+                    + ('' if has_enums else ' (the document has no enums section)')
+                    + '; regenerate the snapshot with scripts/update_schema_file.py')
+
+@lru_cache(maxsize=8)
+def _snapshot_catalog(path, mtime_ns, size):
+    data = read_schema_document(path)
+    catalog = {
+        'enums': dict(sorted((data.get('enums') or {}).items())),
+        'tables': {name: snapshot_table(t) for name, t in sorted(data['tables'].items()) if t.get('exists', True)},
+    }
+    check_types_resolved(path, catalog, 'enums' in data)
+    return catalog
+
+def load_snapshot_catalog(path):
+    """Catalog in load_catalog's shape from a snapshot file, memoized on the file's mtime and size"""
+    st = os.stat(path)
+    return _snapshot_catalog(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+def codegen_from_snapshot(snapshot_path, output_path=DEFAULT_OUTPUT, cache_path=None, watch=False, interval=1.0):
+    """Generate the Drizzle module from a saved snapshot with no database access"""
+    cache = load_codegen_cache(cache_path)
+    last_catalog = None
+    while True:
+        started = time.perf_counter()
+        catalog = load_snapshot_catalog(snapshot_path)
+        if catalog is not last_catalog:
+            print(f"=== Drizzle codegen from {snapshot_path} ===")
+            print(f"Found {len(catalog['enums'])} custom enums and {len(catalog['tables'])} tables")
+            cache = emit_schema(catalog, output_path, cache, cache_path)
+            print(f"Done in {time.perf_counter() - started:.3f}s")
+            last_catalog = catalog
+        if not watch:
+            return
+        time.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate Drizzle table definitions from the live database schema.')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Generated schema path (default: scripts/generated_schema.ts)')
+    parser.add_argument('--cache', help='Per-table codegen cache (default: <output>.cache.json)')
+    parser.add_argument('--no-cache', action='store_true', help='Regenerate every table and do not write the cache')
+    parser.add_argument('--from-snapshot', metavar='PATH',
+                        help='Generate from a schema snapshot (.snapshot, or a .txt export that has enums) from update_schema_file.py without connecting')
+    parser.add_argument('--watch', action='store_true', help='With --from-snapshot, regenerate whenever the snapshot changes')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between snapshot checks in --watch mode')
+    args = parser.parse_args()
+
+    cache_path = None if args.no_cache else (args.cache or f'{args.output}.cache.json')
+    if args.from_snapshot:
+        try:
+            codegen_from_snapshot(args.from_snapshot, args.output, cache_path, args.watch, args.interval)
+        except KeyboardInterrupt:
+            pass
+        except RuntimeError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(2)
+    elif args.watch:
+        parser.error('--watch requires --from-snapshot')
+    else:
+        analyze_complete_schema(args.output, cache_path)
+
 if __name__ == "__main__":
-    analyze_complete_schema()
+    main()
@@ -0,0 +1,176 @@
+-- =====================================================================
+-- Stage 2 (part 2): Make tenant_id NOT NULL on the remaining tables
+-- Adds foreign keys and adjusts unique constraints to be per-tenant.
+--
+-- Run after stage2-add-tenant-id-remaining-tables.sql and a completed
+-- python scripts/tenant_backfill.py; SET NOT NULL fails on any row the
+-- backfill has not reached yet.
+-- =====================================================================
+
+-- 1. Set NOT NULL constraints after backfill -------------------------
+
+ALTER TABLE skills ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE focus_areas ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE apparatus ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE waivers ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE archived_waivers ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE availability ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE booking_athletes ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE booking_focus_areas ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE athlete_skills ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE athlete_skill_videos ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE skills_prerequisites ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE skill_components ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE testimonials ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE site_faqs ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE site_content ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE admins ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE parent_auth_codes ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE slot_reservations ALTER COLUMN tenant_id SET NOT NULL;
+ALTER TABLE blog_email_signups ALTER COLUMN tenant_id SET NOT NULL;
+
+-- 2. Add foreign key constraints ---------------------------------------
+
+ALTER TABLE skills 
+ADD CONSTRAINT skills_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE focus_areas 
+ADD CONSTRAINT focus_areas_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE apparatus 
+ADD CONSTRAINT apparatus_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE waivers 
+ADD CONSTRAINT waivers_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE archived_waivers 
+ADD CONSTRAINT archived_waivers_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE availability 
+ADD CONSTRAINT availability_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE booking_athletes 
+ADD CONSTRAINT booking_athletes_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE booking_focus_areas 
+ADD CONSTRAINT booking_focus_areas_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE athlete_skills 
+ADD CONSTRAINT athlete_skills_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE athlete_skill_videos 
+ADD CONSTRAINT athlete_skill_videos_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE skills_prerequisites 
+ADD CONSTRAINT skills_prerequisites_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE skill_components 
+ADD CONSTRAINT skill_components_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE testimonials 
+ADD CONSTRAINT testimonials_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE site_faqs 
+ADD CONSTRAINT site_faqs_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE site_content 
+ADD CONSTRAINT site_content_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE admins 
+ADD CONSTRAINT admins_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE parent_auth_codes 
+ADD CONSTRAINT parent_auth_codes_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE slot_reservations 
+ADD CONSTRAINT slot_reservations_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+ALTER TABLE blog_email_signups 
+ADD CONSTRAINT blog_email_signups_tenant_id_fk 
+FOREIGN KEY (tenant_id) REFERENCES tenants(id) ON DELETE CASCADE;
+
+-- 3. Update unique constraints to be per-tenant ----------------------
+
+-- Drop existing unique constraints that should be per-tenant
+ALTER TABLE skills DROP CONSTRAINT IF EXISTS skills_name_key;
+ALTER TABLE focus_areas DROP CONSTRAINT IF EXISTS focus_areas_name_key;
+ALTER TABLE apparatus DROP CONSTRAINT IF EXISTS apparatus_name_key;
+ALTER TABLE admins DROP CONSTRAINT IF EXISTS admins_email_key;
+
+-- Add new per-tenant unique constraints
+ALTER TABLE skills 
+ADD CONSTRAINT skills_name_per_tenant UNIQUE (tenant_id, name);
+
+ALTER TABLE focus_areas 
+ADD CONSTRAINT focus_areas_name_per_tenant UNIQUE (tenant_id, name);
+
+ALTER TABLE apparatus 
+ADD CONSTRAINT apparatus_name_per_tenant UNIQUE (tenant_id, name);
+
+ALTER TABLE admins 
+ADD CONSTRAINT admins_email_per_tenant UNIQUE (tenant_id, email);
+
+-- site_content should be one row per tenant
+ALTER TABLE site_content 
+ADD CONSTRAINT site_content_one_per_tenant UNIQUE (tenant_id);
+
+-- 4. Add tenant-aware indexes for performance -------------------------
+
+CREATE INDEX IF NOT EXISTS skills_tenant_idx ON skills(tenant_id);
+CREATE INDEX IF NOT EXISTS focus_areas_tenant_idx ON focus_areas(tenant_id);
+CREATE INDEX IF NOT EXISTS apparatus_tenant_idx ON apparatus(tenant_id);
+CREATE INDEX IF NOT EXISTS waivers_tenant_idx ON waivers(tenant_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS archived_waivers_tenant_idx ON archived_waivers(tenant_id);
+CREATE INDEX IF NOT EXISTS availability_tenant_idx ON availability(tenant_id, day_of_week);
+CREATE INDEX IF NOT EXISTS booking_athletes_tenant_idx ON booking_athletes(tenant_id, booking_id);
+CREATE INDEX IF NOT EXISTS booking_focus_areas_tenant_idx ON booking_focus_areas(tenant_id, booking_id);
+CREATE INDEX IF NOT EXISTS athlete_skills_tenant_idx ON athlete_skills(tenant_id, athlete_id);
+CREATE INDEX IF NOT EXISTS athlete_skill_videos_tenant_idx ON athlete_skill_videos(tenant_id, athlete_skill_id);
+CREATE INDEX IF NOT EXISTS skills_prerequisites_tenant_idx ON skills_prerequisites(tenant_id);
+CREATE INDEX IF NOT EXISTS skill_components_tenant_idx ON skill_components(tenant_id);
+CREATE INDEX IF NOT EXISTS testimonials_tenant_idx ON testimonials(tenant_id);
+CREATE INDEX IF NOT EXISTS site_faqs_tenant_idx ON site_faqs(tenant_id);
+CREATE INDEX IF NOT EXISTS site_content_tenant_idx ON site_content(tenant_id);
+CREATE INDEX IF NOT EXISTS admins_tenant_idx ON admins(tenant_id);
+CREATE INDEX IF NOT EXISTS parent_auth_codes_tenant_idx ON parent_auth_codes(tenant_id);
+CREATE INDEX IF NOT EXISTS slot_reservations_tenant_idx ON slot_reservations(tenant_id);
+CREATE INDEX IF NOT EXISTS blog_email_signups_tenant_idx ON blog_email_signups(tenant_id);
+
+-- 5. Verification queries (optional) -----------------------------------
+-- Uncomment to run verification after migration
+
+-- SELECT 
+--   table_name,
+--   COUNT(*) as row_count,
+--   COUNT(DISTINCT tenant_id) as tenant_count
+-- FROM (
+--   SELECT 'skills' as table_name, tenant_id FROM skills
+--   UNION ALL SELECT 'focus_areas', tenant_id FROM focus_areas
+--   UNION ALL SELECT 'apparatus', tenant_id FROM apparatus
+--   UNION ALL SELECT 'waivers', tenant_id FROM waivers
+--   UNION ALL SELECT 'booking_athletes', tenant_id FROM booking_athletes
+--   UNION ALL SELECT 'booking_focus_areas', tenant_id FROM booking_focus_areas
+--   UNION ALL SELECT 'athlete_skills', tenant_id FROM athlete_skills
+-- ) verification
+-- GROUP BY table_name
+-- ORDER BY table_name;
+
+-- Stage 2 migration complete
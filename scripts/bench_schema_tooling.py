@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Benchmark the schema tooling against synthetic catalogs.
+
+Builds bench_<N> schemas in a local Postgres (default sizes 50, 1k and 10k
+tables, with a realistic column mix, enums, foreign keys and indexes) and
+times snapshot fetch, fingerprinting, file generation, loading and compare,
+plus the legacy Drizzle codegen and shared/schema.ts parser run over the
+same catalog.
+Results are written as JSON under bench-results/ so runs can be diffed
+between commits.
+
+Never point this at Supabase: it creates (and with --drop, drops) schemas.
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python scripts/bench_schema_tooling.py
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from check_schema_sync import parse_schema_text, structural_diff
+from schema_snapshot import fetch_fingerprint, fetch_snapshot
+from snapshot_file import SnapshotFile, render_snapshot_file
+from update_schema_file import generate_schema_file
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'bench-results')
+LEGACY_DIR = os.path.join(os.path.dirname(__file__), '..', 'legacy-cwt')
+
+DEFAULT_SIZES = [50, 1000, 10000]
+
+# Tables created per transaction; keeps lock table usage bounded at 10k tables
+BATCH_SIZE = 250
+
+ENUMS = {
+    'bench_status': ['pending', 'confirmed', 'completed', 'cancelled'],
+    'bench_payment': ['unpaid', 'reservation-paid', 'session-paid', 'refunded'],
+    'bench_role': ['coach_admin', 'coach_staff', 'parent', 'athlete'],
+}
+
+# Column mix modelled on shared/schema.ts: (name, type, modifiers)
+COLUMN_MIX = [
+    ('tenant_id', 'uuid', 'not null'),
+    ('name', 'text', 'not null'),
+    ('email', 'varchar(255)', ''),
+    ('notes', 'text', ''),
+    ('status', 'bench_status', "not null default 'pending'"),
+    ('payment_status', 'bench_payment', ''),
+    ('amount', 'numeric(10,2)', 'default 0'),
+    ('position', 'integer', 'default 0'),
+    ('is_active', 'boolean', 'not null default true'),
+    ('metadata', 'jsonb', "default '{}'::jsonb"),
+    ('tags', 'text[]', ''),
+    ('scheduled_at', 'timestamptz', ''),
+    ('created_at', 'timestamptz', 'not null default now()'),
+    ('updated_at', 'timestamp', 'default now()'),
+]
+
+# information_schema query the scripts used before the pg_catalog engine
+LEGACY_COLUMNS_QUERY = """
+select c.table_name, c.column_name,
+       case
+         when c.udt_name = 'hstore' then 'hstore'
+         when c.data_type = 'ARRAY' then 'ARRAY'
+         when c.data_type ilike 'USER-DEFINED' then c.udt_name
+         else c.data_type
+       end as data_type
+from information_schema.columns c
+join information_schema.tables t on t.table_name = c.table_name and t.table_schema = c.table_schema
+where c.table_schema = %s and t.table_type = 'BASE TABLE'
+order by c.table_name, c.ordinal_position
+"""
+
+
+def table_ddl(schema: str, i: int) -> List[sql.Composed]:
+    """DDL for the i-th synthetic table: a varying subset of COLUMN_MIX, an FK to its predecessor and an index."""
+    table = sql.Identifier(schema, f't{i:05d}')
+    columns = [sql.SQL('id serial primary key')]
+    for j, (name, type_, modifiers) in enumerate(COLUMN_MIX):
+        # Drop a couple of optional columns per table so shapes vary realistically
+        if 'not null' not in modifiers and (i + j) % 5 == 0:
+            continue
+        columns.append(sql.SQL('{} {} {}').format(sql.Identifier(name), sql.SQL(type_), sql.SQL(modifiers)))
+    if i % 4:
+        columns.append(sql.SQL('parent_id integer references {}(id)').format(sql.Identifier(schema, f't{i - 1:05d}')))
+    return [
+        sql.SQL('create table {} ({})').format(table, sql.SQL(', ').join(columns)),
+        sql.SQL('create index on {} (tenant_id, created_at)').format(table),
+    ]
+
+
+def build_schema(conn, size: int, rebuild: bool) -> str:
+    schema = f'bench_{size}'
+    existing = conn.execute(
+        "select count(*) as n from pg_class where relnamespace = (select oid from pg_namespace where nspname = %s) and relkind = 'r'",
+        (schema,),
+    ).fetchone()['n']
+    if existing == size and not rebuild:
+        return schema
+
+    print(f'  building {schema} ({size} tables)...', flush=True)
+    with conn.transaction():
+        conn.execute(sql.SQL('drop schema if exists {} cascade').format(sql.Identifier(schema)))
+        conn.execute(sql.SQL('create schema {}').format(sql.Identifier(schema)))
+        for name, labels in ENUMS.items():
+            conn.execute(sql.SQL('create type {} as enum ({})').format(
+                sql.Identifier(schema, name), sql.SQL(', ').join(map(sql.Literal, labels))))
+    # Enum column types in COLUMN_MIX are resolved through the search path
+    conn.execute(sql.SQL('set search_path to {}, public').format(sql.Identifier(schema)))
+    try:
+        for start in range(0, size, BATCH_SIZE):
+            with conn.transaction():
+                for i in range(start, min(start + BATCH_SIZE, size)):
+                    for statement in table_ddl(schema, i):
+                        conn.execute(statement)
+    finally:
+        conn.execute('reset search_path')
+    return schema
+
+
+def legacy_fetch(conn, schema: str) -> Dict:
+    out: Dict = {}
+    for r in conn.execute(LEGACY_COLUMNS_QUERY, (schema,)).fetchall():
+        out.setdefault(r['table_name'], []).append((r['column_name'], r['data_type']))
+    return out
+
+
+def load_legacy_script(relpath: str):
+    """Import a legacy-cwt script by path (their file names are not importable module names)."""
+    path = os.path.join(LEGACY_DIR, relpath)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(fn: Callable, repeat: int) -> Dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {'min': round(min(samples), 6), 'median': round(statistics.median(samples), 6)}
+
+
+def drifted(live: Dict) -> Dict:
+    """Copy of `live` column types with every tenth table altered, to give compare() real work."""
+    out = {}
+    for k, (name, cols) in enumerate(sorted(live.items())):
+        out[name] = cols[:-1] if k % 10 == 0 else cols
+    return out
+
+
+def bench_size(conn, schema: str, repeat: int, workdir: str) -> Dict:
+    results: Dict = {}
+    snapshot = fetch_snapshot(conn, schema=schema)
+    data = snapshot.to_dict()
+
+    results['fetch_snapshot'] = timed(lambda: fetch_snapshot(conn, schema=schema), repeat)
+    results['fetch_information_schema'] = timed(lambda: legacy_fetch(conn, schema), repeat)
+    results['fetch_fingerprint'] = timed(lambda: fetch_fingerprint(conn, schema=schema), repeat)
+
+    results['generate_text'] = timed(lambda: generate_schema_file(data), repeat)
+    results['generate_snapshot'] = timed(lambda: render_snapshot_file(data), repeat)
+
+    text_path = os.path.join(workdir, f'{schema}.txt')
+    snap_path = os.path.join(workdir, f'{schema}.snapshot')
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write(generate_schema_file(data))
+    with open(snap_path, 'wb') as f:
+        f.write(render_snapshot_file(data))
+
+    def load_text():
+        with open(text_path, 'r', encoding='utf-8') as f:
+            return parse_schema_text(f.read())
+
+    def load_snapshot(tables=None):
+        with SnapshotFile(snap_path) as snap:
+            return snap.load(tables)
+
+    some_tables = sorted(data['tables'])[:5]
+    results['load_text'] = timed(load_text, repeat)
+    results['load_snapshot_all'] = timed(load_snapshot, repeat)
+    results['load_snapshot_5_tables'] = timed(lambda: load_snapshot(some_tables), repeat)
+
+    live = drifted(snapshot.column_types())
+    results['compare'] = timed(lambda: structural_diff(data, live), repeat)
+
+    codegen = load_legacy_script(os.path.join('scripts', 'analyze_complete_schema.py'))
+    shared_parser = load_legacy_script(os.path.join('Tests', 'python', 'compare-live-vs-shared.py'))
+    # __wrapped__ skips the mtime-keyed memo so every sample parses the snapshot
+    catalog = codegen._snapshot_catalog.__wrapped__(snap_path, 0, 0)
+    _, warm_cache, _ = codegen.generate_table_definitions(catalog, {})
+    results['codegen_cold'] = timed(
+        lambda: codegen.generate_table_definitions(codegen._snapshot_catalog.__wrapped__(snap_path, 0, 0), {}), repeat)
+    results['codegen_warm'] = timed(lambda: codegen.generate_table_definitions(catalog, warm_cache), repeat)
+    definitions = [entry['definition'] for entry in warm_cache.values()]
+    module = codegen.render_schema_module(catalog['enums'], definitions)
+    results['parse_ts'] = timed(lambda: shared_parser.build_index(module), repeat)
+
+    results['file_bytes'] = {'text': os.path.getsize(text_path), 'snapshot': os.path.getsize(snap_path)}
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the schema tooling against synthetic catalogs.')
+    parser.add_argument('--database-url', help='Local benchmark database (default: BENCH_DATABASE_URL)')
+    parser.add_argument('--sizes', type=lambda v: [int(x) for x in v.split(',')], default=DEFAULT_SIZES,
+                        help='Comma-separated table counts (default: 50,1000,10000)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed repetitions per phase')
+    parser.add_argument('--rebuild', action='store_true', help='Recreate bench schemas even if they already exist')
+    parser.add_argument('--drop', action='store_true', help='Drop the bench schemas afterwards')
+    parser.add_argument('--output', help='Result file (default: bench-results/<timestamp>-<commit>.json)')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db_url = args.database_url or os.getenv('BENCH_DATABASE_URL')
+    if not db_url:
+        print('ERROR: pass --database-url or set BENCH_DATABASE_URL (a local Postgres, never production).', file=sys.stderr)
+        sys.exit(1)
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'repeat': args.repeat,
+        'results': {},
+    }
+    with psycopg.connect(db_url, autocommit=True, row_factory=dict_row) as conn, \
+            tempfile.TemporaryDirectory() as workdir:
+        report['server_version'] = conn.execute('show server_version').fetchone()['server_version']
+        for size in args.sizes:
+            schema = build_schema(conn, size, args.rebuild)
+            print(f'Benchmarking {schema}...', flush=True)
+            report['results'][str(size)] = bench_size(conn, schema, args.repeat, workdir)
+            for phase, value in report['results'][str(size)].items():
+                if 'median' in value:
+                    print(f'  {phase:<26} {value["median"] * 1000:10.2f} ms')
+            if args.drop:
+                conn.execute(sql.SQL('drop schema {} cascade').format(sql.Identifier(schema)))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{report['recorded_at'].replace(':', '').replace('+0000', 'Z')}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Check declarative column contracts against a database or the saved snapshot.
+
+Contracts live in attached_assets/schema_contracts.json:
+
+    {
+      "bookings": {
+        "session_confirmation_email_sent": {"data_type": "boolean", "nullable": false, "default_contains": "false"},
+        "session_confirmation_email_sent_at": {"data_type": ["timestamp with time zone", "timestamp without time zone"]}
+      }
+    }
+
+Per column, every key is optional ({} only requires the column to exist):
+
+    data_type         expected type, or a list of accepted types (information_schema spelling, enums by name)
+    nullable          true / false
+    default           exact column default expression, null for "no default"
+    default_contains  case-insensitive substring of the column default
+
+All contract tables are fetched in one catalog query (or decoded from the
+saved snapshot with --cached) and every violation is reported at once.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from check_schema_sync import load_schema_file
+from schema_snapshot import fetch_snapshot
+
+CONTRACTS_PATH = os.path.join(os.path.dirname(__file__), '..', 'attached_assets', 'schema_contracts.json')
+
+EXPECTATION_KEYS = ('data_type', 'nullable', 'default', 'default_contains')
+
+
+def load_contracts(path: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        contracts = json.load(f)
+    for table, columns in contracts.items():
+        for column, expected in columns.items():
+            unknown = set(expected) - set(EXPECTATION_KEYS)
+            if unknown:
+                raise RuntimeError(f'{table}.{column}: unknown contract keys {sorted(unknown)}')
+    return contracts
+
+
+def _nullable(column: Dict) -> Optional[bool]:
+    # Older text exports have no nullability; information_schema-shaped JSON uses 'YES'/'NO'
+    value = column.get('is_nullable')
+    if value is None:
+        return None
+    return value in (True, 'YES')
+
+
+def check_column(name: str, column: Dict, expected: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Violations and expectations the source cannot verify, for one column."""
+    violations: List[str] = []
+    skipped: List[str] = []
+
+    if 'data_type' in expected:
+        accepted = expected['data_type'] if isinstance(expected['data_type'], list) else [expected['data_type']]
+        if column.get('data_type') not in accepted:
+            wanted = accepted[0] if len(accepted) == 1 else f'one of {accepted}'
+            violations.append(f"{name} data_type expected {wanted!r} got {column.get('data_type')!r}")
+
+    if 'nullable' in expected:
+        actual = _nullable(column)
+        if actual is None:
+            skipped.append(f'{name} nullable')
+        elif actual != expected['nullable']:
+            violations.append(f"{name} nullable expected {expected['nullable']} got {actual}")
+
+    if 'default' in expected or 'default_contains' in expected:
+        if 'column_default' not in column:
+            skipped.append(f'{name} default')
+        else:
+            default = column['column_default']
+            if 'default' in expected and default != expected['default']:
+                violations.append(f"{name} default expected {expected['default']!r} got {default!r}")
+            if 'default_contains' in expected and expected['default_contains'].lower() not in (default or '').lower():
+                violations.append(
+                    f"{name} default should include {expected['default_contains']!r} got {default!r}")
+
+    return {'violations': violations, 'skipped': skipped}
+
+
+def check_contracts(contracts: Dict, schema_data: Dict) -> Dict[str, List[str]]:
+    tables = schema_data.get('tables', {})
+    violations: List[str] = []
+    skipped: List[str] = []
+    for table, columns in sorted(contracts.items()):
+        if table not in tables:
+            violations.append(f'Missing table: {table}')
+            continue
+        actual = {c['column_name']: c for c in tables[table].get('columns', [])}
+        for column, expected in sorted(columns.items()):
+            name = f'{table}.{column}'
+            if column not in actual:
+                violations.append(f'Missing column: {name}')
+                continue
+            result = check_column(name, actual[column], expected)
+            violations.extend(result['violations'])
+            skipped.extend(result['skipped'])
+    return {'violations': violations, 'skipped': skipped}
+
+
+def contracts_from_schema(schema_data: Dict, tables: Optional[Iterable[str]] = None) -> Dict:
+    """Freeze the current shape of `tables` (every table when None) into contracts."""
+    out: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for table, data in sorted(schema_data.get('tables', {}).items()):
+        if tables is not None and table not in tables:
+            continue
+        out[table] = {}
+        for c in data.get('columns', []):
+            expected: Dict[str, Any] = {'data_type': c['data_type']}
+            if _nullable(c) is not None:
+                expected['nullable'] = _nullable(c)
+            if 'column_default' in c:
+                expected['default'] = c['column_default']
+            out[table][c['column_name']] = expected
+    return out
+
+
+def fetch_schema(db_url: str, tables: Optional[List[str]]) -> Dict:
+    with psycopg.connect(db_url, row_factory=dict_row) as conn:
+        return fetch_snapshot(conn, tables=tables).to_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check declarative column contracts in one batched catalog query.')
+    parser.add_argument('--contracts', default=CONTRACTS_PATH, help='Contract file (default: attached_assets/schema_contracts.json)')
+    parser.add_argument('--database-url', help='Database to check (default: DATABASE_URL / DIRECT_DATABASE_URL)')
+    parser.add_argument('--cached', action='store_true', help='Check the saved schema snapshot instead of a live database')
+    parser.add_argument('--init', action='store_true', help='Write contracts freezing the current shape instead of checking')
+    parser.add_argument('--tables', help='With --init, comma-separated tables to include (default: all)')
+    parser.add_argument('--force', action='store_true', help='With --init, overwrite an existing contract file')
+    parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.init:
+        tables = args.tables.split(',') if args.tables else None
+    else:
+        contracts = load_contracts(args.contracts)
+        tables = sorted(contracts)
+
+    if args.cached:
+        schema_data = load_schema_file(tables)
+    else:
+        db_url = args.database_url or os.getenv('DATABASE_URL') or os.getenv('DIRECT_DATABASE_URL')
+        if not db_url:
+            print('ERROR: Neither DATABASE_URL nor DIRECT_DATABASE_URL set in environment (use --cached to check the saved snapshot).', file=sys.stderr)
+            sys.exit(2)
+        schema_data = fetch_schema(db_url, tables)
+
+    if args.init:
+        if os.path.exists(args.contracts) and not args.force:
+            print(f'ERROR: {args.contracts} exists; pass --force to overwrite.', file=sys.stderr)
+            sys.exit(2)
+        contracts = contracts_from_schema(schema_data, tables)
+        with open(args.contracts, 'w', encoding='utf-8') as f:
+            json.dump(contracts, f, indent=2)
+            f.write('\n')
+        print(f'Wrote contracts for {len(contracts)} tables to {args.contracts}')
+        return
+
+    result = check_contracts(contracts, schema_data)
+    columns = sum(len(c) for c in contracts.values())
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif result['violations']:
+        print(f"Schema contract check: FAIL ({len(result['violations'])} violation(s) across {columns} column contracts)")
+        for v in result['violations']:
+            print(f'- {v}')
+    else:
+        print(f'Schema contract check: PASS ({columns} column contracts on {len(contracts)} tables)')
+    if result['skipped'] and not args.json:
+        print(f"Not verifiable from this source ({len(result['skipped'])}): {', '.join(result['skipped'])}")
+    sys.exit(1 if result['violations'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
+import hashlib
 import json
 import os
 import sys
+import time
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import psycopg
 from psycopg.rows import dict_row
 from dotenv import load_dotenv
 
+from schema_snapshot import changed_tables, fetch_fingerprint, fetch_snapshot, fetch_snapshot_async
+from snapshot_file import SnapshotFile, file_sha256
+
 SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'attached_assets', 'complete_current_schema.txt')
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), '..', 'attached_assets', 'complete_current_schema.snapshot')
 
 @dataclass
 class Column:
@@ -22,9 +31,7 @@ class Table:
     columns: List[Column]
 
 
-def load_schema_file() -> Dict:
-    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
-        text = f.read()
+def parse_schema_text(text: str) -> Dict:
     # Extract the JSON after the marker 'DETAILED SCHEMA DATA:'
     marker = 'DETAILED SCHEMA DATA:'
     idx = text.find(marker)
@@ -39,72 +46,228 @@ def load_schema_file() -> Dict:
     return data
 
 
+@lru_cache(maxsize=None)
+def _read_text_schema_file() -> Dict:
+    with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        return parse_schema_text(f.read())
+
+
+@lru_cache(maxsize=None)
+def _snapshot_current() -> bool:
+    """True if the snapshot exists and the text export still matches the checksum it recorded."""
+    if not os.path.exists(SNAPSHOT_PATH):
+        return False
+    with SnapshotFile(SNAPSHOT_PATH) as snapshot:
+        expected = snapshot.text_sha256
+    # Without a recorded checksum the text was not exported with this snapshot
+    return expected is None or not os.path.exists(SCHEMA_PATH) or file_sha256(SCHEMA_PATH) == expected
+
+
+def load_schema_file(tables: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Load the reference schema, limited to `tables` when given.
+
+    Prefers the indexed snapshot written by update_schema_file.py, decoding only
+    the requested tables. The plain-text export is read instead when there is no
+    snapshot or the text no longer matches the checksum recorded in the
+    snapshot (edited by hand since the last refresh).
+    """
+    if _snapshot_current():
+        with SnapshotFile(SNAPSHOT_PATH) as snapshot:
+            return snapshot.load(tables)
+    data = _read_text_schema_file()
+    if tables is None:
+        return data
+    file_tables = data.get('tables', {})
+    return {**data, 'tables': {n: file_tables[n] for n in tables if n in file_tables}}
+
+
 def fetch_live_schema(conn) -> Dict[str, List[Tuple[str, str]]]:
     """Return mapping table_name -> list of (column_name, data_type). Only public schema."""
-    q = """
-    select c.table_name,
-           c.column_name,
-           case
-             when c.udt_name = 'hstore' then 'hstore'
-             when c.data_type = 'ARRAY' then 'ARRAY'
-             when c.data_type ilike 'USER-DEFINED' then c.udt_name
-             else c.data_type
-           end as data_type
-    from information_schema.columns c
-    join information_schema.tables t on t.table_name = c.table_name and t.table_schema = c.table_schema
-    where c.table_schema = 'public' and t.table_type = 'BASE TABLE'
-    order by c.table_name, c.ordinal_position
+    return fetch_snapshot(conn).column_types()
+
+
+def table_signature(columns: Iterable[Tuple[str, str]]) -> str:
+    """Canonical structural hash of a table: its (column_name, data_type) pairs, order-insensitive."""
+    canonical = '\n'.join(f'{n}\t{t}' for n, t in sorted(columns))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def diff_shapes(file_cols: List[Tuple[str, str]], live_cols: List[Tuple[str, str]]) -> Dict:
+    live_types = dict(live_cols)
+    file_types = dict(file_cols)
+    return {
+        'missing_in_live': sorted(set(file_types) - set(live_types)),
+        'missing_in_file': sorted(set(live_types) - set(file_types)),
+        'type_mismatches': [
+            {'column': n, 'file': t, 'live': live_types[n]}
+            for n, t in file_cols
+            if live_types.get(n) and live_types[n] != t
+        ],
+    }
+
+
+def structural_diff(schema_file_data: Dict, live: Dict[str, List[Tuple[str, str]]]) -> Dict:
+    """
+    Machine-readable drift report. Every table is reduced to a signature on
+    both sides; tables sharing a (file, live) signature pair are grouped and
+    each distinct pair is diffed once, so cost follows the number of distinct
+    shapes rather than the number of tables.
     """
-    cur = conn.execute(q)
-    rows = cur.fetchall()
-    out: Dict[str, List[Tuple[str, str]]] = {}
-    for r in rows:
-        out.setdefault(r['table_name'], []).append((r['column_name'], r['data_type']))
-    return out
+    file_tables = schema_file_data.get('tables', {})
+    shapes: Dict[tuple, List[Tuple[str, str]]] = {}
+    groups: Dict[Tuple[tuple, tuple], List[str]] = {}
+
+    for tname in set(file_tables) & set(live):
+        file_cols = [(c['column_name'], c['data_type']) for c in file_tables[tname].get('columns', [])]
+        # Sorted column tuples are the in-memory shape key; hashes are only needed for the report
+        file_key = tuple(sorted(file_cols))
+        live_key = tuple(sorted(live[tname]))
+        if file_key == live_key:
+            continue
+        shapes.setdefault(file_key, file_cols)
+        shapes.setdefault(live_key, live[tname])
+        groups.setdefault((file_key, live_key), []).append(tname)
+
+    deviations = []
+    for (file_key, live_key), tables in groups.items():
+        deviations.append({
+            'tables': sorted(tables),
+            'file_signature': table_signature(file_key),
+            'live_signature': table_signature(live_key),
+            **diff_shapes(shapes[file_key], shapes[live_key]),
+        })
+    deviations.sort(key=lambda d: d['tables'][0])
+
+    return {
+        'tables_missing_in_live': sorted(set(file_tables) - set(live)),
+        'tables_missing_in_file': sorted(set(live) - set(file_tables)),
+        'deviations': deviations,
+    }
 
 
 def compare(schema_file_data: Dict, live: Dict[str, List[Tuple[str, str]]]) -> List[str]:
-    problems: List[str] = []
-    file_tables = schema_file_data.get('tables', {})
+    return describe(structural_diff(schema_file_data, live))
 
-    # Compare table presence
-    file_table_names = set(file_tables.keys())
-    live_table_names = set(live.keys())
 
-    missing_in_live = file_table_names - live_table_names
-    extra_in_live = live_table_names - file_table_names
-    if missing_in_live:
-        problems.append(f"Tables missing in live: {sorted(missing_in_live)}")
-    if extra_in_live:
-        problems.append(f"Tables missing in file: {sorted(extra_in_live)}")
+def describe(diff: Dict) -> List[str]:
+    """Human-readable problems for a structural_diff() report."""
+    problems: List[str] = []
+    if diff['tables_missing_in_live']:
+        problems.append(f"Tables missing in live: {diff['tables_missing_in_live']}")
+    if diff['tables_missing_in_file']:
+        problems.append(f"Tables missing in file: {diff['tables_missing_in_file']}")
 
-    # Compare columns and types
-    for tname in sorted(file_table_names & live_table_names):
-        file_cols = [(c['column_name'], c['data_type']) for c in file_tables[tname].get('columns', [])]
-        live_cols = live.get(tname, [])
-        file_col_names = [c[0] for c in file_cols]
-        live_col_names = [c[0] for c in live_cols]
-
-        # Column presence
-        missing_cols = set(file_col_names) - set(live_col_names)
-        extra_cols = set(live_col_names) - set(file_col_names)
-        if missing_cols:
-            problems.append(f"{tname}: columns missing in live: {sorted(missing_cols)}")
-        if extra_cols:
-            problems.append(f"{tname}: columns missing in file: {sorted(extra_cols)}")
-
-        # Type mismatches
-        live_types = {n: t for n, t in live_cols}
-        for n, t in file_cols:
-            lt = live_types.get(n)
-            if lt and lt != t:
-                problems.append(f"{tname}.{n}: type mismatch file={t} live={lt}")
+    for d in diff['deviations']:
+        tables = d['tables']
+        label = tables[0] if len(tables) == 1 else f"{len(tables)} tables ({', '.join(tables[:3])}{', ...' if len(tables) > 3 else ''})"
+        if d['missing_in_live']:
+            problems.append(f"{label}: columns missing in live: {d['missing_in_live']}")
+        if d['missing_in_file']:
+            problems.append(f"{label}: columns missing in file: {d['missing_in_file']}")
+        for m in d['type_mismatches']:
+            problems.append(f"{label}.{m['column']}: type mismatch file={m['file']} live={m['live']}")
 
     return problems
 
 
+def table_drift(schema_file_data: Dict, live: Dict[str, List[Tuple[str, str]]]) -> Dict[str, str]:
+    """
+    Per-table drift status: 'missing' (not in live), 'extra' (not in file),
+    'columns' (column sets differ) or 'types' (same columns, types differ).
+    Tables that match are omitted.
+    """
+    diff = structural_diff(schema_file_data, live)
+    status: Dict[str, str] = {t: 'missing' for t in diff['tables_missing_in_live']}
+    status.update({t: 'extra' for t in diff['tables_missing_in_file']})
+    for d in diff['deviations']:
+        kind = 'columns' if d['missing_in_live'] or d['missing_in_file'] else 'types'
+        status.update({t: kind for t in d['tables']})
+    return status
+
+
+def load_fleet_targets(path: Optional[str], extra: List[str]) -> Dict[str, str]:
+    """
+    Read `name=url` targets, one per line (lines starting with '#' are skipped), plus any
+    --target values. $VARS are expanded so URLs can stay in the environment.
+    """
+    lines = list(extra)
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines.extend(f.read().splitlines())
+    targets: Dict[str, str] = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        name, sep, url = line.partition('=')
+        if not sep:
+            raise RuntimeError(f'Invalid fleet target (expected name=url): {line}')
+        targets[name.strip()] = os.path.expandvars(url.strip())
+    return targets
+
+
+async def fetch_fleet(targets: Dict[str, str], concurrency: int) -> Dict[str, object]:
+    """Fetch column types from every target concurrently, at most `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(url: str):
+        async with semaphore:
+            async with await psycopg.AsyncConnection.connect(url) as aconn:
+                return (await fetch_snapshot_async(aconn)).column_types()
+
+    results = await asyncio.gather(*(fetch_one(url) for url in targets.values()), return_exceptions=True)
+    return dict(zip(targets, results))
+
+
+def run_fleet(targets: Dict[str, str], concurrency: int, as_json: bool) -> int:
+    schema_file_data = load_schema_file()
+    started = time.monotonic()
+    results = asyncio.run(fetch_fleet(targets, concurrency))
+    elapsed = time.monotonic() - started
+
+    matrix: Dict[str, Dict[str, str]] = {}
+    errors: Dict[str, str] = {}
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            errors[name] = str(result).strip() or type(result).__name__
+        else:
+            matrix[name] = table_drift(schema_file_data, result)
+
+    if as_json:
+        print(json.dumps({'elapsed_seconds': round(elapsed, 3), 'drift': matrix, 'errors': errors}, indent=2, sort_keys=True))
+    else:
+        drifted = sorted({t for status in matrix.values() for t in status})
+        print(f'Checked {len(targets)} target(s) in {elapsed:.2f}s.')
+        if drifted:
+            names = list(matrix)
+            width = max(len(t) for t in drifted) + 2
+            print('SCHEMA DRIFT MATRIX:')
+            print((''.ljust(width) + ''.join(n.ljust(max(len(n), 8) + 2) for n in names)).rstrip())
+            for tname in drifted:
+                cells = ''.join(matrix[n].get(tname, 'ok').ljust(max(len(n), 8) + 2) for n in names)
+                print((tname.ljust(width) + cells).rstrip())
+        else:
+            print('All reachable targets match the schema file (tables/columns/types).')
+        for name, error in errors.items():
+            print(f'ERROR {name}: {error}', file=sys.stderr)
+
+    return 1 if errors or any(matrix.values()) else 0
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Check the stored schema snapshot against the live database.')
+    parser.add_argument('--full', action='store_true', help='Ignore the stored catalog fingerprint and compare every table')
+    parser.add_argument('--fleet', metavar='FILE', help='Check every name=url target listed in FILE concurrently')
+    parser.add_argument('--target', action='append', default=[], metavar='NAME=URL', help='Add a fleet target (repeatable)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum simultaneous connections in fleet mode')
+    parser.add_argument('--json', action='store_true', help='Print drift as JSON (the drift matrix in fleet mode)')
+    args = parser.parse_args()
+
     load_dotenv()
+    if args.fleet or args.target:
+        sys.exit(run_fleet(load_fleet_targets(args.fleet, args.target), args.concurrency, args.json))
+
     db_url = os.getenv('DATABASE_URL')
     if not db_url:
         # Fallback to DIRECT_DATABASE_URL for local Supabase direct connections
@@ -115,18 +278,43 @@ def main():
         _ = load_schema_file()
         sys.exit(2)
 
-    schema_file_data = load_schema_file()
+    # Header only for now; tables are decoded once we know which ones to compare
+    schema_file_data = load_schema_file(tables=[])
+    stored_fingerprint = None if args.full else schema_file_data.get('fingerprint')
 
     with psycopg.connect(db_url, row_factory=dict_row) as conn:
-        live = fetch_live_schema(conn)
+        if stored_fingerprint:
+            # Fast path: one tiny query, then re-fetch only the tables whose fingerprint moved
+            live_fingerprint = fetch_fingerprint(conn)
+            if live_fingerprint['catalog'] == stored_fingerprint.get('catalog'):
+                if args.json:
+                    print(json.dumps(structural_diff({}, {}), indent=2))
+                else:
+                    print('Schema file matches live database (catalog fingerprint unchanged).')
+                sys.exit(0)
+            changed = changed_tables(stored_fingerprint, live_fingerprint)
+            live_changed = [n for n in changed if n in live_fingerprint['tables']]
+            live = fetch_snapshot(conn, tables=live_changed).column_types()
+            schema_file_data = load_schema_file(tables=changed)
+        else:
+            live = fetch_live_schema(conn)
+            schema_file_data = load_schema_file()
 
-    problems = compare(schema_file_data, live)
+    diff = structural_diff(schema_file_data, live)
+    problems = describe(diff)
 
-    if problems:
+    if args.json:
+        print(json.dumps(diff, indent=2))
+        sys.exit(1 if problems else 0)
+    elif problems:
         print('SCHEMA DRIFT DETECTED:')
         for p in problems:
             print('-', p)
         sys.exit(1)
+    elif stored_fingerprint:
+        print(f'Schema file matches live database (tables/columns/types); {len(changed)} table fingerprint(s) changed.')
+        print('Run scripts/update_schema_file.py to refresh the stored fingerprint.')
+        sys.exit(0)
     else:
         print('Schema file matches live database (tables/columns/types).')
         sys.exit(0)
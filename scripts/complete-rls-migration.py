@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 
 import os
-import psycopg2
+import sys
+import psycopg
 from dotenv import load_dotenv
 
+from migration_ledger import Ledger
+from migration_runner import run_script
+
+# Ledger key for the statements below
+UNIT = 'scripts/complete-rls-migration.py'
+
+# Connections used to alter disjoint tables concurrently
+POOL_SIZE = 4
+
 # Load environment variables
 load_dotenv()
 
@@ -17,9 +27,7 @@ def enable_remaining_rls():
     
     try:
         print("🔒 Connecting to database...")
-        conn = psycopg2.connect(database_url)
-        conn.autocommit = True
-        cursor = conn.cursor()
+        conn = psycopg.connect(database_url)
         
         print("✅ Connected successfully!")
         print()
@@ -56,19 +64,30 @@ def enable_remaining_rls():
         print(f"🔧 Enabling RLS on {len(remaining_tables)} remaining tables...")
         print()
         
-        success_count = 0
-        error_count = 0
+        # The tables are disjoint, so RLS is enabled on them concurrently; tables the
+        # migration ledger already has are skipped
+        sql = '\n'.join(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;" for table in remaining_tables)
+        ledger = Ledger.load(conn, [UNIT])
+        result = run_script(conn, UNIT, sql, keep_going=True, ledger=ledger,
+                            accept_edited='--accept-edited' in sys.argv,
+                            parallel=POOL_SIZE, conninfo=database_url)
         
-        # Enable RLS on remaining tables
-        for i, table in enumerate(remaining_tables):
-            try:
-                sql = f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;"
-                print(f"[{i+1}/{len(remaining_tables)}] {sql}")
-                cursor.execute(sql)
-                print(f"   ✅ Success")
+        if result.edited:
+            print(f"❌ Statements {result.edited} changed since they were applied")
+            print("   Review the edit, then rerun with --accept-edited")
+        elif not result.statements:
+            print(f"ℹ️  RLS already enabled on all {result.skipped} tables (migration ledger)")
+        
+        success_count = result.skipped
+        error_count = len(result.edited)
+        
+        for s in result.statements:
+            print(f"[{s.index}/{len(remaining_tables)}] {s.summary}")
+            if s.ok:
+                print(f"   ✅ Success ({s.server_ms:.1f} ms)")
                 success_count += 1
-            except Exception as e:
-                print(f"   ❌ Failed: {e}")
+            else:
+                print(f"   ❌ Failed: {s.error}")
                 error_count += 1
         
         print()
@@ -88,13 +107,12 @@ def enable_remaining_rls():
         test_tables = ['users', 'admins', 'apparatus', 'genders']
         for table in test_tables:
             try:
-                cursor.execute(f"SELECT COUNT(*) FROM {table} LIMIT 1;")
-                result = cursor.fetchone()
-                print(f"   ✅ {table}: Query allowed (found {result[0] if result else 0} records)")
+                row = conn.execute(f"SELECT COUNT(*) FROM {table} LIMIT 1;").fetchone()
+                print(f"   ✅ {table}: Query allowed (found {row[0] if row else 0} records)")
             except Exception as e:
+                conn.rollback()
                 print(f"   🔒 {table}: Access blocked by RLS - {str(e)[:50]}...")
         
-        cursor.close()
         conn.close()
         
         print("\n🎯 Next steps:")
@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 
 import os
-import psycopg2
+import sys
+import psycopg
 from dotenv import load_dotenv
 
+from migration_ledger import Ledger
+from migration_runner import run_script
+
+# Ledger key for the statements below
+UNIT = 'scripts/create-rls-policies.py'
+
+# Connections used to create policies on disjoint tables concurrently
+POOL_SIZE = 4
+
 # Load environment variables
 load_dotenv()
 
@@ -17,9 +27,7 @@ def create_rls_policies():
     
     try:
         print("🔐 Connecting to database...")
-        conn = psycopg2.connect(database_url)
-        conn.autocommit = True
-        cursor = conn.cursor()
+        conn = psycopg.connect(database_url)
         
         print("✅ Connected successfully!")
         print()
@@ -157,28 +165,35 @@ def create_rls_policies():
         print(f"🔧 Creating {len(sql_statements)} policies...")
         print()
         
-        success_count = 0
-        error_count = 0
+        # Policies on different tables are created concurrently once the helper function
+        # and its grants exist; statements already in the migration ledger are skipped and
+        # "already exists" failures are recorded there instead of retried
+        ledger = Ledger.load(conn, [UNIT])
+        result = run_script(conn, UNIT, '\n'.join(sql.strip() for sql in sql_statements),
+                            keep_going=True, ledger=ledger, adopt_existing=True,
+                            accept_edited='--accept-edited' in sys.argv,
+                            parallel=POOL_SIZE, conninfo=database_url)
         
-        for i, sql in enumerate(sql_statements):
-            try:
-                # Clean up the SQL
-                clean_sql = sql.strip()
-                if not clean_sql:
-                    continue
-                    
-                print(f"[{i+1}/{len(sql_statements)}] {clean_sql[:60]}...")
-                cursor.execute(clean_sql)
-                print(f"   ✅ Success")
+        if result.edited:
+            print(f"❌ Statements {result.edited} changed since they were applied")
+            print("   Review the edit, then rerun with --accept-edited")
+        elif not result.statements:
+            print(f"ℹ️  All {result.skipped} statements already applied (migration ledger)")
+        
+        success_count = result.skipped
+        error_count = len(result.edited)
+        
+        for s in result.statements:
+            print(f"[{s.index}/{len(sql_statements)}] {s.summary[:60]}...")
+            if s.existed:
+                print(f"   ℹ️  Already exists (skipping)")
+                success_count += 1
+            elif s.ok:
+                print(f"   ✅ Success ({s.server_ms:.1f} ms)")
                 success_count += 1
-            except Exception as e:
-                error_message = str(e)
-                if "already exists" in error_message.lower():
-                    print(f"   ℹ️  Already exists (skipping)")
-                    success_count += 1
-                else:
-                    print(f"   ❌ Failed: {error_message}")
-                    error_count += 1
+            else:
+                print(f"   ❌ Failed: {s.error}")
+                error_count += 1
         
         print()
         print("="*60)
@@ -186,7 +201,6 @@ def create_rls_policies():
         print(f"   ✅ Successful: {success_count}")
         print(f"   ❌ Failed: {error_count}")
         
-        cursor.close()
         conn.close()
         
         if error_count == 0:
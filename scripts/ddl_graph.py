@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Dependency graph between the statements of a migration.
+
+Each statement is reduced to the objects it writes (the table an ALTER
+TABLE, CREATE POLICY or CREATE INDEX targets, the function a CREATE FUNCTION
+or GRANT ON FUNCTION defines, ...) and the names it reads (every identifier
+it mentions, function bodies included). A statement depends on every earlier
+statement that writes something it reads or writes, or that reads something
+it writes. Statements whose targets cannot be worked out (DO blocks,
+GRANT ON ALL TABLES, ...) are barriers: they wait for everything before them
+and everything after waits for them.
+
+Statements with no path between them touch disjoint objects and can run
+concurrently; migration_runner.py --parallel N does that over N connections.
+
+    python scripts/ddl_graph.py migrations/stage3-enable-rls.sql
+"""
+import argparse
+import sys
+from dataclasses import dataclass, field
+from typing import FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from sql_lexer import TOKEN_RE, SqlLexError, Statement, split_file
+
+# Token stream entry: (kind, text); kind is 'word', 'ident' or 'punct'
+Token = Tuple[str, str]
+
+
+@dataclass
+class StatementObjects:
+    writes: FrozenSet[str] = frozenset()
+    reads: FrozenSet[str] = frozenset()
+    barrier: bool = False
+
+
+@dataclass
+class DdlGraph:
+    statements: List[Statement]
+    objects: List[StatementObjects]
+    # deps[i]: indexes (into statements) that statement i must wait for
+    deps: List[List[int]] = field(default_factory=list)
+
+    def waves(self) -> List[List[int]]:
+        """Statements grouped by depth: every statement in a wave only depends on earlier waves."""
+        depth: List[int] = []
+        for i, deps in enumerate(self.deps):
+            depth.append(1 + max((depth[d] for d in deps), default=-1))
+        out: List[List[int]] = [[] for _ in range(max(depth, default=-1) + 1)]
+        for i, d in enumerate(depth):
+            out[d].append(i)
+        return out
+
+
+def tokenize(sql: str) -> List[Token]:
+    """Identifiers, keywords and punctuation of `sql`; dollar-quoted bodies are tokenized in place."""
+    out: List[Token] = []
+    pos = 0
+    while pos < len(sql):
+        m = TOKEN_RE.match(sql, pos)
+        kind, text = m.lastgroup, m.group()
+        pos = m.end()
+        if kind == 'dollar':
+            close = sql.find(text, pos)
+            body_end = len(sql) if close == -1 else close
+            out.extend(tokenize(sql[pos:body_end]))
+            pos = body_end + len(text)
+        elif kind == 'block_comment':
+            close = sql.find('*/', pos)
+            pos = len(sql) if close == -1 else close + 2
+        elif kind == 'word':
+            out.append(('word', text))
+        elif kind == 'ident':
+            out.append(('ident', text[1:-1].replace('""', '"')))
+        elif kind == 'other':
+            out.append(('punct', text))
+    return out
+
+
+def read_name(tokens: Sequence[Token], i: int) -> Tuple[Optional[str], int]:
+    """Read a possibly schema-qualified name at tokens[i]; returns (normalized name, next index)."""
+    if i >= len(tokens) or tokens[i][0] == 'punct':
+        return None, i
+    parts = []
+    while True:
+        kind, text = tokens[i]
+        parts.append(text.lower() if kind == 'word' else text)
+        if i + 2 < len(tokens) and tokens[i + 1] == ('punct', '.') and tokens[i + 2][0] != 'punct':
+            i += 2
+            continue
+        i += 1
+        break
+    if len(parts) > 1 and parts[0] == 'public':
+        parts = parts[1:]
+    return '.'.join(parts), i
+
+
+def skip_words(tokens: Sequence[Token], i: int, *words: str) -> int:
+    """Skip any of the optional keywords `words` (in any order) starting at tokens[i]."""
+    wanted = set(words)
+    while i < len(tokens) and tokens[i][0] == 'word' and tokens[i][1].upper() in wanted:
+        i += 1
+    return i
+
+
+def _after(tokens: Sequence[Token], start: int, word: str) -> int:
+    """Index just past the first keyword `word` at or after `start`, or -1."""
+    for i in range(start, len(tokens)):
+        if tokens[i][0] == 'word' and tokens[i][1].upper() == word:
+            return i + 1
+    return -1
+
+
+def _target_on(tokens: Sequence[Token], start: int) -> Optional[str]:
+    i = _after(tokens, start, 'ON')
+    if i == -1:
+        return None
+    return read_name(tokens, skip_words(tokens, i, 'ONLY', 'TABLE'))[0]
+
+
+def _writes(stmt: Statement, tokens: Sequence[Token]) -> Optional[Set[str]]:
+    """Objects `stmt` creates or alters, or None when they can't be determined."""
+    kw = stmt.keywords
+    if not kw:
+        return None
+    head = kw[0]
+    words = [t[1].upper() if t[0] == 'word' else None for t in tokens]
+
+    if head == 'ALTER' and len(kw) > 1 and kw[1] in ('TABLE', 'VIEW', 'TYPE', 'FUNCTION', 'SEQUENCE'):
+        name = read_name(tokens, skip_words(tokens, 2, 'IF', 'EXISTS', 'ONLY'))[0]
+        return {name} if name else None
+    if head in ('CREATE', 'ALTER', 'DROP') and 'POLICY' in kw[:3]:
+        name = _target_on(tokens, 2)
+        return {name} if name else None
+    if head in ('CREATE', 'DROP') and 'TRIGGER' in kw[:5]:
+        name = _target_on(tokens, 2)
+        return {name} if name else None
+    if head == 'CREATE' and 'INDEX' in kw[:3]:
+        name = _target_on(tokens, 2)
+        return {name} if name else None
+    if head == 'CREATE':
+        i = skip_words(tokens, 1, 'OR', 'REPLACE', 'TEMP', 'TEMPORARY', 'UNLOGGED', 'MATERIALIZED')
+        if i < len(tokens) and words[i] in ('TABLE', 'VIEW', 'FUNCTION', 'PROCEDURE', 'TYPE', 'SEQUENCE'):
+            name = read_name(tokens, skip_words(tokens, i + 1, 'IF', 'NOT', 'EXISTS'))[0]
+            return {name} if name else None
+        return None
+    if head == 'DROP' and len(kw) > 1 and kw[1] in ('TABLE', 'VIEW', 'FUNCTION', 'TYPE', 'SEQUENCE'):
+        names: Set[str] = set()
+        i = skip_words(tokens, 2, 'IF', 'EXISTS')
+        while i < len(tokens):
+            name, i = read_name(tokens, i)
+            if not name:
+                return None
+            names.add(name)
+            if i < len(tokens) and tokens[i] == ('punct', '('):
+                # Function signature
+                depth = 0
+                while i < len(tokens):
+                    if tokens[i] == ('punct', '('):
+                        depth += 1
+                    elif tokens[i] == ('punct', ')'):
+                        depth -= 1
+                    i += 1
+                    if depth == 0:
+                        break
+            if i < len(tokens) and tokens[i] == ('punct', ','):
+                i += 1
+                continue
+            break
+        return names
+    if head in ('GRANT', 'REVOKE'):
+        i = _after(tokens, 1, 'ON')
+        if i == -1 or i >= len(tokens) or words[i] == 'ALL':
+            return None
+        i = skip_words(tokens, i, 'TABLE', 'FUNCTION', 'PROCEDURE', 'SEQUENCE', 'TYPE')
+        name = read_name(tokens, i)[0]
+        return {name} if name else None
+    if head == 'COMMENT' and len(kw) > 2 and kw[2] in ('TABLE', 'COLUMN', 'FUNCTION', 'VIEW', 'TYPE'):
+        name = read_name(tokens, 3)[0]
+        if name and kw[2] == 'COLUMN':
+            name = name.rsplit('.', 1)[0]
+        return {name} if name else None
+    if head == 'INSERT' and kw[1:2] == ['INTO']:
+        name = read_name(tokens, 2)[0]
+        return {name} if name else None
+    if head == 'UPDATE':
+        name = read_name(tokens, skip_words(tokens, 1, 'ONLY'))[0]
+        return {name} if name else None
+    if head == 'DELETE' and kw[1:2] == ['FROM']:
+        name = read_name(tokens, skip_words(tokens, 2, 'ONLY'))[0]
+        return {name} if name else None
+    if head in ('SELECT', 'ANALYZE'):
+        return set()
+    return None
+
+
+def statement_objects(stmt: Statement) -> StatementObjects:
+    tokens = tokenize(stmt.sql)
+    writes = _writes(stmt, tokens)
+    reads: Set[str] = set()
+    i = 0
+    while i < len(tokens):
+        name, nxt = read_name(tokens, i)
+        if name:
+            reads.add(name)
+            # Unqualified spellings of qualified names (alias.column, schema.table) are read too
+            reads.update(name.split('.'))
+        i = max(nxt, i + 1)
+    if writes is None:
+        return StatementObjects(reads=frozenset(reads), barrier=True)
+    return StatementObjects(frozenset(writes), frozenset(reads - writes))
+
+
+def _conflict(a: StatementObjects, b: StatementObjects) -> bool:
+    if a.barrier or b.barrier:
+        return True
+    return bool(a.writes & (b.writes | b.reads) or b.writes & a.reads)
+
+
+def build_graph(statements: Sequence[Statement]) -> DdlGraph:
+    objects = [statement_objects(s) for s in statements]
+    deps: List[List[int]] = []
+    for j, obj in enumerate(objects):
+        deps.append([i for i in range(j) if _conflict(objects[i], obj)])
+    return DdlGraph(list(statements), objects, deps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show which statements of a migration can run concurrently.')
+    parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    for path in args.files:
+        try:
+            graph = build_graph(split_file(path))
+        except SqlLexError as e:
+            print(f'{path}: {e}', file=sys.stderr)
+            sys.exit(1)
+        waves = graph.waves()
+        widest = max((len(w) for w in waves), default=0)
+        print(f'{path}: {len(graph.statements)} statements in {len(waves)} wave(s), widest {widest}')
+        for n, wave in enumerate(waves, 1):
+            print(f'  wave {n}: {len(wave)} statement(s)')
+            for i in wave:
+                stmt, obj = graph.statements[i], graph.objects[i]
+                target = 'BARRIER' if obj.barrier else ', '.join(sorted(obj.writes)) or '-'
+                print(f'    {stmt.index:>3}  {target:<30}  {stmt.summary(60)}')
+
+
+if __name__ == '__main__':
+    main()
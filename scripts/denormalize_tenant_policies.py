@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Replace EXISTS-join tenant policies with a direct tenant_id predicate.
+
+The junction-table policies created by create-rls-policies.py isolate rows
+through a correlated EXISTS against the parent table (athlete_skill_videos
+goes through athlete_skills and athletes), evaluated for every row scanned.
+This gives each of those tables its own tenant_id column, kept equal to the
+parent's by a trigger. The policy then becomes `tenant_id =
+(SELECT get_current_tenant_id())`, backed by a (tenant_id, <parent key>) index, so a
+junction lookup is a single index probe.
+
+Per table, in order, every DDL step under lock_timeout with online_ddl's
+retries:
+
+    1. ADD COLUMN tenant_id uuid                       catalog only
+    2. BEFORE INSERT OR UPDATE OF <fk> trigger          copies the parent's tenant_id
+    3. chunked, resumable backfill (tenant_backfill.py) rows written before the trigger existed;
+                                                        checkpointed separately, so a stage 2
+                                                        backfill finished before the trigger
+                                                        existed does not count
+    4. CREATE INDEX (tenant_id, <fk>)                   built CONCURRENTLY by online_ddl
+    5. CHECK (tenant_id IS NOT NULL) NOT VALID, VALIDATE, SET NOT NULL, drop the CHECK
+                                                        SET NOT NULL skips its scan
+    6. ALTER (or CREATE) POLICY "tenant_isolation"      one statement, no window without a policy
+
+Parents are converted before their children (athlete_skills before
+athlete_skill_videos), because the child's trigger and backfill read the
+parent's new column. Every step is idempotent, so rerunning after an
+interruption continues where the last run stopped.
+
+The trigger runs as the inserting role: under RLS a parent row of another
+tenant is invisible, its tenant_id comes back NULL and the insert fails on
+NOT NULL. Moving a parent to another tenant is not propagated.
+
+    python scripts/denormalize_tenant_policies.py --dry-run
+    python scripts/denormalize_tenant_policies.py booking_athletes booking_focus_areas
+"""
+import argparse
+import os
+import sys
+from typing import List
+
+import psycopg
+from dotenv import load_dotenv
+
+from online_ddl import OnlinePolicy, execute_online, set_lock_timeout
+from sql_lexer import split_statements
+from tenant_backfill import DEFAULT_TENANT_ID, PARENTS, backfill_table, load_states, ordered
+
+# Tables whose policy is an EXISTS join in create-rls-policies.py
+TABLES = [
+    'athlete_skills', 'athlete_skill_videos', 'booking_athletes', 'booking_focus_areas',
+    'skill_components', 'skills_prerequisites', 'parent_password_reset_tokens',
+]
+
+POLICY = 'tenant_isolation'
+
+
+def prepare_sql(table: str) -> str:
+    fk, parent = PARENTS[table]
+    return f"""
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS tenant_id UUID;
+
+CREATE OR REPLACE FUNCTION {table}_set_tenant_id()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  SELECT p.tenant_id INTO NEW.tenant_id FROM {parent} p WHERE p.id = NEW.{fk};
+  RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE TRIGGER {table}_set_tenant_id
+  BEFORE INSERT OR UPDATE OF {fk} ON {table}
+  FOR EACH ROW EXECUTE FUNCTION {table}_set_tenant_id();
+"""
+
+
+def finish_sql(table: str) -> str:
+    fk = PARENTS[table][0]
+    return f"""
+CREATE INDEX IF NOT EXISTS {table}_tenant_id_{fk}_idx ON {table} (tenant_id, {fk});
+
+ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_tenant_id_not_null;
+
+ALTER TABLE {table} ADD CONSTRAINT {table}_tenant_id_not_null CHECK (tenant_id IS NOT NULL);
+
+ALTER TABLE {table} ALTER COLUMN tenant_id SET NOT NULL;
+
+ALTER TABLE {table} DROP CONSTRAINT {table}_tenant_id_not_null;
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_policies WHERE schemaname = 'public' AND tablename = '{table}' AND policyname = '{POLICY}') THEN
+    ALTER POLICY "{POLICY}" ON {table} USING (tenant_id = (SELECT get_current_tenant_id()));
+  ELSE
+    CREATE POLICY "{POLICY}" ON {table} FOR ALL USING (tenant_id = (SELECT get_current_tenant_id()));
+  END IF;
+END $$;
+"""
+
+
+def run_steps(conn, table: str, script: str, policy: OnlinePolicy) -> bool:
+    for stmt in split_statements(script):
+        outcome = execute_online(conn, stmt, policy)
+        waited = f' ({outcome.retries} lock retries)' if outcome.retries else ''
+        if outcome.error is not None:
+            print(f'  {table}: FAILED {stmt.summary(70)}\n    {outcome.error}')
+            return False
+        print(f'  {table}: {stmt.summary(70)}  {outcome.server_ms:.1f} ms{waited}')
+    return True
+
+
+def convert(conn, tables: List[str], tenant: str, batch_size: int, sleep_ms: float, policy: OnlinePolicy) -> bool:
+    set_lock_timeout(conn, policy)
+    try:
+        for table in tables:
+            if not run_steps(conn, table, prepare_sql(table), policy):
+                return False
+            # Its own checkpoint: only a backfill started after the trigger covers every row
+            state = load_states(conn, [table], scope='denormalize').get(table)
+            if state is None:
+                print(f'  {table}: no single-column primary key; cannot backfill')
+                return False
+            if not state.finished:
+                backfill_table(conn, state, tenant, batch_size, sleep_ms, policy)
+            if not run_steps(conn, table, finish_sql(table), policy):
+                return False
+        return True
+    finally:
+        set_lock_timeout(conn, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Give EXISTS-isolated junction tables their own trigger-maintained tenant_id.')
+    parser.add_argument('tables', nargs='*', help=f'Tables to convert (default: {", ".join(TABLES)})')
+    parser.add_argument('--dry-run', action='store_true', help='Print the SQL of every step and exit')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT_ID, help='tenant_id for rows whose parent row is missing')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per backfill chunk')
+    parser.add_argument('--sleep', type=float, default=100.0, metavar='MS', help='Pause between backfill chunks')
+    parser.add_argument('--lock-timeout', type=int, default=OnlinePolicy.lock_timeout_ms, metavar='MS', help='lock_timeout per DDL attempt')
+    args = parser.parse_args()
+
+    unknown = [t for t in args.tables if t not in PARENTS]
+    if unknown:
+        parser.error(f'no parent known for {", ".join(unknown)} (see PARENTS in tenant_backfill.py)')
+    tables = ordered(args.tables or TABLES)
+
+    if args.dry_run:
+        for table in tables:
+            print(f'-- {table}{prepare_sql(table)}\n-- chunked tenant_id backfill (tenant_backfill.py)\n{finish_sql(table)}')
+        return
+
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    policy = OnlinePolicy(lock_timeout_ms=args.lock_timeout)
+    with psycopg.connect(db_url) as conn:
+        ok = convert(conn, tables, args.tenant, args.batch_size, args.sleep, policy)
+    if not ok:
+        print('Stopped; fix the failure and rerun to continue.')
+        sys.exit(1)
+    print(f'Converted {len(tables)} table(s) to direct tenant_id policies.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 
 import os
-import psycopg2
+import psycopg
 from dotenv import load_dotenv
 import sys
 
+from migration_ledger import Ledger
+from migration_runner import run_script
+
+# Ledger key for the statements below
+UNIT = 'scripts/execute-rls-python.py'
+
 # Load environment variables
 load_dotenv()
 
@@ -18,9 +24,7 @@ def execute_rls_migration():
     
     try:
         print("🔒 Connecting to database...")
-        conn = psycopg2.connect(database_url)
-        conn.autocommit = True
-        cursor = conn.cursor()
+        conn = psycopg.connect(database_url)
         
         print("✅ Connected successfully!")
         print()
@@ -73,25 +77,32 @@ def execute_rls_migration():
             "CREATE POLICY \"tenant_isolation\" ON site_faqs FOR ALL USING (tenant_id = auth.get_current_tenant_id());"
         ]
         
-        success_count = 0
-        error_count = 0
+        # One pipelined transaction; statements already in the migration ledger are
+        # skipped and "already exists" failures are recorded there instead of retried
+        ledger = Ledger.load(conn, [UNIT])
+        result = run_script(conn, UNIT, '\n'.join(sql_statements), keep_going=True, ledger=ledger,
+                            adopt_existing=True, accept_edited='--accept-edited' in sys.argv)
         
-        for i, statement in enumerate(sql_statements):
-            try:
-                short_stmt = statement[:60].replace('\n', ' ').strip() + '...'
-                print(f"[{i+1}/{len(sql_statements)}] {short_stmt}")
-                
-                cursor.execute(statement)
-                print("   ✅ Success")
+        if result.edited:
+            print(f"❌ Statements {result.edited} changed since they were applied")
+            print("   Review the edit, then rerun with --accept-edited")
+        elif not result.statements:
+            print(f"ℹ️  All {result.skipped} statements already applied (migration ledger)")
+        
+        success_count = result.skipped
+        error_count = len(result.edited)
+        
+        for s in result.statements:
+            print(f"[{s.index}/{len(sql_statements)}] {s.summary[:60]}...")
+            if s.existed:
+                print("   ⚠️  Already exists (recorded as applied)")
+                success_count += 1
+            elif s.ok:
+                print(f"   ✅ Success ({s.server_ms:.1f} ms)")
                 success_count += 1
-                
-            except psycopg2.Error as e:
-                print(f"   ❌ Failed: {e}")
+            else:
+                print(f"   ❌ Failed: {s.error}")
                 error_count += 1
-                
-                # Continue on harmless errors
-                if "already exists" in str(e) or "already enabled" in str(e):
-                    print("   ⚠️  Continuing (likely harmless)")
         
         print()
         print("=" * 60)
@@ -107,18 +118,16 @@ def execute_rls_migration():
             print()
             print("🧪 Testing RLS policies...")
             try:
-                cursor.execute("SELECT COUNT(*) FROM tenants;")
-                count = cursor.fetchone()[0]
+                count = conn.execute("SELECT COUNT(*) FROM tenants;").fetchone()[0]
                 print(f"✅ Can query tenants table (found {count} records)")
-            except psycopg2.Error as e:
+            except psycopg.Error as e:
                 print(f"⚠️  Tenants query failed: {e}")
         
-        cursor.close()
         conn.close()
         
         return success_count > 0
         
-    except psycopg2.Error as e:
+    except psycopg.Error as e:
         print(f"❌ Database connection failed: {e}")
         return False
     except Exception as e:
@@ -129,14 +138,6 @@ if __name__ == "__main__":
     print("🔒 Starting RLS Migration (Python)...")
     print()
     
-    # Check if psycopg2 is available
-    try:
-        import psycopg2
-    except ImportError:
-        print("❌ psycopg2 not installed. Install with:")
-        print("   pip install psycopg2-binary")
-        sys.exit(1)
-    
     success = execute_rls_migration()
     
     if success:
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Checksummed ledger of applied migration statements.
+
+Every statement migration_runner applies is recorded in migration_meta.ledger
+with the sha256 of its text, the checksum of the whole unit (file or script)
+it came from, applied_at and its server-side duration. The row is written in
+the same transaction as the statement, so the ledger never claims work that
+was rolled back.
+
+Before a run the ledger rows of every unit are fetched in one query. Statements
+whose checksum is already recorded are skipped, so rerunning an applied file
+costs no transaction at all. Recorded checksums that no longer appear in the
+unit mean it was edited after it was applied; the runner refuses such a unit
+until the edit is accepted.
+
+The ledger lives in its own schema so it never shows up as drift in the public
+schema snapshot.
+
+    python scripts/migration_ledger.py                 (every unit in the ledger)
+    python scripts/migration_ledger.py migrations/stage3-enable-rls.sql
+"""
+import argparse
+import hashlib
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from sql_lexer import Statement
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+
+CREATE_SQL = (
+    'create schema if not exists migration_meta',
+    """
+    create table if not exists migration_meta.ledger (
+      unit text not null,
+      checksum text not null,
+      statement_index integer not null,
+      line integer not null,
+      unit_checksum text not null,
+      applied_at timestamptz not null default now(),
+      duration_ms double precision,
+      primary key (unit, checksum)
+    )
+    """,
+)
+
+SELECT_SQL = """
+select unit, checksum, statement_index, line, unit_checksum, applied_at, duration_ms
+from migration_meta.ledger
+where %(units)s::text[] is null or unit = any(%(units)s)
+order by unit, statement_index
+"""
+
+RECORD_SQL = """
+insert into migration_meta.ledger (unit, checksum, statement_index, line, unit_checksum, duration_ms)
+values (%s, %s, %s, %s, %s, %s)
+on conflict (unit, checksum) do update
+  set statement_index = excluded.statement_index,
+      line = excluded.line,
+      unit_checksum = excluded.unit_checksum,
+      applied_at = now(),
+      duration_ms = excluded.duration_ms
+"""
+
+# Keep unit_checksum on earlier rows in step when statements are appended to a unit
+RESTAMP_SQL = 'update migration_meta.ledger set unit_checksum = %s where unit = %s and unit_checksum <> %s'
+
+FORGET_SQL = 'delete from migration_meta.ledger where unit = %s and not (checksum = any(%s))'
+
+
+def unit_name(path: str) -> str:
+    """Ledger key for a migration file: its path relative to the repository root."""
+    return os.path.relpath(os.path.abspath(path), REPO_ROOT).replace(os.sep, '/')
+
+
+def statement_checksum(stmt: Statement) -> str:
+    return hashlib.sha256(stmt.sql.encode('utf-8')).hexdigest()
+
+
+def unit_checksum(statements: Sequence[Statement]) -> str:
+    """Checksum over the statements only, so comment edits between statements don't count."""
+    joined = '\n'.join(statement_checksum(s) for s in statements)
+    return hashlib.sha256(joined.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class UnitPlan:
+    unit: str
+    checksum: str
+    pending: List[Statement] = field(default_factory=list)
+    applied: int = 0
+    # Ledger rows whose statement is no longer in the unit
+    edited: List[Dict] = field(default_factory=list)
+
+
+class Ledger:
+    def __init__(self, rows: Iterable[Dict]):
+        self.units: Dict[str, Dict[str, Dict]] = {}
+        for row in rows:
+            self.units.setdefault(row['unit'], {})[row['checksum']] = row
+
+    @classmethod
+    def load(cls, conn, units: Optional[Sequence[str]] = None) -> 'Ledger':
+        """Fetch the rows of `units` (all units if None) in one query, creating the ledger on first use."""
+        try:
+            with conn.cursor(row_factory=dict_row) as cur:
+                cur.execute(SELECT_SQL, {'units': list(units) if units is not None else None})
+                rows = cur.fetchall()
+        except psycopg.errors.UndefinedTable:
+            conn.rollback()
+            for sql in CREATE_SQL:
+                conn.execute(sql)
+            rows = []
+        conn.commit()
+        return cls(rows)
+
+    def plan(self, unit: str, statements: Sequence[Statement]) -> UnitPlan:
+        recorded = self.units.get(unit, {})
+        plan = UnitPlan(unit, unit_checksum(statements))
+        current = set()
+        for stmt in statements:
+            checksum = statement_checksum(stmt)
+            current.add(checksum)
+            if checksum in recorded:
+                plan.applied += 1
+            else:
+                plan.pending.append(stmt)
+        plan.edited = [row for checksum, row in recorded.items() if checksum not in current]
+        return plan
+
+    @staticmethod
+    def _record_params(plan: UnitPlan, applied: Sequence[Tuple[Statement, Optional[float]]]) -> List[Tuple]:
+        return [
+            (plan.unit, statement_checksum(stmt), stmt.index, stmt.line, plan.checksum, ms)
+            for stmt, ms in applied
+        ]
+
+    @staticmethod
+    def record(cur, plan: UnitPlan, applied: Sequence[Tuple[Statement, Optional[float]]], restamp: bool = True) -> None:
+        """Queue ledger rows for `applied` (statement, server ms) on `cur`; the caller commits."""
+        if not applied:
+            return
+        cur.executemany(RECORD_SQL, Ledger._record_params(plan, applied))
+        if restamp:
+            Ledger.restamp(cur, plan)
+
+    @staticmethod
+    async def record_async(cur, plan: UnitPlan, applied: Sequence[Tuple[Statement, Optional[float]]]) -> None:
+        """record() for a psycopg.AsyncCursor; leaves restamping to the caller."""
+        if applied:
+            await cur.executemany(RECORD_SQL, Ledger._record_params(plan, applied))
+
+    @staticmethod
+    def restamp(cur, plan: UnitPlan) -> None:
+        cur.execute(RESTAMP_SQL, (plan.checksum, plan.unit, plan.checksum))
+
+    @staticmethod
+    def forget_edited(cur, plan: UnitPlan, statements: Sequence[Statement]) -> None:
+        """Drop the rows of statements that were edited out of the unit."""
+        cur.execute(FORGET_SQL, (plan.unit, [statement_checksum(s) for s in statements]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show what the migration ledger has recorded.')
+    parser.add_argument('files', nargs='*', help='Limit to these migration files')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    units = [unit_name(p) for p in args.files] or None
+    with psycopg.connect(db_url) as conn:
+        ledger = Ledger.load(conn, units)
+
+    if not ledger.units:
+        print('The migration ledger is empty.')
+        return
+    for unit in sorted(ledger.units):
+        rows = sorted(ledger.units[unit].values(), key=lambda r: r['statement_index'])
+        last = max(r['applied_at'] for r in rows)
+        total = sum(r['duration_ms'] or 0.0 for r in rows)
+        print(f'{unit}: {len(rows)} statement(s), last applied {last:%Y-%m-%d %H:%M:%S %Z}, {total:.1f} ms total')
+
+
+if __name__ == '__main__':
+    main()
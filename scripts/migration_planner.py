@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Dry-run planner for migration files.
+
+Runs nothing. For every statement it works out the lock mode PostgreSQL will
+take on the target table, what the statement does to the table (catalog only,
+full scan, index build, rewrite, DML), and how big that table is according to
+pg_class statistics (one query for all tables). DML is run through EXPLAIN,
+without ANALYZE. Statements are then ranked by what they would do to traffic:
+first by what the lock blocks, then by estimated duration. An UPDATE or
+DELETE without a WHERE clause, or a DO block that updates tables, holds row
+locks on every row it touches until it commits, so it ranks with the
+statements that block writes.
+
+Durations are order-of-magnitude estimates from table size and the
+throughput constants below. Use them to decide what to schedule off-peak or
+move to `migration_runner.py --online`, not as a deploy timer.
+
+    python scripts/migration_planner.py migrations/stage2-add-tenant-id-remaining-tables.sql
+    python scripts/migration_planner.py --offline --top 10 migrations/*.sql
+"""
+import argparse
+import json
+import os
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from ddl_graph import Token, read_name, skip_words, statement_objects, tokenize
+from migration_runner import executable
+from sql_lexer import SqlLexError, Statement, split_file
+
+# Weakest to strongest
+LOCK_MODES = [
+    'ACCESS SHARE', 'ROW SHARE', 'ROW EXCLUSIVE', 'SHARE UPDATE EXCLUSIVE',
+    'SHARE', 'SHARE ROW EXCLUSIVE', 'EXCLUSIVE', 'ACCESS EXCLUSIVE',
+]
+
+# What ordinary application traffic can no longer do while the lock is held (or queued)
+BLOCKS = {
+    'ACCESS EXCLUSIVE': 'reads and writes',
+    'EXCLUSIVE': 'writes',
+    'SHARE ROW EXCLUSIVE': 'writes',
+    'SHARE': 'writes',
+    'SHARE UPDATE EXCLUSIVE': 'other DDL and vacuum',
+    'ROW EXCLUSIVE': 'DDL',
+    'ROW SHARE': 'DDL',
+    'ACCESS SHARE': 'ACCESS EXCLUSIVE only',
+}
+# Row locks of an unfiltered UPDATE/DELETE (or DO block) held until commit
+TOUCHED_ROWS = 'writes to the touched rows'
+BLOCK_RANK = {'reads and writes': 3, 'writes': 2, TOUCHED_ROWS: 2}
+WORK_RANK = {'rewrite': 4, 'index': 3, 'scan': 2, 'dml': 2, 'unknown': 1, 'catalog': 0}
+
+# Rough throughput used for duration estimates
+SCAN_BYTES_PER_SEC = 200 * 1024 * 1024
+INDEX_BYTES_PER_SEC = 50 * 1024 * 1024
+REWRITE_BYTES_PER_SEC = 40 * 1024 * 1024
+DML_ROWS_PER_SEC = 50000
+
+# Defaults PostgreSQL must evaluate per row, which forces ADD COLUMN to rewrite
+VOLATILE_DEFAULTS = {'gen_random_uuid', 'uuid_generate_v4', 'random', 'clock_timestamp', 'nextval', 'timeofday'}
+SERIAL_TYPES = {'SERIAL', 'BIGSERIAL', 'SMALLSERIAL', 'SERIAL4', 'SERIAL8', 'SERIAL2'}
+
+STATS_SQL = """
+select c.relname as name, greatest(c.reltuples, 0)::float8 as rows,
+       pg_relation_size(c.oid) as table_bytes, pg_total_relation_size(c.oid) as total_bytes
+from pg_class c
+join pg_namespace n on n.oid = c.relnamespace
+where n.nspname = 'public' and c.relkind in ('r', 'p', 'm') and c.relname = any(%s)
+"""
+
+
+@dataclass
+class Action:
+    lock: Optional[str]
+    work: str               # catalog, scan, index, rewrite, dml, unknown
+    note: str = ''
+    # Other tables locked by the action (FK targets)
+    also_locks: Tuple[str, ...] = ()
+    # What application traffic is blocked, when it is not just what the lock mode blocks
+    blocks: Optional[str] = None
+
+
+@dataclass
+class StatementPlan:
+    path: str
+    index: int
+    line: int
+    summary: str
+    table: Optional[str] = None
+    lock: Optional[str] = None
+    blocks: str = 'nothing'
+    work: str = 'catalog'
+    rewrites: bool = False
+    rows: Optional[float] = None
+    table_bytes: Optional[int] = None
+    est_seconds: Optional[float] = None
+    explain_cost: Optional[float] = None
+    notes: List[str] = field(default_factory=list)
+
+    def rank_key(self):
+        return (BLOCK_RANK.get(self.blocks, 1 if self.lock else 0), self.est_seconds or 0.0, WORK_RANK[self.work])
+
+
+def _stronger(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if LOCK_MODES.index(a) >= LOCK_MODES.index(b) else b
+
+
+def _split_actions(tokens: Sequence[Token]) -> List[List[Token]]:
+    """ALTER TABLE subcommands, split on commas outside parentheses."""
+    actions: List[List[Token]] = [[]]
+    depth = 0
+    for tok in tokens:
+        if tok == ('punct', '('):
+            depth += 1
+        elif tok == ('punct', ')'):
+            depth -= 1
+        elif tok == ('punct', ',') and depth == 0:
+            actions.append([])
+            continue
+        actions[-1].append(tok)
+    return [a for a in actions if a]
+
+
+def _words(tokens: Sequence[Token]) -> List[str]:
+    return [t[1].upper() if t[0] == 'word' else t[1] for t in tokens]
+
+
+def _references(words: List[str]) -> Tuple[str, ...]:
+    return tuple(words[i + 1].lower() for i, w in enumerate(words[:-1]) if w == 'REFERENCES')
+
+
+def _filtered(tokens: Sequence[Token]) -> bool:
+    """True if the statement has a WHERE outside parentheses."""
+    depth = 0
+    for tok in tokens:
+        if tok == ('punct', '('):
+            depth += 1
+        elif tok == ('punct', ')'):
+            depth -= 1
+        elif depth == 0 and tok[0] == 'word' and tok[1].upper() == 'WHERE':
+            return True
+    return False
+
+
+def _dml_targets(tokens: Sequence[Token]) -> Tuple[str, ...]:
+    """Tables a procedural body updates, inserts into or deletes from."""
+    w = _words(tokens)
+    found = set()
+    for i, word in enumerate(w):
+        if word == 'UPDATE' or (word in ('INTO', 'FROM') and i and w[i - 1] in ('INSERT', 'DELETE')):
+            name = read_name(tokens, skip_words(tokens, i + 1, 'ONLY'))[0]
+            if name:
+                found.add(name)
+    return tuple(sorted(found))
+
+
+def classify_alter_action(tokens: Sequence[Token]) -> Action:
+    """Lock and work for one ALTER TABLE subcommand."""
+    w = _words(tokens)
+    text = ' '.join(w)
+    refs = _references(w)
+    not_valid = 'NOT VALID' in text
+
+    if w[:1] == ['ADD'] and 'CONSTRAINT' not in w[:2] and not any(k in w[:2] for k in ('PRIMARY', 'UNIQUE', 'FOREIGN', 'CHECK')):
+        # ADD [COLUMN] name type ...
+        if any(f.lower() in VOLATILE_DEFAULTS for f in w) or SERIAL_TYPES & set(w) or ('GENERATED' in w and 'STORED' in w):
+            return Action('ACCESS EXCLUSIVE', 'rewrite', 'volatile default or generated column rewrites the table')
+        if 'PRIMARY' in w or 'UNIQUE' in w:
+            return Action('ACCESS EXCLUSIVE', 'index', 'builds a unique index')
+        if refs:
+            return Action('ACCESS EXCLUSIVE', 'scan', 'inline REFERENCES validates existing rows', refs)
+        if 'CHECK' in w:
+            return Action('ACCESS EXCLUSIVE', 'scan', 'inline CHECK validates existing rows')
+        return Action('ACCESS EXCLUSIVE', 'catalog', 'add column is catalog-only')
+    if w[:1] == ['ADD']:
+        if 'FOREIGN' in w:
+            if not_valid:
+                return Action('SHARE ROW EXCLUSIVE', 'catalog', 'FK added NOT VALID', refs)
+            return Action('SHARE ROW EXCLUSIVE', 'scan', 'FK validates every existing row; add NOT VALID and VALIDATE separately', refs)
+        if 'CHECK' in w:
+            if not_valid:
+                return Action('ACCESS EXCLUSIVE', 'catalog', 'CHECK added NOT VALID')
+            return Action('ACCESS EXCLUSIVE', 'scan', 'CHECK validates every existing row under ACCESS EXCLUSIVE')
+        if 'PRIMARY' in w or 'UNIQUE' in w or 'EXCLUDE' in w:
+            if 'USING' in w and 'INDEX' in w:
+                return Action('ACCESS EXCLUSIVE', 'catalog', 'constraint adopts an existing index')
+            return Action('ACCESS EXCLUSIVE', 'index', 'builds the index under ACCESS EXCLUSIVE; build it CONCURRENTLY and add USING INDEX')
+        return Action('ACCESS EXCLUSIVE', 'unknown')
+    if w[:2] == ['VALIDATE', 'CONSTRAINT']:
+        return Action('SHARE UPDATE EXCLUSIVE', 'scan', 'validation scans without blocking reads or writes')
+    if w[:1] == ['DROP']:
+        return Action('ACCESS EXCLUSIVE', 'catalog')
+    if w[:1] == ['ALTER']:
+        if 'TYPE' in w:
+            return Action('ACCESS EXCLUSIVE', 'rewrite', 'type change rewrites the table unless binary coercible')
+        if 'SET' in w and 'NOT' in w and 'NULL' in w:
+            return Action('ACCESS EXCLUSIVE', 'scan', 'SET NOT NULL scans the table unless a validated CHECK (col IS NOT NULL) exists')
+        if 'STATISTICS' in w:
+            return Action('SHARE UPDATE EXCLUSIVE', 'catalog')
+        return Action('ACCESS EXCLUSIVE', 'catalog')
+    if w[:1] in (['ENABLE'], ['DISABLE']) and 'TRIGGER' in w[:3]:
+        return Action('SHARE ROW EXCLUSIVE', 'catalog')
+    if w[:1] in (['ENABLE'], ['DISABLE'], ['FORCE'], ['NO']) and 'SECURITY' in w:
+        return Action('ACCESS EXCLUSIVE', 'catalog')
+    if w[:1] == ['SET'] and len(w) > 1 and w[1] in ('LOGGED', 'UNLOGGED', 'TABLESPACE'):
+        return Action('ACCESS EXCLUSIVE', 'rewrite')
+    if w[:1] in (['RENAME'], ['OWNER'], ['SET']):
+        return Action('ACCESS EXCLUSIVE', 'catalog')
+    return Action('ACCESS EXCLUSIVE', 'unknown')
+
+
+def classify(stmt: Statement) -> Tuple[Optional[str], Action]:
+    """(target table, action) for a whole statement."""
+    kw = stmt.keywords
+    head = kw[0] if kw else ''
+    tokens = tokenize(stmt.sql)
+    objects = statement_objects(stmt)
+    table = next(iter(objects.writes)) if len(objects.writes) == 1 else None
+
+    if stmt.starts_with('ALTER', 'TABLE'):
+        # Skip ALTER TABLE [IF EXISTS] [ONLY] name
+        w = _words(tokens)
+        i = 2
+        while i < len(w) and w[i] in ('IF', 'EXISTS', 'ONLY'):
+            i += 1
+        i += 3 if i + 1 < len(w) and w[i + 1] == '.' else 1
+        combined = Action(None, 'catalog')
+        notes = []
+        refs: Tuple[str, ...] = ()
+        order = ['catalog', 'scan', 'index', 'rewrite', 'unknown']
+        for action_tokens in _split_actions(tokens[i:]):
+            action = classify_alter_action(action_tokens)
+            combined.lock = _stronger(combined.lock, action.lock)
+            if order.index(action.work) > order.index(combined.work):
+                combined.work = action.work
+            if action.note:
+                notes.append(action.note)
+            refs += action.also_locks
+        combined.note = '; '.join(notes)
+        combined.also_locks = refs
+        return table, combined
+
+    if head == 'CREATE' and 'INDEX' in kw[:3]:
+        if 'CONCURRENTLY' in kw:
+            return table, Action('SHARE UPDATE EXCLUSIVE', 'index', 'concurrent build: reads and writes continue')
+        return table, Action('SHARE', 'index', 'blocks writes for the whole build; use CREATE INDEX CONCURRENTLY')
+    if head in ('CREATE', 'ALTER', 'DROP') and 'POLICY' in kw[:3]:
+        return table, Action('ACCESS EXCLUSIVE', 'catalog')
+    if head in ('CREATE', 'DROP') and 'TRIGGER' in kw[:5]:
+        return table, Action('SHARE ROW EXCLUSIVE', 'catalog')
+    if head == 'CREATE' and 'TABLE' in kw[:4]:
+        refs = _references(_words(tokens))
+        return None, Action('SHARE ROW EXCLUSIVE' if refs else None, 'catalog', 'new table', refs)
+    if head == 'DROP' and kw[1:2] == ['TABLE']:
+        return table, Action('ACCESS EXCLUSIVE', 'catalog')
+    if head in ('UPDATE', 'DELETE'):
+        if _filtered(tokens):
+            return table, Action('ROW EXCLUSIVE', 'dml', blocks='writes to the matched rows')
+        return table, Action('ROW EXCLUSIVE', 'dml', 'no WHERE: locks every row until commit; batch it', blocks=TOUCHED_ROWS)
+    if head == 'INSERT':
+        return table, Action('ROW EXCLUSIVE', 'dml')
+    if head == 'SELECT':
+        return None, Action('ACCESS SHARE', 'dml', 'query')
+    if head == 'VACUUM' and 'FULL' in kw:
+        return table, Action('ACCESS EXCLUSIVE', 'rewrite')
+    if head in ('CLUSTER',):
+        return table, Action('ACCESS EXCLUSIVE', 'rewrite')
+    if head == 'DO':
+        targets = _dml_targets(tokens)
+        if targets:
+            return None, Action('ROW EXCLUSIVE', 'dml', 'DO block updates ' + ', '.join(targets), targets, TOUCHED_ROWS)
+        return None, Action(None, 'unknown', 'DO block')
+    if head in ('CREATE', 'GRANT', 'REVOKE', 'COMMENT', 'ALTER', 'DROP'):
+        return table, Action(None, 'catalog')
+    return table, Action(None, 'unknown')
+
+
+def fetch_stats(conn, tables: Sequence[str]) -> Dict[str, Dict]:
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(STATS_SQL, (list(tables),))
+        return {row['name']: row for row in cur.fetchall()}
+
+
+def explain(conn, stmt: Statement) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """(estimated rows, total cost, error) from EXPLAIN without executing the statement."""
+    try:
+        (doc,) = conn.execute('explain (format json) ' + stmt.sql, prepare=False).fetchone()
+        plan = doc[0]['Plan']
+        return float(plan.get('Plan Rows', 0)), float(plan.get('Total Cost', 0)), None
+    except psycopg.Error as e:
+        return None, None, (str(e).strip() or type(e).__name__).splitlines()[0]
+    finally:
+        conn.rollback()
+
+
+def estimate(plan: StatementPlan, stats: Optional[Dict]) -> None:
+    if plan.work == 'dml':
+        if plan.rows is not None:
+            plan.est_seconds = plan.rows / DML_ROWS_PER_SEC
+        return
+    if stats is None:
+        return
+    plan.rows = stats['rows']
+    plan.table_bytes = stats['table_bytes']
+    if plan.work == 'scan':
+        plan.est_seconds = stats['table_bytes'] / SCAN_BYTES_PER_SEC
+    elif plan.work == 'index':
+        plan.est_seconds = stats['table_bytes'] / INDEX_BYTES_PER_SEC
+    elif plan.work == 'rewrite':
+        plan.est_seconds = stats['total_bytes'] / REWRITE_BYTES_PER_SEC
+    elif plan.work == 'catalog':
+        plan.est_seconds = 0.0
+
+
+def plan_files(paths: Sequence[str], conn=None) -> List[StatementPlan]:
+    plans: List[StatementPlan] = []
+    actions: List[Tuple[StatementPlan, Statement, Action]] = []
+    created = set()
+    for path in paths:
+        for stmt in executable(split_file(path)):
+            table, action = classify(stmt)
+            plan = StatementPlan(path, stmt.index, stmt.line, stmt.summary(60), table=table,
+                                 lock=action.lock, work=action.work)
+            plan.blocks = action.blocks or (BLOCKS.get(action.lock, 'nothing') if action.lock else 'nothing')
+            plan.rewrites = action.work == 'rewrite'
+            if action.note:
+                plan.notes.append(action.note)
+            if action.also_locks and action.work != 'dml':
+                plan.notes.append(f"also locks {', '.join(action.also_locks)} ({action.lock})")
+            if stmt.starts_with('CREATE', 'TABLE'):
+                created.update(statement_objects(stmt).writes)
+            elif table in created:
+                plan.notes.append('table is created earlier in this run; current statistics do not apply')
+            if action.lock == 'ACCESS EXCLUSIVE':
+                plan.notes.append('queues all traffic if it waits for the lock; run with a lock_timeout')
+            plans.append(plan)
+            actions.append((plan, stmt, action))
+
+    if conn is not None:
+        tables = {p.table for p in plans if p.table} | {t for _, _, a in actions for t in a.also_locks}
+        stats = fetch_stats(conn, sorted(tables))
+        conn.commit()
+        for plan, stmt, action in actions:
+            if action.work == 'dml' and stmt.keywords[:1] != ['DO']:
+                rows, cost, error = explain(conn, stmt)
+                plan.rows, plan.explain_cost = rows, cost
+                if error:
+                    plan.notes.append(f'EXPLAIN failed: {error}')
+            elif action.work == 'dml':
+                # Body can't be explained; assume it touches every row of the tables it updates
+                known = [stats[t]['rows'] for t in action.also_locks if t in stats]
+                plan.rows = sum(known) if known else None
+            estimate(plan, stats.get(plan.table) if plan.table else None)
+    return plans
+
+
+def _size(n: Optional[int]) -> str:
+    if n is None:
+        return '?'
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if n < 1024:
+            return f'{n:.0f} {unit}'
+        n /= 1024
+    return f'{n:.1f} TB'
+
+
+def print_report(plans: List[StatementPlan], top: int) -> None:
+    ranked = sorted(plans, key=lambda p: p.rank_key(), reverse=True)
+    shown = [p for p in ranked if p.lock][:top] if top else [p for p in ranked if p.lock]
+    print(f'{len(plans)} statement(s); {sum(1 for p in plans if p.blocks == "reads and writes")} block reads and writes, '
+          f'{sum(1 for p in plans if BLOCK_RANK.get(p.blocks) == 2)} block writes, {sum(1 for p in plans if p.rewrites)} rewrite a table.')
+    print()
+    for p in shown:
+        est = f'~{p.est_seconds:.2f}s' if p.est_seconds is not None else '?'
+        rows = f'{p.rows:,.0f} rows' if p.rows is not None else '? rows'
+        print(f'{os.path.basename(p.path)}:{p.line}  #{p.index}  {p.lock}  blocks {p.blocks}  {p.work}  {est}  '
+              f'{rows} / {_size(p.table_bytes)}')
+        print(f'    {p.summary}')
+        for note in p.notes:
+            print(f'    - {note}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report lock modes, rewrites and cost estimates for migration files without running them.')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--offline', action='store_true', help='Skip table statistics and EXPLAIN (no database needed)')
+    parser.add_argument('--top', type=int, default=0, help='Only show the N highest-ranked statements')
+    parser.add_argument('--json', action='store_true', help='Print every statement plan as JSON')
+    args = parser.parse_args()
+
+    try:
+        if args.offline:
+            plans = plan_files(args.files)
+        else:
+            load_dotenv()
+            db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+            if not db_url:
+                print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment; use --offline.', file=sys.stderr)
+                sys.exit(2)
+            with psycopg.connect(db_url) as conn:
+                plans = plan_files(args.files, conn)
+    except (SqlLexError, OSError) as e:
+        print(f'ERROR {e}', file=sys.stderr)
+        sys.exit(2)
+
+    if args.json:
+        print(json.dumps([asdict(p) for p in sorted(plans, key=lambda p: p.rank_key(), reverse=True)], indent=2))
+    else:
+        print_report(plans, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Per-statement profile of a migration run.
+
+Applies a unit the way migration_runner does by default (one transaction,
+per-statement savepoints with --keep-going, autocommit statements on their
+own, ledger rows committed with the work) but syncs after every statement so
+each one can be measured:
+
+    wall_ms     client-side time for the statement's round trip
+    server_ms   clock_timestamp() delta around the statement
+    wal_bytes   pg_current_wal_insert_lsn() delta around the statement; this is
+                the WAL replicas have to replay, so it predicts replication lag.
+                It includes WAL other sessions wrote meanwhile, so profile a
+                quiet database for exact numbers
+    rows        rows affected (DML only)
+    lock waits  a second connection samples pg_stat_activity/pg_locks every
+                --interval ms while the migration runs; samples where the
+                migration backend waits on a lock are attributed to the statement
+                whose server-side window contains them, together with the
+                blocking backends and their queries. A failed statement (say,
+                cancelled by lock_timeout) gets the window from the previous
+                statement's end to just after its error
+
+The profile is written as JSON, and as folded stacks (one "unit;statement
+weight" line per statement) that flamegraph.pl or speedscope can render. A
+flame-style summary is printed to the terminal.
+
+Profiling costs one round trip per statement instead of one per file, so use
+it to find what dominates deploy time, not for routine deploys. Statements
+already recorded in the migration ledger are skipped; profile a scratch
+database with --no-ledger to measure a whole file again.
+
+    python scripts/migration_profiler.py migrations/stage4-supabase-auth-setup.sql
+    python scripts/migration_profiler.py --no-ledger --json profile.json --folded profile.folded migrations/stage2-*.sql
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import psycopg
+from psycopg.pq import TransactionStatus
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from migration_ledger import Ledger, UnitPlan, unit_name
+from migration_runner import DUPLICATE_SQLSTATES, SAVEPOINT, MigrationError, _commit, _error_text, executable
+from sql_lexer import SqlLexError, Statement, needs_autocommit, split_file
+
+MARKER_SQL = 'select clock_timestamp(), pg_current_wal_insert_lsn()::text'
+
+# Empty unless the backend is waiting on a heavyweight lock
+SAMPLE_SQL = """
+select clock_timestamp() as at, a.wait_event,
+       (select string_agg(l.mode || ' on ' || coalesce(l.relation::regclass::text, l.locktype), ', ')
+          from pg_locks l where l.pid = a.pid and not l.granted) as waiting_for,
+       (select coalesce(json_agg(json_build_object('pid', b.pid, 'state', b.state, 'query', left(b.query, 200))), '[]')
+          from pg_stat_activity b where b.pid = any(pg_blocking_pids(a.pid))) as blockers
+from pg_stat_activity a
+where a.pid = %s and a.wait_event_type = 'Lock'
+"""
+
+BAR_WIDTH = 30
+
+
+@dataclass
+class StatementProfile:
+    index: int
+    line: int
+    summary: str
+    ok: bool = True
+    existed: bool = False
+    wall_ms: float = 0.0
+    server_ms: Optional[float] = None
+    wal_bytes: Optional[int] = None
+    rows: Optional[int] = None
+    lock_samples: int = 0
+    # lock_samples * sampling interval; an estimate, not a measurement
+    lock_wait_ms: float = 0.0
+    waiting_for: List[str] = field(default_factory=list)
+    blockers: List[Dict] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class UnitProfile:
+    unit: str
+    statements: List[StatementProfile] = field(default_factory=list)
+    committed: bool = False
+    skipped: int = 0
+    wall_ms: float = 0.0
+    interval_ms: float = 0.0
+
+    @property
+    def wal_bytes(self) -> int:
+        return sum(s.wal_bytes or 0 for s in self.statements)
+
+    @property
+    def lock_wait_ms(self) -> float:
+        return sum(s.lock_wait_ms for s in self.statements)
+
+    def folded(self, weight: str = 'wall_ms') -> List[str]:
+        """Folded-stack lines ("unit;statement value") weighted by `weight` (wall_ms or wal_bytes)."""
+        lines = []
+        for s in self.statements:
+            value = getattr(s, weight) or 0
+            if weight == 'wall_ms':
+                value *= 1000  # integer microseconds
+            frame = f'#{s.index} line {s.line} {s.summary}'.replace(';', ',')
+            lines.append(f'{self.unit};{frame} {int(value)}')
+        return lines
+
+
+class LockSampler:
+    """Samples lock waits of backend `pid` from a second connection in a background thread."""
+
+    def __init__(self, conninfo: str, pid: int, interval_ms: float):
+        self.conninfo = conninfo
+        self.pid = pid
+        self.interval_ms = interval_ms
+        self.samples: List[Dict] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[str] = None
+
+    def _run(self) -> None:
+        try:
+            with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                with conn.cursor(row_factory=dict_row) as cur:
+                    while not self._stop.is_set():
+                        cur.execute(SAMPLE_SQL, (self.pid,))
+                        self.samples.extend(cur.fetchall())
+                        self._stop.wait(self.interval_ms / 1000.0)
+        except psycopg.Error as e:
+            self.error = _error_text(e)
+
+    def __enter__(self) -> 'LockSampler':
+        self._thread = threading.Thread(target=self._run, name='lock-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def attribute(self, entry: StatementProfile, started: datetime, ended: datetime) -> None:
+        for sample in self.samples:
+            if started <= sample['at'] <= ended:
+                entry.lock_samples += 1
+                if sample['waiting_for'] and sample['waiting_for'] not in entry.waiting_for:
+                    entry.waiting_for.append(sample['waiting_for'])
+                for blocker in sample['blockers']:
+                    if blocker['pid'] not in {b['pid'] for b in entry.blockers}:
+                        entry.blockers.append(blocker)
+        entry.lock_wait_ms = entry.lock_samples * self.interval_ms
+
+
+def _lsn(text: str) -> int:
+    high, low = text.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def _measure(conn, stmt: Statement, savepoint: bool):
+    """Run `stmt` between two markers in one sync; returns (before, after, rowcount, error)."""
+    with conn.pipeline() as p:
+        before = conn.execute(MARKER_SQL, prepare=False)
+        if savepoint:
+            conn.execute(f'savepoint {SAVEPOINT}', prepare=False)
+        cur = conn.execute(stmt.sql, prepare=False)
+        if savepoint:
+            conn.execute(f'release savepoint {SAVEPOINT}', prepare=False)
+        after = conn.execute(MARKER_SQL, prepare=False)
+        try:
+            p.sync()
+        except psycopg.Error as e:
+            return None, None, None, e
+        return before.fetchone(), after.fetchone(), cur.rowcount, None
+
+
+def _measure_autocommit(conn, stmt: Statement):
+    """Autocommit statements can't share a pipeline sync (it would be an implicit transaction)."""
+    conn.autocommit = True
+    try:
+        before = conn.execute(MARKER_SQL).fetchone()
+        try:
+            cur = conn.execute(stmt.sql, prepare=False)
+        except psycopg.Error as e:
+            return None, None, None, e
+        after = conn.execute(MARKER_SQL).fetchone()
+        return before, after, cur.rowcount, None
+    finally:
+        conn.autocommit = False
+
+
+def _server_now(conn) -> datetime:
+    """Server clock; an idle connection is read in autocommit so no transaction is left open."""
+    idle = conn.info.transaction_status == TransactionStatus.IDLE
+    if idle:
+        conn.autocommit = True
+    try:
+        return conn.execute('select clock_timestamp()', prepare=False).fetchone()[0]
+    finally:
+        if idle:
+            conn.autocommit = False
+
+
+def profile_unit(conn, conninfo: str, unit: str, statements: Sequence[Statement], keep_going: bool = False,
+                 ledger: Optional[Ledger] = None, adopt_existing: bool = False,
+                 interval_ms: float = 50.0) -> UnitProfile:
+    """Apply and profile `statements` as migration unit `unit` on `conn` (autocommit must be off)."""
+    try:
+        statements = executable(statements)
+    except MigrationError as e:
+        raise MigrationError(f'{unit}: {e}') from e
+
+    profile = UnitProfile(unit, interval_ms=interval_ms)
+    plan: Optional[UnitPlan] = None
+    pending = statements
+    if ledger is not None:
+        plan = ledger.plan(unit, statements)
+        if plan.edited:
+            raise MigrationError(f'{unit}: edited after it was applied; run migration_runner.py --accept-edited first')
+        profile.skipped = plan.applied
+        pending = plan.pending
+
+    savepoints = keep_going or adopt_existing
+    applied: List[Tuple[Statement, Optional[float]]] = []
+    windows = []
+    started = time.perf_counter()
+    ok = True
+    with LockSampler(conninfo, conn.info.backend_pid, interval_ms) as sampler:
+        # Server time the next statement's window starts at when it fails without markers
+        last_marker = _server_now(conn)
+        for stmt in pending:
+            autocommit = needs_autocommit(stmt)
+            if autocommit and applied:
+                # Commit the open transaction first, as migration_runner's segments do
+                _commit(conn, plan, applied)
+                applied = []
+            t0 = time.perf_counter()
+            if autocommit:
+                before, after, rowcount, error = _measure_autocommit(conn, stmt)
+            else:
+                before, after, rowcount, error = _measure(conn, stmt, savepoints)
+            entry = StatementProfile(stmt.index, stmt.line, stmt.summary(), wall_ms=(time.perf_counter() - t0) * 1000.0)
+            profile.statements.append(entry)
+
+            if error is None:
+                entry.server_ms = (after[0] - before[0]).total_seconds() * 1000.0
+                entry.wal_bytes = _lsn(after[1]) - _lsn(before[1])
+                entry.rows = rowcount if rowcount is not None and rowcount >= 0 else None
+                windows.append((entry, before[0], after[0]))
+                last_marker = after[0]
+                if autocommit:
+                    if plan is not None:
+                        _commit(conn, plan, [(stmt, entry.server_ms)])
+                else:
+                    applied.append((stmt, entry.server_ms))
+                continue
+
+            entry.error = _error_text(error)
+            if savepoints and not autocommit:
+                conn.execute(f'rollback to savepoint {SAVEPOINT}')
+                conn.execute(f'release savepoint {SAVEPOINT}')
+            elif not autocommit:
+                # Without savepoints the transaction is aborted and nothing in it is kept
+                conn.rollback()
+                applied = []
+            # The statement that failed is often the one that waited longest on a lock
+            failed_at = _server_now(conn)
+            windows.append((entry, last_marker, failed_at))
+            last_marker = failed_at
+            if adopt_existing and getattr(error, 'sqlstate', None) in DUPLICATE_SQLSTATES:
+                entry.existed = True
+                if not autocommit:
+                    applied.append((stmt, None))
+                elif plan is not None:
+                    _commit(conn, plan, [(stmt, None)])
+                continue
+            entry.ok = False
+            if keep_going:
+                continue
+            conn.rollback()
+            applied = []
+            ok = False
+            break
+
+        if ok or keep_going:
+            _commit(conn, plan, applied)
+    profile.committed = ok or keep_going
+    profile.wall_ms = (time.perf_counter() - started) * 1000.0
+
+    for entry, begun, ended in windows:
+        sampler.attribute(entry, begun, ended)
+    if sampler.error:
+        print(f'WARNING lock sampling stopped: {sampler.error}', file=sys.stderr)
+    return profile
+
+
+def profile_file(conn, conninfo: str, path: str, **kwargs) -> UnitProfile:
+    """profile_unit() for the migration file at `path`."""
+    try:
+        statements = split_file(path)
+    except SqlLexError as e:
+        raise MigrationError(f'{path}: {e}') from e
+    return profile_unit(conn, conninfo, unit_name(path), statements, **kwargs)
+
+
+def _size(n: float) -> str:
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if n < 1024:
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+    return f'{n:.1f} TB'
+
+
+def print_summary(profile: UnitProfile, top: int = 15) -> None:
+    """Flame-style summary: statements by share of wall time, with their WAL and lock waits."""
+    skipped = f', {profile.skipped} already applied' if profile.skipped else ''
+    print(f'{profile.unit}: {len(profile.statements)} statement(s){skipped}, {profile.wall_ms:.1f} ms wall, '
+          f'{_size(profile.wal_bytes)} WAL, ~{profile.lock_wait_ms:.0f} ms waiting on locks'
+          + ('' if profile.committed else ' (ROLLED BACK)'))
+    total = sum(s.wall_ms for s in profile.statements) or 1.0
+    total_wal = profile.wal_bytes or 1
+    for s in sorted(profile.statements, key=lambda s: s.wall_ms, reverse=True)[:top]:
+        share = s.wall_ms / total
+        bar = '█' * max(1, round(share * BAR_WIDTH))
+        wal = f'{_size(s.wal_bytes)} WAL ({100 * s.wal_bytes / total_wal:.0f}%)' if s.wal_bytes is not None else ''
+        rows = f'  {s.rows} row(s)' if s.rows is not None else ''
+        print(f'  {bar:<{BAR_WIDTH}} {100 * share:5.1f}%  {s.wall_ms:8.1f} ms  #{s.index:<3} {s.summary}')
+        details = f'{wal}{rows}'.strip()
+        if s.lock_samples:
+            details += f'  lock wait ~{s.lock_wait_ms:.0f} ms on {"; ".join(s.waiting_for) or "?"}'
+            for b in s.blockers:
+                details += f'\n{"":>{BAR_WIDTH + 1}}blocked by pid {b["pid"]} ({b["state"]}): {b["query"]}'
+        if s.error and not s.existed:
+            details += f'  ERROR {s.error}'
+        if details:
+            print(f'  {"":<{BAR_WIDTH}} {details}')
+
+
+def write_outputs(profiles: Sequence[UnitProfile], json_path: Optional[str], folded_path: Optional[str],
+                  weight: str = 'wall_ms') -> None:
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump([dict(asdict(p), wal_bytes=p.wal_bytes, lock_wait_ms=p.lock_wait_ms) for p in profiles], f, indent=2)
+    if folded_path:
+        with open(folded_path, 'w', encoding='utf-8') as f:
+            for p in profiles:
+                f.write('\n'.join(p.folded(weight)) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply migration files one synced statement at a time and profile each statement.')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--keep-going', action='store_true', help='Roll back only the failing statement (per-statement savepoints)')
+    parser.add_argument('--adopt-existing', action='store_true', help='Record statements failing with "already exists" as applied')
+    parser.add_argument('--no-ledger', action='store_true', help='Run every statement and record nothing')
+    parser.add_argument('--interval', type=float, default=50.0, metavar='MS', help='Lock sampling interval')
+    parser.add_argument('--json', metavar='PATH', help='Write the profile as JSON')
+    parser.add_argument('--folded', metavar='PATH', help='Write folded stacks for flamegraph.pl / speedscope')
+    parser.add_argument('--weight', choices=('wall_ms', 'wal_bytes'), default='wall_ms', help='Weight of the folded stacks')
+    parser.add_argument('--top', type=int, default=15, help='Statements shown per file in the summary')
+    args = parser.parse_args()
+
+    try:
+        units = [(unit_name(path), split_file(path)) for path in args.files]
+    except (SqlLexError, OSError) as e:
+        print(f'ERROR {e}', file=sys.stderr)
+        sys.exit(2)
+
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    profiles: List[UnitProfile] = []
+    with psycopg.connect(db_url) as conn:
+        ledger = None if args.no_ledger else Ledger.load(conn, [unit for unit, _ in units])
+        for unit, statements in units:
+            try:
+                profile = profile_unit(conn, db_url, unit, statements, keep_going=args.keep_going, ledger=ledger,
+                                       adopt_existing=args.adopt_existing, interval_ms=args.interval)
+            except MigrationError as e:
+                print(f'ERROR {e}', file=sys.stderr)
+                sys.exit(2)
+            profiles.append(profile)
+            print_summary(profile, args.top)
+            if not profile.committed:
+                break
+
+    write_outputs(profiles, args.json, args.folded, args.weight)
+    sys.exit(0 if all(p.committed and all(s.ok for s in p.statements) for p in profiles) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Apply SQL migration files through psycopg pipeline mode.
+
+Each file is split by sql_lexer and applied in one transaction: every
+statement is queued on the pipeline and the whole batch is synced once, so
+the run costs one network round trip per file instead of one per statement.
+A clock_timestamp() marker after each statement gives its server-side
+duration.
+
+Applied statements are recorded in the migration ledger (migration_ledger.py)
+inside the same transaction. Statements already in the ledger are skipped,
+so rerunning an up-to-date set of files costs one lookup. A file whose
+applied statements were edited is refused until --accept-edited; --baseline
+records a file as applied without running it (for databases migrated by hand).
+
+By default the first failure rolls the whole file back. With --keep-going
+each statement runs inside its own savepoint: a failing statement is rolled
+back to that savepoint, reported, and the rest of the file is re-queued.
+--adopt-existing treats "already exists" failures as applied work and
+records them, which is how the older idempotent scripts behaved.
+
+--online applies statements one at a time through online_ddl.py instead:
+each runs in its own short transaction under a lock_timeout, is retried with
+jittered backoff when its lock is not granted, and index builds and
+constraint additions are rewritten to CONCURRENTLY / NOT VALID + VALIDATE.
+Time lost to lock timeouts is reported per statement.
+
+--parallel N applies statements that touch disjoint objects concurrently over
+N connections, following the dependency graph from ddl_graph.py: a statement
+starts once every earlier statement it depends on has committed (a helper
+function before the policies that call it, for example). Each statement is its
+own transaction; after a failure nothing that depends on it is started.
+
+Statements that cannot run in a transaction block (CREATE INDEX CONCURRENTLY,
+VACUUM, ...) split the file: the statements around them are committed as
+separate pipelined transactions and they run on their own in autocommit.
+Explicit BEGIN/COMMIT in a file are skipped because the runner already wraps
+the file in a transaction.
+
+    python scripts/migration_runner.py migrations/stage4-supabase-auth-setup.sql
+    python scripts/migration_runner.py --keep-going migrations/stage3-*.sql
+    python scripts/migration_runner.py --online --lock-timeout 1000 migrations/add-activity-logs.sql
+    python scripts/migration_runner.py --parallel 4 migrations/stage3-enable-rls.sql
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import psycopg
+from dotenv import load_dotenv
+
+from ddl_graph import build_graph
+from migration_ledger import Ledger, UnitPlan, unit_name
+from online_ddl import OnlinePolicy, execute_online, set_lock_timeout
+from sql_lexer import SqlLexError, Statement, needs_autocommit, split_file, split_statements
+
+SAVEPOINT = 'migration_runner_stmt'
+MARKER_SQL = 'select clock_timestamp()'
+
+# duplicate_table, duplicate_object, duplicate_column, duplicate_function, duplicate_schema
+DUPLICATE_SQLSTATES = {'42P07', '42710', '42701', '42723', '42P06'}
+
+
+class MigrationError(Exception):
+    pass
+
+
+@dataclass
+class StatementResult:
+    index: int
+    line: int
+    summary: str
+    ok: bool = True
+    existed: bool = False
+    server_ms: Optional[float] = None
+    error: Optional[str] = None
+    # Online mode only
+    rewritten: bool = False
+    retries: int = 0
+    lock_wait_ms: Optional[float] = None
+
+
+@dataclass
+class FileResult:
+    path: str
+    statements: List[StatementResult] = field(default_factory=list)
+    committed: bool = False
+    round_trips: int = 0
+    elapsed_ms: float = 0.0
+    skipped: int = 0
+    baselined: int = 0
+    # Statement indexes recorded in the ledger that are no longer in the file
+    edited: List[int] = field(default_factory=list)
+
+    @property
+    def failed(self) -> List[StatementResult]:
+        return [s for s in self.statements if not s.ok]
+
+    @property
+    def server_ms(self) -> float:
+        return sum(s.server_ms or 0.0 for s in self.statements)
+
+    @property
+    def lock_wait_ms(self) -> float:
+        return sum(s.lock_wait_ms or 0.0 for s in self.statements)
+
+
+def executable(statements: Sequence[Statement]) -> List[Statement]:
+    """Drop the file's own transaction control; the runner supplies the transaction."""
+    out: List[Statement] = []
+    for stmt in statements:
+        if stmt.keywords[:1] in (['BEGIN'], ['COMMIT'], ['END']) or stmt.starts_with('START', 'TRANSACTION'):
+            continue
+        if stmt.keywords[:1] in (['ROLLBACK'], ['ABORT'], ['SAVEPOINT'], ['RELEASE']):
+            raise MigrationError(f'line {stmt.line}: {stmt.keywords[0]} is not supported inside a migration file')
+        out.append(stmt)
+    return out
+
+
+def plan_segments(statements: Sequence[Statement]) -> List[List[Statement]]:
+    """Group statements into transaction segments; autocommit statements stand alone."""
+    segments: List[List[Statement]] = []
+    current: List[Statement] = []
+    for stmt in statements:
+        if needs_autocommit(stmt):
+            if current:
+                segments.append(current)
+                current = []
+            segments.append([stmt])
+        else:
+            current.append(stmt)
+    if current:
+        segments.append(current)
+    return segments
+
+
+def _duration_ms(before, after) -> float:
+    return (after - before).total_seconds() * 1000.0
+
+
+def _run_batch(conn, batch: List[Statement], savepoints: bool):
+    """Queue `batch` on one pipeline sync.
+
+    Returns (per-statement server ms for the statements that completed, error or None).
+    The statement that failed, if any, is batch[len(durations)].
+    """
+    markers = []
+    error = None
+    with conn.pipeline() as p:
+        start = conn.cursor()
+        start.execute(MARKER_SQL, prepare=False)
+        for stmt in batch:
+            if savepoints:
+                conn.execute(f'savepoint {SAVEPOINT}', prepare=False)
+            conn.execute(stmt.sql, prepare=False)
+            if savepoints:
+                conn.execute(f'release savepoint {SAVEPOINT}', prepare=False)
+            marker = conn.cursor()
+            marker.execute(MARKER_SQL, prepare=False)
+            markers.append(marker)
+        try:
+            p.sync()
+        except psycopg.Error as e:
+            error = e
+
+        durations: List[float] = []
+        try:
+            previous = start.fetchone()[0]
+            for marker in markers:
+                stamp = marker.fetchone()[0]
+                durations.append(_duration_ms(previous, stamp))
+                previous = stamp
+        except psycopg.Error:
+            # Markers after the failing statement were aborted with it
+            pass
+    return durations, error
+
+
+def _error_text(error: Exception) -> str:
+    return (str(error).strip() or type(error).__name__).splitlines()[0]
+
+
+def _commit(conn, plan: Optional[UnitPlan], applied: Sequence[Tuple[Statement, Optional[float]]]) -> None:
+    """Record `applied` in the ledger and commit, in one round trip."""
+    with conn.pipeline():
+        if plan is not None:
+            with conn.cursor() as cur:
+                Ledger.record(cur, plan, applied)
+        conn.commit()
+
+
+def run_segment(conn, segment: List[Statement], result: FileResult, plan: Optional[UnitPlan],
+                keep_going: bool, adopt_existing: bool) -> bool:
+    """Apply one transaction segment; returns False if it was rolled back."""
+    savepoints = keep_going or adopt_existing
+    applied: List[Tuple[Statement, Optional[float]]] = []
+    pending = list(segment)
+    while pending:
+        durations, error = _run_batch(conn, pending, savepoints)
+        result.round_trips += 1
+        for stmt, ms in zip(pending, durations):
+            result.statements.append(StatementResult(stmt.index, stmt.line, stmt.summary(), server_ms=ms))
+            applied.append((stmt, ms))
+        if error is None:
+            break
+
+        failed = pending[len(durations)]
+        if adopt_existing and getattr(error, 'sqlstate', None) in DUPLICATE_SQLSTATES:
+            result.statements.append(StatementResult(failed.index, failed.line, failed.summary(), existed=True, error=_error_text(error)))
+            applied.append((failed, None))
+        elif keep_going:
+            result.statements.append(StatementResult(failed.index, failed.line, failed.summary(), ok=False, error=_error_text(error)))
+        else:
+            result.statements.append(StatementResult(failed.index, failed.line, failed.summary(), ok=False, error=_error_text(error)))
+            conn.rollback()
+            result.round_trips += 1
+            return False
+        # One extra round trip to recover, then re-queue whatever follows the failure
+        conn.execute(f'rollback to savepoint {SAVEPOINT}')
+        conn.execute(f'release savepoint {SAVEPOINT}')
+        result.round_trips += 1
+        pending = pending[len(durations) + 1:]
+
+    _commit(conn, plan, applied)
+    result.round_trips += 1
+    return True
+
+
+def run_autocommit(conn, stmt: Statement, result: FileResult, plan: Optional[UnitPlan]) -> bool:
+    conn.autocommit = True
+    started = time.perf_counter()
+    try:
+        conn.execute(stmt.sql, prepare=False)
+    except psycopg.Error as e:
+        result.statements.append(StatementResult(stmt.index, stmt.line, stmt.summary(), ok=False, error=_error_text(e)))
+        return False
+    finally:
+        conn.autocommit = False
+        result.round_trips += 1
+    # No server-side marker outside a transaction; client time is the best we have
+    elapsed = (time.perf_counter() - started) * 1000.0
+    result.statements.append(StatementResult(stmt.index, stmt.line, stmt.summary(), server_ms=elapsed))
+    if plan is not None:
+        _commit(conn, plan, [(stmt, elapsed)])
+        result.round_trips += 1
+    return True
+
+
+def run_online(conn, statements: Sequence[Statement], result: FileResult, plan: Optional[UnitPlan],
+               policy: OnlinePolicy, keep_going: bool, adopt_existing: bool) -> bool:
+    """Apply statements one at a time with lock_timeout retries; returns False on a failure that stops the unit."""
+    ok = True
+    set_lock_timeout(conn, policy)
+    try:
+        for stmt in statements:
+            record = None
+            if plan is not None:
+                record = lambda cur, ms, stmt=stmt: Ledger.record(cur, plan, [(stmt, ms)])
+            outcome = execute_online(conn, stmt, policy, before_commit=record)
+            # Each attempt is an execute plus a commit or rollback
+            result.round_trips += (len(outcome.steps) + outcome.retries) * 2
+            entry = StatementResult(stmt.index, stmt.line, stmt.summary(), server_ms=outcome.server_ms,
+                                    rewritten=outcome.rewritten, retries=outcome.retries,
+                                    lock_wait_ms=outcome.lock_wait_ms)
+            result.statements.append(entry)
+            if outcome.error is None:
+                continue
+            entry.server_ms = None
+            entry.error = _error_text(outcome.error)
+            if adopt_existing and getattr(outcome.error, 'sqlstate', None) in DUPLICATE_SQLSTATES:
+                entry.existed = True
+                if plan is not None:
+                    _commit(conn, plan, [(stmt, None)])
+                continue
+            entry.ok = False
+            ok = False
+            if not keep_going:
+                break
+    finally:
+        set_lock_timeout(conn, None)
+    return ok or keep_going
+
+
+async def _run_graph(conninfo: str, size: int, statements: Sequence[Statement], result: FileResult,
+                     plan: Optional[UnitPlan], keep_going: bool, adopt_existing: bool) -> bool:
+    graph = build_graph(statements)
+    entries: List[Optional[StatementResult]] = [None] * len(statements)
+    done = [asyncio.Event() for _ in statements]
+    stop = False
+
+    conns = [await psycopg.AsyncConnection.connect(conninfo) for _ in range(min(size, len(statements)))]
+    pool: asyncio.Queue = asyncio.Queue()
+    for aconn in conns:
+        pool.put_nowait(aconn)
+
+    async def apply(aconn, stmt: Statement) -> StatementResult:
+        entry = StatementResult(stmt.index, stmt.line, stmt.summary())
+        started = time.perf_counter()
+        try:
+            if needs_autocommit(stmt):
+                await aconn.set_autocommit(True)
+                try:
+                    await aconn.execute(stmt.sql, prepare=False)
+                finally:
+                    await aconn.set_autocommit(False)
+            else:
+                await aconn.execute(stmt.sql, prepare=False)
+            entry.server_ms = (time.perf_counter() - started) * 1000.0
+        except psycopg.Error as e:
+            await aconn.rollback()
+            entry.error = _error_text(e)
+            if not (adopt_existing and getattr(e, 'sqlstate', None) in DUPLICATE_SQLSTATES):
+                entry.ok = False
+                return entry
+            entry.existed = True
+        async with aconn.pipeline():
+            if plan is not None:
+                async with aconn.cursor() as cur:
+                    await Ledger.record_async(cur, plan, [(stmt, entry.server_ms)])
+            await aconn.commit()
+        return entry
+
+    async def run(i: int) -> None:
+        nonlocal stop
+        try:
+            for d in graph.deps[i]:
+                await done[d].wait()
+            if stop or any(entries[d] is None or not entries[d].ok for d in graph.deps[i]):
+                return
+            aconn = await pool.get()
+            try:
+                entries[i] = await apply(aconn, statements[i])
+            finally:
+                pool.put_nowait(aconn)
+            if not entries[i].ok and not keep_going:
+                stop = True
+        finally:
+            done[i].set()
+
+    try:
+        await asyncio.gather(*(run(i) for i in range(len(statements))))
+    finally:
+        for aconn in conns:
+            await aconn.close()
+
+    for i, (stmt, entry) in enumerate(zip(statements, entries)):
+        if entry is None:
+            blocked = any(entries[d] is None or not entries[d].ok for d in graph.deps[i])
+            entry = StatementResult(stmt.index, stmt.line, stmt.summary(), ok=False,
+                                    error='not run: ' + ('a statement it depends on failed' if blocked else 'stopped after a failure'))
+        result.statements.append(entry)
+    # Execute plus commit per statement, spread over the pool
+    result.round_trips += 2 * sum(1 for e in entries if e is not None)
+    return all(e is not None and e.ok for e in entries) or keep_going
+
+
+def run_parallel(conn, conninfo: str, size: int, statements: Sequence[Statement], result: FileResult,
+                 plan: Optional[UnitPlan], keep_going: bool, adopt_existing: bool) -> bool:
+    """Apply statements concurrently on `size` extra connections, in dependency order."""
+    ok = asyncio.run(_run_graph(conninfo, size, statements, result, plan, keep_going, adopt_existing))
+    if plan is not None and any(s.ok for s in result.statements):
+        # Rows were inserted concurrently; bring unit_checksum up to date once
+        with conn.cursor() as cur:
+            Ledger.restamp(cur, plan)
+        conn.commit()
+        result.round_trips += 1
+    return ok
+
+
+def run_unit(conn, unit: str, statements: Sequence[Statement], keep_going: bool = False,
+             ledger: Optional[Ledger] = None, adopt_existing: bool = False,
+             accept_edited: bool = False, baseline: bool = False,
+             online: Optional[OnlinePolicy] = None, parallel: int = 1,
+             conninfo: Optional[str] = None) -> FileResult:
+    """Apply `statements` as migration unit `unit` on `conn` (autocommit must be off).
+
+    With a ledger, statements it already holds are skipped and applied ones are recorded.
+    """
+    try:
+        statements = executable(statements)
+    except MigrationError as e:
+        raise MigrationError(f'{unit}: {e}') from e
+
+    result = FileResult(unit)
+    started = time.perf_counter()
+    plan = None
+    pending = statements
+    if ledger is not None:
+        plan = ledger.plan(unit, statements)
+        result.skipped = plan.applied
+        if plan.edited and not accept_edited:
+            result.edited = sorted(row['statement_index'] for row in plan.edited)
+            return result
+        pending = plan.pending
+
+    if baseline and plan is not None:
+        if pending:
+            _commit(conn, plan, [(stmt, None) for stmt in pending])
+            result.round_trips += 1
+        result.baselined = len(pending)
+        pending = []
+
+    ok = True
+    if online is not None:
+        if pending:
+            ok = run_online(conn, pending, result, plan, online, keep_going, adopt_existing)
+    elif parallel > 1:
+        if not conninfo:
+            raise MigrationError(f'{unit}: parallel execution needs a connection string for the pool')
+        if pending:
+            ok = run_parallel(conn, conninfo, parallel, pending, result, plan, keep_going, adopt_existing)
+    else:
+        for segment in plan_segments(pending):
+            if len(segment) == 1 and needs_autocommit(segment[0]):
+                ok = run_autocommit(conn, segment[0], result, plan)
+            else:
+                ok = run_segment(conn, segment, result, plan, keep_going, adopt_existing)
+            if not ok and not keep_going:
+                break
+    result.committed = ok or keep_going
+
+    if result.committed and plan is not None and plan.edited:
+        with conn.cursor() as cur:
+            Ledger.forget_edited(cur, plan, statements)
+        conn.commit()
+        result.round_trips += 1
+    result.elapsed_ms = (time.perf_counter() - started) * 1000.0
+    return result
+
+
+def run_file(conn, path: str, **kwargs) -> FileResult:
+    """run_unit() for the migration file at `path`, keyed in the ledger by its repo-relative path."""
+    try:
+        statements = split_file(path)
+    except SqlLexError as e:
+        raise MigrationError(f'{path}: {e}') from e
+    return run_unit(conn, unit_name(path), statements, **kwargs)
+
+
+def run_script(conn, unit: str, sql: str, **kwargs) -> FileResult:
+    """run_unit() for SQL held in a script rather than a file; `unit` names it in the ledger."""
+    try:
+        statements = split_statements(sql)
+    except SqlLexError as e:
+        raise MigrationError(f'{unit}: {e}') from e
+    return run_unit(conn, unit, statements, **kwargs)
+
+
+def print_result(result: FileResult, verbose: bool) -> None:
+    if result.edited:
+        listed = ', '.join(str(i) for i in result.edited)
+        print(f'{result.path}: EDITED AFTER APPLY; applied statement(s) {listed} no longer match the file '
+              f'(review, then rerun with --accept-edited)')
+        return
+    if not result.statements and not result.baselined:
+        print(f'{result.path}: up to date; {result.skipped} statement(s) already applied')
+        return
+    if result.baselined:
+        print(f'{result.path}: baselined {result.baselined} statement(s) without running them')
+        return
+    status = 'applied' if result.committed and not result.failed else ('applied with errors' if result.committed else 'FAILED')
+    skipped = f', {result.skipped} already applied' if result.skipped else ''
+    waited = f', {result.lock_wait_ms:.1f} ms lost to lock timeouts' if result.lock_wait_ms else ''
+    print(f'{result.path}: {status}; {len(result.statements)} statement(s){skipped}, '
+          f'{result.round_trips} round trip(s), {result.server_ms:.1f} ms server / {result.elapsed_ms:.1f} ms wall{waited}')
+    for s in result.statements:
+        if verbose or not s.ok or s.retries:
+            timing = f'{s.server_ms:8.1f} ms' if s.server_ms is not None else ('   exists  ' if s.existed else '  FAILED   ')
+            notes = ' [rewritten]' if s.rewritten else ''
+            if s.retries:
+                notes += f' [{s.retries} retr{"y" if s.retries == 1 else "ies"}, {s.lock_wait_ms:.0f} ms lock wait]'
+            print(f'  {s.index:>3}  line {s.line:>4}  {timing}  {s.summary}{notes}')
+            if s.error and not s.existed:
+                print(f'       {s.error}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply SQL migration files, one pipelined transaction per file.')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--keep-going', action='store_true', help='Roll back only the failing statement (per-statement savepoints)')
+    parser.add_argument('--adopt-existing', action='store_true', help='Record statements failing with "already exists" as applied')
+    parser.add_argument('--no-ledger', action='store_true', help='Run every statement and record nothing')
+    parser.add_argument('--baseline', action='store_true', help='Record the files as applied without running them')
+    parser.add_argument('--accept-edited', action='store_true', help='Apply files edited after they were applied and forget the old statements')
+    parser.add_argument('--online', action='store_true', help='One statement per transaction under lock_timeout, retried, with lock-friendly rewrites')
+    parser.add_argument('--lock-timeout', type=int, default=OnlinePolicy.lock_timeout_ms, metavar='MS', help='lock_timeout per attempt in online mode')
+    parser.add_argument('--attempts', type=int, default=OnlinePolicy.attempts, help='Attempts per statement in online mode')
+    parser.add_argument('--parallel', type=int, default=1, metavar='N', help='Run independent statements concurrently on N connections')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Print every statement with its server-side duration')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+    if args.no_ledger and (args.baseline or args.accept_edited):
+        parser.error('--baseline and --accept-edited need the ledger')
+    if args.online and args.parallel > 1:
+        parser.error('--online and --parallel cannot be combined')
+
+    # Lex everything before touching the database
+    try:
+        units = [(unit_name(path), split_file(path)) for path in args.files]
+    except (SqlLexError, OSError) as e:
+        print(f'ERROR {e}', file=sys.stderr)
+        sys.exit(2)
+
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    online = OnlinePolicy(lock_timeout_ms=args.lock_timeout, attempts=args.attempts) if args.online else None
+    results: List[FileResult] = []
+    with psycopg.connect(db_url) as conn:
+        if not args.json:
+            conn.add_notice_handler(lambda diag: print(f'  NOTICE: {diag.message_primary}'))
+        ledger = None if args.no_ledger else Ledger.load(conn, [unit for unit, _ in units])
+        for unit, statements in units:
+            try:
+                result = run_unit(conn, unit, statements, keep_going=args.keep_going, ledger=ledger,
+                                  adopt_existing=args.adopt_existing, accept_edited=args.accept_edited,
+                                  baseline=args.baseline, online=online, parallel=args.parallel,
+                                  conninfo=db_url)
+            except MigrationError as e:
+                print(f'ERROR {e}', file=sys.stderr)
+                sys.exit(2)
+            results.append(result)
+            if not args.json:
+                print_result(result, args.verbose)
+            if not result.committed and not result.edited:
+                break
+
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    sys.exit(1 if any(r.edited or not r.committed or r.failed for r in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Lock-aware execution of DDL against a live database.
+
+An ALTER TABLE that queues for its ACCESS EXCLUSIVE lock behind one long
+transaction blocks every later query on that table until it gets the lock.
+Here each statement runs with a short lock_timeout in its own transaction and
+is retried with jittered exponential backoff when the lock is not granted, so
+a busy table costs the migration a retry instead of costing the application
+a stall.
+
+Statements are rewritten to take weaker or shorter locks where PostgreSQL
+allows it:
+
+    CREATE [UNIQUE] INDEX name ON ...           -> CREATE INDEX CONCURRENTLY (autocommit)
+    ALTER TABLE t ADD CONSTRAINT c FOREIGN KEY  -> ... NOT VALID, then VALIDATE CONSTRAINT c
+    ALTER TABLE t ADD CONSTRAINT c CHECK (...)  -> ... NOT VALID, then VALIDATE CONSTRAINT c
+    ALTER TABLE t ADD FOREIGN KEY (a, b) ...    -> named t_a_b_fkey (PostgreSQL's default), as above
+
+An unnamed ADD CHECK is refused: VALIDATE needs the name, and the one the
+server would choose depends on the expression. Name it in the migration.
+
+VALIDATE only takes SHARE UPDATE EXCLUSIVE, so reads and writes continue
+while existing rows are checked. A failed concurrent index build leaves an
+INVALID index behind; it is dropped before the next attempt.
+
+Reruns pick up what an interrupted or failed earlier run left behind: an
+INVALID index of the same name is dropped before the build (IF NOT EXISTS
+would otherwise accept it), and a constraint that already exists NOT VALID
+is only validated.
+
+Used by `migration_runner.py --online`.
+"""
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import psycopg
+
+from sql_lexer import TOKEN_RE, Statement, needs_autocommit
+
+# lock_not_available, deadlock_detected
+RETRY_SQLSTATES = {'55P03', '40P01'}
+
+IDENT = r'(?:"(?:[^"]|"")+"|[A-Za-z_][\w$]*)'
+QUALIFIED = rf'{IDENT}(?:\s*\.\s*{IDENT})?'
+
+CREATE_INDEX_RE = re.compile(
+    rf'^\s*CREATE\s+(?P<unique>UNIQUE\s+)?INDEX\s+(?P<concurrently>CONCURRENTLY\s+)?(?P<ifne>IF\s+NOT\s+EXISTS\s+)?(?P<name>{IDENT})\s+'
+    rf'ON\s+(?!ONLY\b)(?:(?P<schema>{IDENT})\s*\.\s*)?{IDENT}',
+    re.IGNORECASE,
+)
+
+ADD_CONSTRAINT_RE = re.compile(
+    rf'^\s*ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?P<only>ONLY\s+)?(?P<table>{QUALIFIED})\s+'
+    rf'ADD\s+CONSTRAINT\s+(?P<name>{IDENT})\s+(?P<kind>FOREIGN\s+KEY|CHECK)\b',
+    re.IGNORECASE,
+)
+
+
+ADD_UNNAMED_RE = re.compile(
+    rf'^\s*ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?(?:{IDENT}\s*\.\s*)?(?P<relname>{IDENT})\s+'
+    rf'ADD\s+(?P<kind>FOREIGN\s+KEY\s*\(\s*(?P<columns>{IDENT}(?:\s*,\s*{IDENT})*)\s*\)|CHECK\b)',
+    re.IGNORECASE,
+)
+
+# PostgreSQL truncates longer identifiers (and would then pick its own name)
+MAX_IDENT_BYTES = 63
+
+
+class OnlineDDLError(Exception):
+    pass
+
+
+@dataclass
+class OnlinePolicy:
+    lock_timeout_ms: int = 2000
+    attempts: int = 8
+    backoff_ms: int = 200
+    max_backoff_ms: int = 10000
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff in seconds before retry number `attempt` (1-based)."""
+        ceiling = min(self.max_backoff_ms, self.backoff_ms * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling) / 1000.0
+
+
+@dataclass
+class Step:
+    sql: str
+    autocommit: bool = False
+    # Index a failed attempt may leave INVALID (concurrent builds)
+    index: Optional[str] = None
+    # (table, constraint) added NOT VALID by this step; skipped if it already exists unvalidated
+    constraint: Optional[Tuple[str, str]] = None
+
+
+@dataclass
+class OnlineResult:
+    steps: List[str] = field(default_factory=list)
+    rewritten: bool = False
+    server_ms: float = 0.0
+    # Time spent in attempts that ended in a lock timeout; the successful attempt is in server_ms
+    lock_wait_ms: float = 0.0
+    backoff_ms: float = 0.0
+    retries: int = 0
+    error: Optional[Exception] = None
+
+
+def _top_level_comma(sql: str) -> bool:
+    """True if `sql` has a comma outside parentheses, strings and comments (several ALTER TABLE actions)."""
+    depth = 0
+    pos = 0
+    while pos < len(sql):
+        m = TOKEN_RE.match(sql, pos)
+        text = m.group()
+        if m.lastgroup in ('dollar', 'block_comment'):
+            close = sql.find('*/' if m.lastgroup == 'block_comment' else text, m.end())
+            pos = len(sql) if close == -1 else close + 2 if m.lastgroup == 'block_comment' else close + len(text)
+            continue
+        if m.lastgroup == 'other':
+            if text == '(':
+                depth += 1
+            elif text == ')':
+                depth -= 1
+            elif text == ',' and depth == 0:
+                return True
+        pos = m.end()
+    return False
+
+
+def _code_end(sql: str) -> int:
+    """Offset just past the last token of `sql` that is not whitespace or a comment."""
+    end = 0
+    pos = 0
+    while pos < len(sql):
+        m = TOKEN_RE.match(sql, pos)
+        text = m.group()
+        if m.lastgroup == 'block_comment':
+            close = sql.find('*/', m.end())
+            pos = len(sql) if close == -1 else close + 2
+            continue
+        if m.lastgroup == 'dollar':
+            close = sql.find(text, m.end())
+            pos = len(sql) if close == -1 else close + len(text)
+        else:
+            pos = m.end()
+        if m.lastgroup not in ('ws', 'line_comment'):
+            end = pos
+    return end
+
+
+def _has_word(sql: str, *words: str) -> bool:
+    return re.search(r'\b' + r'\s+'.join(words) + r'\b', sql, re.IGNORECASE) is not None
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _name_unnamed(sql: str) -> str:
+    """`sql` with an unnamed ADD FOREIGN KEY given PostgreSQL's default name; unnamed CHECKs are refused."""
+    m = ADD_UNNAMED_RE.match(sql)
+    if not m or _has_word(sql, 'NOT', 'VALID') or _top_level_comma(sql):
+        return sql
+    if not m.group('columns'):
+        raise OnlineDDLError('unnamed ADD CHECK cannot be validated separately; add CONSTRAINT <name> to it')
+    columns = [_unquote(c) for c in re.findall(IDENT, m.group('columns'))]
+    name = '_'.join([_unquote(m.group('relname'))] + columns + ['fkey'])
+    if len(name.encode('utf-8')) > MAX_IDENT_BYTES:
+        raise OnlineDDLError(f'default name of the unnamed foreign key is longer than {MAX_IDENT_BYTES} bytes; '
+                             'add CONSTRAINT <name> to it')
+    return sql[:m.start('kind')] + f'CONSTRAINT {_quote(name)} ' + sql[m.start('kind'):]
+
+
+def rewrite(stmt: Statement) -> List[Step]:
+    """Split `stmt` into the steps that apply it with the weakest locks available.
+
+    Raises OnlineDDLError for statements that cannot be split safely.
+    """
+    sql = stmt.sql
+    m = CREATE_INDEX_RE.match(sql)
+    if m:
+        index = f"{m.group('schema')}.{m.group('name')}" if m.group('schema') else m.group('name')
+        if m.group('concurrently'):
+            return [Step(sql, autocommit=True, index=index)]
+        head = 'CREATE UNIQUE INDEX CONCURRENTLY ' if m.group('unique') else 'CREATE INDEX CONCURRENTLY '
+        if m.group('ifne'):
+            head += 'IF NOT EXISTS '
+        return [Step(head + sql[m.start('name'):], autocommit=True, index=index)]
+
+    code = _name_unnamed(sql[:_code_end(sql)])
+    m = ADD_CONSTRAINT_RE.match(code)
+    if m and not _has_word(code, 'NOT', 'VALID') and not _top_level_comma(code):
+        only = 'ONLY ' if m.group('only') else ''
+        # Trailing comments are cut off first; a -- comment would swallow the NOT VALID
+        return [
+            Step(code + ' NOT VALID', constraint=(m.group('table'), m.group('name'))),
+            Step(f"ALTER TABLE {only}{m.group('table')} VALIDATE CONSTRAINT {m.group('name')}"),
+        ]
+
+    return [Step(sql, autocommit=needs_autocommit(stmt))]
+
+
+def _drop_invalid_index(conn, name: str) -> None:
+    """Drop `name` if it is an INVALID index; runs in autocommit, the connection must be idle."""
+    conn.autocommit = True
+    try:
+        row = conn.execute('select not indisvalid from pg_index where indexrelid = to_regclass(%s)', (name,)).fetchone()
+        if row and row[0]:
+            conn.execute(f'drop index concurrently if exists {name}')
+    finally:
+        conn.autocommit = False
+
+
+def _unquote(name: str) -> str:
+    return name[1:-1].replace('""', '"') if name.startswith('"') else name.lower()
+
+
+def _unvalidated(conn, table: str, name: str) -> bool:
+    """True if `table` already has constraint `name` and it is NOT VALID."""
+    row = conn.execute('select not convalidated from pg_constraint where conrelid = to_regclass(%s) and conname = %s',
+                       (table, _unquote(name))).fetchone()
+    conn.commit()
+    return bool(row and row[0])
+
+
+def pending_steps(conn, steps: List[Step]) -> List[Step]:
+    """`steps` minus what an earlier run already did, after clearing what it left broken."""
+    out = []
+    for step in steps:
+        if step.index:
+            _drop_invalid_index(conn, step.index)
+        if step.constraint and _unvalidated(conn, *step.constraint):
+            continue
+        out.append(step)
+    return out
+
+
+def set_lock_timeout(conn, policy: Optional[OnlinePolicy]) -> None:
+    """Set (or with None, reset) the session lock_timeout; the connection must be idle."""
+    if policy is None:
+        conn.execute('reset lock_timeout')
+    else:
+        conn.execute(f"set lock_timeout = '{int(policy.lock_timeout_ms)}ms'")
+    conn.commit()
+
+
+def execute_online(conn, stmt: Statement, policy: OnlinePolicy,
+                   before_commit: Optional[Callable] = None) -> OnlineResult:
+    """Apply `stmt` step by step, retrying lock timeouts.
+
+    The session lock_timeout must already be set (set_lock_timeout). Once the last step
+    has run, `before_commit(cur, server_ms)` is queued together with its commit (in a
+    transaction of its own if that step ran in autocommit). Errors are returned in the
+    result, not raised.
+    """
+    try:
+        steps = rewrite(stmt)
+    except OnlineDDLError as e:
+        return OnlineResult(error=e)
+    result = OnlineResult(rewritten=[s.sql for s in steps] != [stmt.sql])
+    try:
+        steps = pending_steps(conn, steps)
+    except psycopg.Error as e:
+        if not conn.closed:
+            conn.rollback()
+        result.error = e
+        return result
+    for n, step in enumerate(steps):
+        last = n == len(steps) - 1
+        result.steps.append(step.sql)
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                if step.autocommit:
+                    conn.autocommit = True
+                    try:
+                        conn.execute(step.sql, prepare=False)
+                    finally:
+                        conn.autocommit = False
+                else:
+                    conn.execute(step.sql, prepare=False)
+                result.server_ms += (time.perf_counter() - started) * 1000.0
+                if last and before_commit is not None:
+                    with conn.pipeline(), conn.cursor() as cur:
+                        before_commit(cur, result.server_ms)
+                        conn.commit()
+                else:
+                    conn.commit()
+                break
+            except psycopg.Error as e:
+                elapsed = (time.perf_counter() - started) * 1000.0
+                if not conn.autocommit:
+                    conn.rollback()
+                if getattr(e, 'sqlstate', None) not in RETRY_SQLSTATES or attempt >= policy.attempts:
+                    result.error = e
+                    return result
+                result.lock_wait_ms += elapsed
+                result.retries += 1
+                if step.index:
+                    _drop_invalid_index(conn, step.index)
+                pause = policy.backoff(attempt)
+                result.backoff_ms += pause * 1000.0
+                time.sleep(pause)
+    return result
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Measure what row level security policies cost per table.
+
+For every RLS-enabled table in public, each representative query (QUERIES) is
+run under EXPLAIN (ANALYZE, BUFFERS) twice:
+
+    rls      as `authenticated`, with request.jwt.claims carrying the tenant
+             claim the way PostgREST sets it for a signed-in user, so
+             auth.jwt() and get_current_tenant_id() resolve as they do in the app
+    bypass   as --bypass-role (service_role, which has BYPASSRLS), the same
+             query with no policy applied
+
+Each side runs --runs times, alternating, and the median execution time is
+kept. Every run is its own transaction (SET LOCAL role and claims), rolled
+back, and pipelined into one round trip. Tables are ranked by the absolute
+overhead of their slowest query. The report also counts how often a policy
+subplan ran: that is the correlated EXISTS in the junction-table policies,
+evaluated once per row scanned.
+
+The queries read whole tables. Run this against a staging copy or off-peak.
+
+    python scripts/rls_profiler.py
+    python scripts/rls_profiler.py --tenant 7c9e... --runs 7 --json rls-profile.json athlete_skill_videos booking_athletes
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+DEFAULT_TENANT_ID = '00000000-0000-0000-0000-000000000001'
+
+# name -> query; {table} is replaced by the quoted table name
+QUERIES = {
+    # Every row passes through the policy: the per-row cost of the policy
+    'count': 'select count(*) from {table}',
+    # A typical list page
+    'page': 'select * from {table} limit 50',
+}
+
+TABLES_SQL = """
+select c.relname as name, greatest(c.reltuples, 0)::bigint as estimate,
+       count(p.policyname) as policies,
+       coalesce(bool_or(p.qual ilike '%%exists%%' or p.with_check ilike '%%exists%%'), false) as uses_exists
+from pg_class c
+join pg_namespace n on n.oid = c.relnamespace
+left join pg_policies p on p.schemaname = n.nspname and p.tablename = c.relname
+where n.nspname = 'public' and c.relkind in ('r', 'p') and c.relrowsecurity
+  and (%(tables)s::text[] is null or c.relname = any(%(tables)s))
+group by c.relname, c.reltuples
+order by c.relname
+"""
+
+
+@dataclass
+class Measurement:
+    execution_ms: float
+    planning_ms: float
+    rows: int
+    shared_hit: int
+    shared_read: int
+    subplan_loops: int
+    plan: Optional[Dict] = None
+
+
+@dataclass
+class QueryProfile:
+    query: str
+    rls_ms: float
+    bypass_ms: float
+    rls_rows: int
+    bypass_rows: int
+    rls_buffers: int
+    bypass_buffers: int
+    subplan_loops: int
+    error: Optional[str] = None
+    rls_plan: Optional[Dict] = None
+    bypass_plan: Optional[Dict] = None
+
+    @property
+    def overhead_ms(self) -> float:
+        return self.rls_ms - self.bypass_ms
+
+
+@dataclass
+class TableProfile:
+    table: str
+    estimate: int
+    policies: int
+    uses_exists: bool
+    queries: List[QueryProfile] = field(default_factory=list)
+
+    @property
+    def overhead_ms(self) -> float:
+        return max((q.overhead_ms for q in self.queries if q.error is None), default=0.0)
+
+
+def claims(tenant: str) -> str:
+    """request.jwt.claims for a signed-in user of `tenant`, top-level and in app_metadata like Supabase issues them."""
+    return json.dumps({
+        'role': 'authenticated',
+        'sub': '00000000-0000-0000-0000-000000000000',
+        'tenant_id': tenant,
+        'app_metadata': {'tenant_id': tenant},
+    })
+
+
+def _nodes(plan: Dict) -> Iterator[Dict]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _nodes(child)
+
+
+def _measurement(doc, keep_plan: bool) -> Measurement:
+    top = doc[0]
+    plan = top['Plan']
+    subplan_loops = sum(node.get('Actual Loops', 0) for node in _nodes(plan)
+                        if node.get('Parent Relationship') == 'SubPlan')
+    return Measurement(
+        execution_ms=top['Execution Time'],
+        planning_ms=top['Planning Time'],
+        rows=plan.get('Actual Rows', 0),
+        shared_hit=plan.get('Shared Hit Blocks', 0),
+        shared_read=plan.get('Shared Read Blocks', 0),
+        subplan_loops=subplan_loops,
+        plan=plan if keep_plan else None,
+    )
+
+
+def explain_as(conn, query: sql.Composable, role: str, jwt: Optional[str], timeout_ms: int,
+               keep_plan: bool, setup: Sequence[Tuple[Any, Optional[Sequence]]] = ()) -> Measurement:
+    """EXPLAIN ANALYZE `query` as `role` in a transaction that is rolled back; one round trip.
+
+    `setup` statements run first in the same transaction, as the connecting user.
+    """
+    with conn.pipeline():
+        for statement, params in setup:
+            conn.execute(statement, params, prepare=False)
+        conn.execute(sql.SQL('set local role {}').format(sql.Identifier(role)))
+        conn.execute("select set_config('statement_timeout', %s, true)", (f'{timeout_ms}ms',))
+        if jwt is not None:
+            conn.execute("select set_config('request.jwt.claims', %s, true), set_config('request.jwt.claim.role', %s, true)",
+                         (jwt, role))
+        cur = conn.execute(sql.SQL('explain (analyze, buffers, format json) ') + query, prepare=False)
+        conn.rollback()
+    (doc,) = cur.fetchone()
+    return _measurement(doc, keep_plan)
+
+
+def profile_query(conn, table: str, name: str, template: str, jwt: str, bypass_role: str,
+                  runs: int, timeout_ms: int, keep_plans: bool) -> QueryProfile:
+    query = sql.SQL(template).format(table=sql.Identifier(table))
+    rls: List[Measurement] = []
+    bypass: List[Measurement] = []
+    try:
+        for run in range(runs):
+            last = run == runs - 1
+            # Alternate so cache warm-up doesn't favour one side
+            rls.append(explain_as(conn, query, 'authenticated', jwt, timeout_ms, keep_plans and last))
+            bypass.append(explain_as(conn, query, bypass_role, None, timeout_ms, keep_plans and last))
+    except psycopg.Error as e:
+        if not conn.closed:
+            conn.rollback()
+        error = (str(e).strip() or type(e).__name__).splitlines()[0]
+        return QueryProfile(name, 0.0, 0.0, 0, 0, 0, 0, 0, error=error)
+    return QueryProfile(
+        query=name,
+        rls_ms=statistics.median(m.execution_ms for m in rls),
+        bypass_ms=statistics.median(m.execution_ms for m in bypass),
+        rls_rows=rls[-1].rows,
+        bypass_rows=bypass[-1].rows,
+        rls_buffers=rls[-1].shared_hit + rls[-1].shared_read,
+        bypass_buffers=bypass[-1].shared_hit + bypass[-1].shared_read,
+        subplan_loops=rls[-1].subplan_loops,
+        rls_plan=rls[-1].plan,
+        bypass_plan=bypass[-1].plan,
+    )
+
+
+def profile_tables(conn, tenant: str, tables: Optional[Sequence[str]] = None, bypass_role: str = 'service_role',
+                   runs: int = 5, timeout_ms: int = 30000, keep_plans: bool = False) -> List[TableProfile]:
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(TABLES_SQL, {'tables': list(tables) if tables else None})
+        profiles = [TableProfile(row['name'], row['estimate'], row['policies'], row['uses_exists'])
+                    for row in cur.fetchall()]
+    conn.commit()
+    jwt = claims(tenant)
+    for profile in profiles:
+        for name, template in QUERIES.items():
+            profile.queries.append(profile_query(conn, profile.table, name, template, jwt, bypass_role,
+                                                 runs, timeout_ms, keep_plans))
+    profiles.sort(key=lambda p: p.overhead_ms, reverse=True)
+    return profiles
+
+
+def print_report(profiles: Sequence[TableProfile], top: int) -> None:
+    shown = profiles[:top] if top else profiles
+    print(f'{"table":<36} {"query":<6} {"rls ms":>9} {"bypass ms":>9} {"overhead":>9} {"x":>6} '
+          f'{"rows rls/bypass":>17} {"buffers":>15} {"subplan runs":>12}')
+    for p in shown:
+        label = p.table + (' [EXISTS]' if p.uses_exists else '') + ('' if p.policies else ' [no policy]')
+        for q in p.queries:
+            if q.error:
+                print(f'{label:<36} {q.query:<6} ERROR {q.error}')
+            else:
+                ratio = f'{q.rls_ms / q.bypass_ms:.1f}' if q.bypass_ms > 0 else '-'
+                print(f'{label:<36} {q.query:<6} {q.rls_ms:9.2f} {q.bypass_ms:9.2f} {q.overhead_ms:+9.2f} {ratio:>6} '
+                      f'{f"{q.rls_rows}/{q.bypass_rows}":>17} {f"{q.rls_buffers}/{q.bypass_buffers}":>15} '
+                      f'{q.subplan_loops:>12}')
+            label = ''
+    hidden = len(profiles) - len(shown)
+    if hidden > 0:
+        print(f'... {hidden} more table(s); use --top 0 to list all')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank RLS-enabled tables by the cost of their policies.')
+    parser.add_argument('tables', nargs='*', help='Limit to these tables')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT_ID, help='tenant_id claim of the simulated user')
+    parser.add_argument('--bypass-role', default='service_role', help='BYPASSRLS role used for the baseline')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per side; the median is reported')
+    parser.add_argument('--timeout', type=int, default=30000, metavar='MS', help='statement_timeout per query')
+    parser.add_argument('--top', type=int, default=20, help='Tables shown (0 for all)')
+    parser.add_argument('--json', metavar='PATH', help='Write the full profile, including both plans of every query')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    with psycopg.connect(db_url) as conn:
+        profiles = profile_tables(conn, args.tenant, args.tables or None, args.bypass_role,
+                                  args.runs, args.timeout, keep_plans=bool(args.json))
+    if not profiles:
+        print('No RLS-enabled tables found.')
+        return
+    print_report(profiles, args.top)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump([dict(asdict(p), overhead_ms=p.overhead_ms) for p in profiles], f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
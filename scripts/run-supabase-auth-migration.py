@@ -1,15 +1,25 @@
 #!/usr/bin/env python3
 """
 Execute Supabase Auth multi-tenant setup migration
+
+    python scripts/run-supabase-auth-migration.py
+    python scripts/run-supabase-auth-migration.py --profile   (per-statement wall time, WAL, lock waits, rows)
 """
 
 import os
 import sys
 import logging
-import psycopg2
-import psycopg2.extras
+import psycopg
 from dotenv import load_dotenv
 
+from migration_ledger import Ledger, unit_name
+from migration_profiler import print_summary, profile_file, write_outputs
+from migration_runner import MigrationError, run_file
+
+MIGRATION_PATH = 'migrations/stage4-supabase-auth-setup.sql'
+PROFILE_JSON = 'stage4-supabase-auth-setup.profile.json'
+PROFILE_FOLDED = 'stage4-supabase-auth-setup.profile.folded'
+
 # Load environment variables
 load_dotenv()
 
@@ -29,87 +39,80 @@ def main():
     
     logger.info("🚀 Starting Supabase Auth multi-tenant setup...")
     
-    # Read the migration file
-    try:
-        with open('migrations/stage4-supabase-auth-setup.sql', 'r') as f:
-            migration_sql = f.read()
-    except FileNotFoundError:
-        logger.error("Migration file not found: migrations/stage4-supabase-auth-setup.sql")
-        sys.exit(1)
-    
-    # Split into individual statements (PostgreSQL functions can't be executed in one go)
-    statements = []
-    current_statement = []
-    in_function = False
-    
-    for line in migration_sql.split('\n'):
-        line = line.strip()
-        
-        # Skip comments and empty lines
-        if not line or line.startswith('--'):
-            continue
-            
-        # Track function boundaries
-        if 'CREATE OR REPLACE FUNCTION' in line or 'CREATE FUNCTION' in line:
-            in_function = True
-        elif line == '$$;' or (line.endswith('$$;') and in_function):
-            in_function = False
-            current_statement.append(line)
-            statements.append('\n'.join(current_statement))
-            current_statement = []
-            continue
-            
-        current_statement.append(line)
-        
-        # For non-function statements, split on semicolon
-        if not in_function and line.endswith(';') and not line.endswith('$$;'):
-            statements.append('\n'.join(current_statement))
-            current_statement = []
-    
-    # Add any remaining statement
-    if current_statement:
-        statements.append('\n'.join(current_statement))
-    
     # Connect to the database
     try:
-        conn = psycopg2.connect(db_url)
-        conn.autocommit = True  # For DDL statements
+        conn = psycopg.connect(db_url)
+        conn.add_notice_handler(lambda diag: logger.info(f"NOTICE: {diag.message_primary}"))
         logger.info("✅ Connected to database successfully")
     except Exception as e:
         logger.error(f"❌ Failed to connect to database: {str(e)}")
         sys.exit(1)
     
-    # Execute each statement
-    success_count = 0
-    with conn.cursor() as cursor:
-        for i, statement in enumerate(statements):
-            statement = statement.strip()
-            if not statement:
-                continue
-                
-            try:
-                logger.info(f"📝 Executing statement {i+1}/{len(statements)}")
-                
-                # Execute the SQL statement
-                cursor.execute(statement)
-                
-                logger.info(f"✅ Statement {i+1} executed successfully")
-                success_count += 1
-                    
-            except Exception as e:
-                logger.error(f"❌ Error executing statement {i+1}: {str(e)}")
-                logger.error(f"Statement was: {statement[:100]}...")
-                # Continue with other statements
-                continue
+    if '--profile' in sys.argv:
+        profile(conn, db_url)
+        return
+
+    # The whole file runs as one pipelined transaction; a failing statement is
+    # rolled back to its savepoint and the remaining statements still run.
+    # Statements already in the migration ledger are skipped.
+    try:
+        ledger = Ledger.load(conn, [unit_name(MIGRATION_PATH)])
+        result = run_file(conn, MIGRATION_PATH, keep_going=True, ledger=ledger, adopt_existing=True)
+    except FileNotFoundError:
+        logger.error(f"Migration file not found: {MIGRATION_PATH}")
+        sys.exit(1)
+    except MigrationError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    
+    if result.edited:
+        logger.error(f"❌ {MIGRATION_PATH} was edited after it was applied (statements {result.edited}); "
+                     "review it and rerun with scripts/migration_runner.py --accept-edited")
+        sys.exit(1)
+    if result.skipped and not result.statements:
+        logger.info(f"✅ Already applied ({result.skipped} statements recorded in the migration ledger)")
+        return
+    
+    total = len(result.statements)
+    for s in result.statements:
+        if s.existed:
+            logger.info(f"ℹ️  Statement {s.index} already exists (now recorded in the migration ledger)")
+        elif s.ok:
+            logger.info(f"✅ Statement {s.index}/{total} executed in {s.server_ms:.1f} ms")
+        else:
+            logger.error(f"❌ Error executing statement {s.index} (line {s.line}): {s.error}")
+            logger.error(f"Statement was: {s.summary}")
     
-    conn.close()
-    logger.info(f"🎉 Migration completed! {success_count}/{len(statements)} statements executed successfully")
+    success_count = total - len(result.failed)
+    logger.info(f"🎉 Migration completed in {result.round_trips} round trips! {success_count}/{total} statements executed successfully")
     
-    if success_count == len(statements):
+    if success_count == total:
         logger.info("✅ All statements executed successfully!")
         logger.info("🎯 Next: Update server code to use Supabase Auth with JWT claims")
     else:
-        logger.warning(f"⚠️  {len(statements) - success_count} statements failed - check logs above")
+        logger.warning(f"⚠️  {total - success_count} statements failed - check logs above")
+
+def profile(conn, db_url):
+    """Apply the migration one statement at a time, recording wall time, WAL volume, lock waits and rows"""
+    try:
+        ledger = Ledger.load(conn, [unit_name(MIGRATION_PATH)])
+        result = profile_file(conn, db_url, MIGRATION_PATH, keep_going=True, ledger=ledger, adopt_existing=True)
+    except FileNotFoundError:
+        logger.error(f"Migration file not found: {MIGRATION_PATH}")
+        sys.exit(1)
+    except MigrationError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    print_summary(result)
+    write_outputs([result], PROFILE_JSON, PROFILE_FOLDED)
+    logger.info(f"📊 Profile written to {PROFILE_JSON} (folded stacks for flamegraph.pl: {PROFILE_FOLDED})")
+    if any(not s.ok for s in result.statements):
+        logger.warning(f"⚠️  {sum(1 for s in result.statements if not s.ok)} statements failed - see the profile above")
 
 if __name__ == "__main__":
     main()
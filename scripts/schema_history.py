@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Append-only, content-addressed schema history.
+
+Layout under schema-snapshots/:
+
+    objects/<2 hex>/<sha256>.json   one table (or the enum/function section), stored once per distinct content
+    history.jsonl                   one manifest per recorded snapshot: taken_at, fingerprint and object hashes
+
+Unchanged tables cost nothing to store, diffing two points in time only reads
+the objects whose hashes differ, and "when did this column change" walks the
+manifests loading each distinct table version once.
+
+Usage:
+    python scripts/schema_history.py record
+    python scripts/schema_history.py log
+    python scripts/schema_history.py diff [FROM] [TO]        (defaults: -2 -1)
+    python scripts/schema_history.py blame TABLE[.COLUMN]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from schema_snapshot import fetch_snapshot
+
+HISTORY_DIR = os.path.join(os.path.dirname(__file__), '..', 'schema-snapshots')
+
+# Top-level sections stored as objects alongside the tables
+SECTIONS = ('enums', 'functions')
+
+# Keyed lists inside a table document, diffed entry by entry
+KEYED_LISTS = {'columns': 'column_name', 'constraints': 'name', 'indexes': 'name', 'policies': 'name'}
+
+
+def _canonical(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def diff_table(before: Optional[Dict], after: Optional[Dict]) -> Dict:
+    """Entry-level diff of two table documents (None for a missing table)."""
+    before = before or {}
+    after = after or {}
+    out: Dict = {}
+    for key, ident in KEYED_LISTS.items():
+        old = {e[ident]: e for e in before.get(key, [])}
+        new = {e[ident]: e for e in after.get(key, [])}
+        changes = {
+            'added': sorted(set(new) - set(old)),
+            'removed': sorted(set(old) - set(new)),
+            'changed': sorted(n for n in set(old) & set(new) if old[n] != new[n]),
+        }
+        if any(changes.values()):
+            out[key] = changes
+    for key in sorted((set(before) | set(after)) - set(KEYED_LISTS)):
+        if before.get(key) != after.get(key):
+            out[key] = {'before': before.get(key), 'after': after.get(key)}
+    return out
+
+
+class HistoryStore:
+    def __init__(self, root: str = HISTORY_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.log_path = os.path.join(root, 'history.jsonl')
+        self._manifests: Optional[List[Dict]] = None
+        self.load_object = lru_cache(maxsize=None)(self._read_object)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f'{digest}.json')
+
+    def _read_object(self, digest: str):
+        with open(self._object_path(digest), 'rb') as f:
+            return json.loads(f.read())
+
+    def put_object(self, obj) -> str:
+        data = _canonical(obj)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def manifests(self) -> List[Dict]:
+        if self._manifests is None:
+            self._manifests = []
+            if os.path.exists(self.log_path):
+                with open(self.log_path, 'r', encoding='utf-8') as f:
+                    self._manifests = [json.loads(line) for line in f if line.strip()]
+        return self._manifests
+
+    def record(self, schema_data: Dict, taken_at: Optional[str] = None) -> Dict:
+        """Store a schema document (SchemaSnapshot.to_dict() shape) and append its manifest."""
+        manifest = {
+            'taken_at': taken_at or datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'fingerprint': (schema_data.get('fingerprint') or {}).get('catalog'),
+            'tables': {name: self.put_object(t) for name, t in sorted(schema_data.get('tables', {}).items())},
+            'sections': {name: self.put_object(schema_data[name]) for name in SECTIONS if name in schema_data},
+        }
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(manifest, sort_keys=True) + '\n')
+        self.manifests().append(manifest)
+        return manifest
+
+    def resolve(self, ref: str) -> Dict:
+        """A manifest by index (negative counts from the end) or by taken_at prefix (latest match)."""
+        manifests = self.manifests()
+        if not manifests:
+            raise RuntimeError(f'No snapshots recorded in {self.log_path}')
+        try:
+            return manifests[int(ref)]
+        except (ValueError, IndexError):
+            pass
+        matches = [m for m in manifests if m['taken_at'].startswith(ref)]
+        if not matches:
+            raise RuntimeError(f'No snapshot matches {ref!r}')
+        return matches[-1]
+
+    def diff(self, a: Dict, b: Dict) -> Dict:
+        """Diff two manifests, reading only the objects whose hashes differ."""
+        ta, tb = a['tables'], b['tables']
+        changed = {}
+        for name in sorted(set(ta) & set(tb)):
+            if ta[name] != tb[name]:
+                changed[name] = diff_table(self.load_object(ta[name]), self.load_object(tb[name]))
+        sections = [s for s in SECTIONS if a.get('sections', {}).get(s) != b.get('sections', {}).get(s)]
+        return {
+            'from': a['taken_at'],
+            'to': b['taken_at'],
+            'tables_added': sorted(set(tb) - set(ta)),
+            'tables_removed': sorted(set(ta) - set(tb)),
+            'tables_changed': changed,
+            'sections_changed': sections,
+        }
+
+    def blame(self, table: str, column: Optional[str] = None) -> List[Dict]:
+        """Every snapshot at which `table` (or `table.column`) changed, oldest first."""
+        events: List[Dict] = []
+        previous = None
+        for m in self.manifests():
+            digest = m['tables'].get(table)
+            if digest == previous:
+                continue
+            before = self.load_object(previous) if previous else None
+            after = self.load_object(digest) if digest else None
+            previous = digest
+            if column is None:
+                if before is None or after is None:
+                    events.append({'taken_at': m['taken_at'], 'change': 'created' if after else 'dropped'})
+                else:
+                    events.append({'taken_at': m['taken_at'], 'change': 'changed', 'diff': diff_table(before, after)})
+                continue
+            old = next((c for c in (before or {}).get('columns', []) if c['column_name'] == column), None)
+            new = next((c for c in (after or {}).get('columns', []) if c['column_name'] == column), None)
+            if old == new:
+                continue
+            change = 'added' if old is None else 'removed' if new is None else 'changed'
+            events.append({'taken_at': m['taken_at'], 'change': change, 'before': old, 'after': new})
+        return events
+
+
+def record_live(store: HistoryStore) -> Dict:
+    load_dotenv()
+    db_url = os.getenv('DATABASE_URL') or os.getenv('DIRECT_DATABASE_URL')
+    if not db_url:
+        print('ERROR: Neither DATABASE_URL nor DIRECT_DATABASE_URL set in environment.', file=sys.stderr)
+        sys.exit(1)
+    with psycopg.connect(db_url, row_factory=dict_row) as conn:
+        return store.record(fetch_snapshot(conn).to_dict())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record and query the schema history store.')
+    parser.add_argument('--dir', default=HISTORY_DIR, help='History store directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('record', help='Record a snapshot of the live database')
+    sub.add_parser('log', help='List recorded snapshots')
+    diff_p = sub.add_parser('diff', help='Diff two snapshots (index or taken_at prefix)')
+    diff_p.add_argument('start', nargs='?', default='-2')
+    diff_p.add_argument('end', nargs='?', default='-1')
+    blame_p = sub.add_parser('blame', help='Show when a table or column changed')
+    blame_p.add_argument('target', metavar='TABLE[.COLUMN]')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.dir)
+    if args.command == 'record':
+        manifest = record_live(store)
+        print(f"Recorded snapshot {manifest['taken_at']} ({len(manifest['tables'])} tables).")
+    elif args.command == 'log':
+        for i, m in enumerate(store.manifests()):
+            print(f"{i:>4}  {m['taken_at']}  {len(m['tables']):>4} tables  {m.get('fingerprint') or '-'}")
+    elif args.command == 'diff':
+        print(json.dumps(store.diff(store.resolve(args.start), store.resolve(args.end)), indent=2))
+    elif args.command == 'blame':
+        table, _, column = args.target.partition('.')
+        for event in store.blame(table, column or None):
+            print(json.dumps(event, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Single-round-trip schema snapshot built straight from pg_catalog.
+
+information_schema views are slow on Supabase once the catalog grows and only
+expose a fraction of what we need, so this reads pg_class / pg_attribute /
+pg_constraint / pg_index / pg_enum / pg_policy / pg_proc and assembles the
+whole snapshot server-side as a single JSON document.
+"""
+import hashlib
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from psycopg.rows import tuple_row
+
+_RELS_CTE = """
+rels as (
+  select c.oid, c.relname, c.relrowsecurity, c.relforcerowsecurity
+  from pg_class c
+  where c.relnamespace = %(schema)s::regnamespace
+    and c.relkind in ('r', 'p')
+    and (%(tables)s::text[] is null or c.relname = any(%(tables)s::text[]))
+)"""
+
+# Per-table fingerprint over the relation OID and every attribute definition
+# (name, type OID, typmod, nullability, default). Cheap enough to run on every
+# check; any DDL touching a table's columns changes its hash.
+_FINGERPRINTS_CTE = """
+fingerprints as (
+  select r.relname,
+         md5(r.oid::text || '|' || coalesce(string_agg(
+           a.attnum || ':' || a.attname || ':' || a.atttypid || ':' || a.atttypmod
+             || ':' || a.attnotnull || ':' || coalesce(pg_get_expr(d.adbin, d.adrelid), ''),
+           ',' order by a.attnum), '')) as fingerprint
+  from rels r
+  left join pg_attribute a on a.attrelid = r.oid and a.attnum > 0 and not a.attisdropped
+  left join pg_attrdef d on d.adrelid = a.attrelid and d.adnum = a.attnum
+  group by r.oid, r.relname
+)"""
+
+_FINGERPRINT_OBJECT = """(
+    select json_build_object(
+      'catalog', md5(coalesce(string_agg(f.relname || '=' || f.fingerprint, ',' order by f.relname), '')),
+      'tables', coalesce(json_object_agg(f.relname, f.fingerprint order by f.relname), '{}')
+    )
+    from fingerprints f
+  )"""
+
+FINGERPRINT_QUERY = 'with' + _RELS_CTE + ',' + _FINGERPRINTS_CTE + '\nselect ' + _FINGERPRINT_OBJECT + '\n'
+
+# `data_type` mirrors information_schema.columns.data_type (with USER-DEFINED
+# resolved to the udt name) so snapshots stay comparable with older files.
+SNAPSHOT_QUERY = 'with' + _RELS_CTE + ',' + _FINGERPRINTS_CTE + """
+select json_build_object(
+  'schema', %(schema)s::text,
+  'tables', coalesce((
+    select json_object_agg(r.relname, json_build_object(
+      'exists', true,
+      'rls_enabled', r.relrowsecurity,
+      'rls_forced', r.relforcerowsecurity,
+      'columns', coalesce((
+        select json_agg(json_build_object(
+          'column_name', a.attname,
+          'data_type', case
+            when t.typtype = 'd' then case
+              when bt.typelem <> 0 and bt.typlen = -1 then 'ARRAY'
+              when btn.nspname = 'pg_catalog' then format_type(t.typbasetype, null)
+              else bt.typname
+            end
+            when t.typelem <> 0 and t.typlen = -1 then 'ARRAY'
+            when tn.nspname = 'pg_catalog' then format_type(a.atttypid, null)
+            else t.typname
+          end,
+          'udt_name', coalesce(bt.typname, t.typname),
+          'formatted_type', format_type(a.atttypid, a.atttypmod),
+          'is_nullable', not a.attnotnull,
+          'column_default', pg_get_expr(d.adbin, d.adrelid),
+          'identity', nullif(a.attidentity, ''),
+          'generated', nullif(a.attgenerated, '')
+        ) order by a.attnum)
+        from pg_attribute a
+        join pg_type t on t.oid = a.atttypid
+        join pg_namespace tn on tn.oid = t.typnamespace
+        left join pg_type bt on t.typtype = 'd' and bt.oid = t.typbasetype
+        left join pg_namespace btn on btn.oid = bt.typnamespace
+        left join pg_attrdef d on d.adrelid = a.attrelid and d.adnum = a.attnum
+        where a.attrelid = r.oid and a.attnum > 0 and not a.attisdropped
+      ), '[]'),
+      'constraints', coalesce((
+        select json_agg(json_build_object(
+          'name', con.conname,
+          'type', case con.contype
+            when 'p' then 'PRIMARY KEY'
+            when 'f' then 'FOREIGN KEY'
+            when 'u' then 'UNIQUE'
+            when 'c' then 'CHECK'
+            when 'x' then 'EXCLUDE'
+            else con.contype::text
+          end,
+          'columns', (
+            select json_agg(ka.attname order by k.ord)
+            from unnest(con.conkey) with ordinality k(attnum, ord)
+            join pg_attribute ka on ka.attrelid = con.conrelid and ka.attnum = k.attnum
+          ),
+          'references', case when con.contype = 'f' then con.confrelid::regclass::text end,
+          'definition', pg_get_constraintdef(con.oid)
+        ) order by con.conname)
+        from pg_constraint con
+        where con.conrelid = r.oid
+      ), '[]'),
+      'indexes', coalesce((
+        select json_agg(json_build_object(
+          'name', ic.relname,
+          'columns', (
+            select json_agg(ia.attname order by k.ord)
+            from unnest(i.indkey::int2[]) with ordinality k(attnum, ord)
+            join pg_attribute ia on ia.attrelid = i.indrelid and ia.attnum = k.attnum
+          ),
+          'is_unique', i.indisunique,
+          'is_primary', i.indisprimary,
+          'is_valid', i.indisvalid,
+          'definition', pg_get_indexdef(i.indexrelid)
+        ) order by ic.relname)
+        from pg_index i
+        join pg_class ic on ic.oid = i.indexrelid
+        where i.indrelid = r.oid
+      ), '[]'),
+      'policies', coalesce((
+        select json_agg(json_build_object(
+          'name', p.polname,
+          'command', case p.polcmd
+            when 'r' then 'SELECT'
+            when 'a' then 'INSERT'
+            when 'w' then 'UPDATE'
+            when 'd' then 'DELETE'
+            else 'ALL'
+          end,
+          'permissive', p.polpermissive,
+          'roles', (
+            select json_agg(case when role_oid = 0 then 'public' else role_oid::regrole::text end)
+            from unnest(p.polroles) role_oid
+          ),
+          'using', pg_get_expr(p.polqual, p.polrelid),
+          'with_check', pg_get_expr(p.polwithcheck, p.polrelid)
+        ) order by p.polname)
+        from pg_policy p
+        where p.polrelid = r.oid
+      ), '[]')
+    ) order by r.relname)
+    from rels r
+  ), '{}'),
+  'enums', coalesce((
+    select json_object_agg(t.typname, (
+      select json_agg(e.enumlabel order by e.enumsortorder)
+      from pg_enum e
+      where e.enumtypid = t.oid
+    ) order by t.typname)
+    from pg_type t
+    where t.typnamespace = %(schema)s::regnamespace and t.typtype = 'e'
+  ), '{}'),
+  'functions', coalesce((
+    select json_agg(json_build_object(
+      'name', p.proname,
+      'arguments', pg_get_function_identity_arguments(p.oid),
+      'returns', pg_get_function_result(p.oid),
+      'language', l.lanname,
+      'volatility', case p.provolatile when 'i' then 'IMMUTABLE' when 's' then 'STABLE' else 'VOLATILE' end,
+      'parallel', case p.proparallel when 's' then 'SAFE' when 'r' then 'RESTRICTED' else 'UNSAFE' end,
+      'security_definer', p.prosecdef
+    ) order by p.proname, pg_get_function_identity_arguments(p.oid))
+    from pg_proc p
+    join pg_language l on l.oid = p.prolang
+    where p.pronamespace = %(schema)s::regnamespace and p.prokind in ('f', 'p')
+  ), '[]'),
+  'fingerprint', """ + _FINGERPRINT_OBJECT + """
+)
+"""
+
+
+@dataclass
+class Column:
+    column_name: str
+    data_type: str
+    udt_name: Optional[str] = None
+    formatted_type: Optional[str] = None
+    is_nullable: Optional[bool] = None
+    column_default: Optional[str] = None
+    identity: Optional[str] = None
+    generated: Optional[str] = None
+
+
+@dataclass
+class Constraint:
+    name: str
+    type: str
+    columns: Optional[List[str]] = None
+    references: Optional[str] = None
+    definition: Optional[str] = None
+
+
+@dataclass
+class Index:
+    name: str
+    columns: Optional[List[str]] = None
+    is_unique: bool = False
+    is_primary: bool = False
+    is_valid: bool = True
+    definition: Optional[str] = None
+
+
+@dataclass
+class Policy:
+    name: str
+    command: str
+    permissive: bool = True
+    roles: Optional[List[str]] = None
+    using: Optional[str] = None
+    with_check: Optional[str] = None
+
+
+@dataclass
+class Function:
+    name: str
+    arguments: str
+    returns: Optional[str] = None
+    language: Optional[str] = None
+    volatility: Optional[str] = None
+    parallel: Optional[str] = None
+    security_definer: bool = False
+
+
+@dataclass
+class Table:
+    name: str
+    columns: List[Column] = field(default_factory=list)
+    constraints: List[Constraint] = field(default_factory=list)
+    indexes: List[Index] = field(default_factory=list)
+    policies: List[Policy] = field(default_factory=list)
+    rls_enabled: Optional[bool] = None
+    rls_forced: Optional[bool] = None
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict) -> 'Table':
+        return cls(
+            name=name,
+            columns=[Column(**c) for c in data.get('columns', [])],
+            constraints=[Constraint(**c) for c in data.get('constraints', [])],
+            indexes=[Index(**i) for i in data.get('indexes', [])],
+            policies=[Policy(**p) for p in data.get('policies', [])],
+            rls_enabled=data.get('rls_enabled'),
+            rls_forced=data.get('rls_forced'),
+        )
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        del data['name']
+        return {'exists': True, **data}
+
+
+@dataclass
+class SchemaSnapshot:
+    schema: str = 'public'
+    tables: Dict[str, Table] = field(default_factory=dict)
+    enums: Dict[str, List[str]] = field(default_factory=dict)
+    functions: List[Function] = field(default_factory=list)
+    fingerprint: Optional[Dict] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SchemaSnapshot':
+        """Build a snapshot from a schema-file document (older name+type files included)."""
+        return cls(
+            schema=data.get('schema', 'public'),
+            tables={name: Table.from_dict(name, t) for name, t in data.get('tables', {}).items()},
+            enums=dict(data.get('enums', {})),
+            functions=[Function(**f) for f in data.get('functions', [])],
+            fingerprint=data.get('fingerprint'),
+        )
+
+    def to_dict(self) -> Dict:
+        """Serialize to the document stored under 'DETAILED SCHEMA DATA:'."""
+        return {
+            'schema': self.schema,
+            'tables': {name: self.tables[name].to_dict() for name in sorted(self.tables)},
+            'enums': {name: self.enums[name] for name in sorted(self.enums)},
+            'functions': [asdict(f) for f in self.functions],
+            'fingerprint': self.fingerprint,
+        }
+
+    def column_types(self) -> Dict[str, List[tuple]]:
+        """Return mapping table_name -> list of (column_name, data_type)."""
+        return {
+            name: [(c.column_name, c.data_type) for c in table.columns]
+            for name, table in self.tables.items()
+        }
+
+
+def _params(schema: str, tables: Optional[Sequence[str]]) -> Dict:
+    return {'schema': schema, 'tables': list(tables) if tables is not None else None}
+
+
+def fetch_snapshot(conn, schema: str = 'public', tables: Optional[Sequence[str]] = None) -> SchemaSnapshot:
+    """Fetch a complete snapshot of `schema` (optionally limited to `tables`) in one query."""
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(SNAPSHOT_QUERY, _params(schema, tables))
+        (data,) = cur.fetchone()
+    return SchemaSnapshot.from_dict(data)
+
+
+async def fetch_snapshot_async(aconn, schema: str = 'public', tables: Optional[Sequence[str]] = None) -> SchemaSnapshot:
+    """fetch_snapshot() for a psycopg.AsyncConnection."""
+    async with aconn.cursor(row_factory=tuple_row) as cur:
+        await cur.execute(SNAPSHOT_QUERY, _params(schema, tables))
+        (data,) = await cur.fetchone()
+    return SchemaSnapshot.from_dict(data)
+
+
+def fetch_fingerprint(conn, schema: str = 'public', tables: Optional[Sequence[str]] = None) -> Dict:
+    """Return {'catalog': hash, 'tables': {table_name: hash}} without fetching the snapshot itself."""
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(FINGERPRINT_QUERY, _params(schema, tables))
+        (data,) = cur.fetchone()
+    return data
+
+
+def catalog_hash(table_fingerprints: Dict[str, str]) -> str:
+    """Recompute the catalog-wide hash from per-table fingerprints (matches FINGERPRINT_QUERY)."""
+    joined = ','.join(f'{name}={table_fingerprints[name]}' for name in sorted(table_fingerprints))
+    return hashlib.md5(joined.encode('utf-8')).hexdigest()
+
+
+def changed_tables(stored: Dict, live: Dict) -> List[str]:
+    """Names of tables whose fingerprint differs, including tables present on only one side."""
+    stored_tables = stored.get('tables', {})
+    live_tables = live.get('tables', {})
+    names = set(stored_tables) | set(live_tables)
+    return sorted(n for n in names if stored_tables.get(n) != live_tables.get(n))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Indexed schema snapshot file.
+
+Layout (UTF-8, newline separated):
+
+    BETTEH-SCHEMA-SNAPSHOT 1
+    {"meta": {...}, "sections": {"enums": [off, len], ...}, "tables": {"admins": [off, len], ...}}
+    <one compact JSON document per section / table, each on its own line>
+
+Offsets are relative to the first byte after the header line, so readers can
+mmap the file, parse the small header and json-decode only the tables they
+need. One table per line also keeps git diffs of the snapshot per-table.
+
+When the plain-text export is written alongside, its sha256 is stored in the
+header ("text_sha256"), so readers can tell whether the .txt was edited after
+the snapshot was taken.
+"""
+import hashlib
+import json
+import mmap
+from typing import Dict, Iterable, List, Optional
+
+MAGIC = b'BETTEH-SCHEMA-SNAPSHOT 1'
+
+# Top-level keys of the schema document stored as lazily decoded sections
+SECTIONS = ('enums', 'functions')
+
+
+def _encode(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True).encode('utf-8') + b'\n'
+
+
+def file_sha256(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def render_snapshot_file(schema_data: Dict, text_sha256: Optional[str] = None) -> bytes:
+    """Render a schema document (as produced by SchemaSnapshot.to_dict) into the indexed format."""
+    meta = {k: v for k, v in schema_data.items() if k not in SECTIONS and k != 'tables'}
+    chunks: List[bytes] = []
+    offset = 0
+
+    def add(blob: bytes) -> List[int]:
+        nonlocal offset
+        chunks.append(blob)
+        entry = [offset, len(blob)]
+        offset += len(blob)
+        return entry
+
+    sections = {name: add(_encode(schema_data[name])) for name in SECTIONS if name in schema_data}
+    tables = {name: add(_encode(schema_data['tables'][name])) for name in sorted(schema_data.get('tables', {}))}
+    header = {'meta': meta, 'sections': sections, 'tables': tables}
+    if text_sha256:
+        header['text_sha256'] = text_sha256
+    header = _encode(header)
+    return MAGIC + b'\n' + header + b''.join(chunks)
+
+
+def write_snapshot_file(path: str, schema_data: Dict, text_path: Optional[str] = None) -> None:
+    """Write the snapshot; `text_path` is the text export just written from the same data."""
+    text_sha256 = file_sha256(text_path) if text_path else None
+    with open(path, 'wb') as f:
+        f.write(render_snapshot_file(schema_data, text_sha256))
+
+
+class SnapshotFile:
+    """mmap-backed reader that decodes tables on demand and memoizes them."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic_end = self._map.find(b'\n')
+        if self._map[:magic_end] != MAGIC:
+            self.close()
+            raise RuntimeError(f'{path} is not a schema snapshot file')
+        header_end = self._map.find(b'\n', magic_end + 1)
+        header = json.loads(self._map[magic_end + 1:header_end])
+        self._base = header_end + 1
+        self.meta: Dict = header['meta']
+        self._sections: Dict[str, List[int]] = header['sections']
+        self._tables: Dict[str, List[int]] = header['tables']
+        # sha256 of the text export written with this snapshot, if any
+        self.text_sha256: Optional[str] = header.get('text_sha256')
+        self._decoded: Dict[str, Dict] = {}
+
+    def __enter__(self) -> 'SnapshotFile':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def _decode(self, entry: List[int]):
+        start = self._base + entry[0]
+        return json.loads(self._map[start:start + entry[1]])
+
+    def table_names(self) -> List[str]:
+        return list(self._tables)
+
+    def has_table(self, name: str) -> bool:
+        return name in self._tables
+
+    def table(self, name: str) -> Dict:
+        if name not in self._decoded:
+            self._decoded[name] = self._decode(self._tables[name])
+        return self._decoded[name]
+
+    def section(self, name: str):
+        entry = self._sections.get(name)
+        return self._decode(entry) if entry else None
+
+    def load(self, tables: Optional[Iterable[str]] = None) -> Dict:
+        """
+        Return a schema document shaped like the text file's JSON.
+
+        With `tables`, only those tables are decoded (unknown names are
+        skipped) and the enum/function sections are left out.
+        """
+        data = dict(self.meta)
+        if tables is None:
+            names = self.table_names()
+            for name in SECTIONS:
+                value = self.section(name)
+                if value is not None:
+                    data[name] = value
+        else:
+            names = [n for n in tables if n in self._tables]
+        data['tables'] = {n: self.table(n) for n in names}
+        return data
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Split PostgreSQL scripts into statements.
+
+Understands everything that can hide a semicolon: '' and E'' strings, quoted
+identifiers, $tag$ dollar-quoted bodies (functions, DO blocks), -- comments,
+nested /* */ comments and SQL-standard BEGIN ATOMIC ... END function bodies. Comments inside a statement are kept so function
+bodies reach the server verbatim; comment-only chunks are dropped.
+
+    python scripts/sql_lexer.py migrations/stage4-supabase-auth-setup.sql
+"""
+import argparse
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import List
+
+TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+    |(?P<line_comment>--[^\n]*)
+    |(?P<block_comment>/\*)
+    |(?P<estring>[eE]'(?:[^'\\]|\\.|'')*')
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<ident>"(?:[^"]|"")*")
+    |(?P<dollar>\$(?:[A-Za-z_\x80-\uffff][\w\x80-\uffff]*)?\$)
+    |(?P<semi>;)
+    |(?P<word>[A-Za-z_\x80-\uffff][\w$\x80-\uffff]*)
+    |(?P<other>\$\d+|.)
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+# Leading keywords remembered per statement, enough to classify it
+KEYWORD_COUNT = 6
+
+
+class SqlLexError(Exception):
+    pass
+
+
+@dataclass
+class Statement:
+    sql: str
+    line: int
+    keywords: List[str] = field(default_factory=list)
+    index: int = 0        # 1-based position in the script
+
+    def starts_with(self, *words: str) -> bool:
+        return [w.upper() for w in words] == self.keywords[:len(words)]
+
+    def summary(self, width: int = 80) -> str:
+        flat = ' '.join(self.sql.split())
+        return flat if len(flat) <= width else flat[:width - 3] + '...'
+
+
+def _block_comment_end(sql: str, pos: int) -> int:
+    """Position after the */ closing the (possibly nested) comment opened at `pos`."""
+    depth = 0
+    i = pos
+    while i < len(sql):
+        if sql.startswith('/*', i):
+            depth += 1
+            i += 2
+        elif sql.startswith('*/', i):
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    return -1
+
+
+def split_statements(sql: str) -> List[Statement]:
+    """Split `sql` on top-level semicolons."""
+    statements: List[Statement] = []
+    start = None          # offset of the current statement's first token
+    keywords: List[str] = []
+    depth = 0             # open BEGIN/CASE blocks inside a CREATE statement (BEGIN ATOMIC bodies)
+    pos = 0
+    end = len(sql)
+
+    # Line numbers are counted incrementally; offsets passed in only ever increase
+    counted = [0, 1]
+
+    def line_at(offset: int) -> int:
+        counted[1] += sql.count('\n', counted[0], offset)
+        counted[0] = offset
+        return counted[1]
+
+    def flush(stop: int) -> None:
+        nonlocal start, keywords, depth
+        if start is not None:
+            statements.append(Statement(sql[start:stop].rstrip(), line_at(start), keywords, len(statements) + 1))
+        start = None
+        keywords = []
+        depth = 0
+
+    while pos < end:
+        m = TOKEN_RE.match(sql, pos)
+        kind = m.lastgroup
+        if kind in ('ws', 'line_comment'):
+            pos = m.end()
+            continue
+        if kind == 'block_comment':
+            close = _block_comment_end(sql, pos)
+            if close == -1:
+                raise SqlLexError(f'Unterminated /* comment starting on line {line_at(pos)}')
+            pos = close
+            continue
+        if kind == 'semi' and depth == 0:
+            flush(pos)
+            pos = m.end()
+            continue
+        if kind == 'other' and m.group() in ("'", '"'):
+            raise SqlLexError(f'Unterminated quoted string starting on line {line_at(pos)}')
+
+        if start is None:
+            start = pos
+        if kind == 'dollar':
+            tag = m.group()
+            close = sql.find(tag, m.end())
+            if close == -1:
+                raise SqlLexError(f'Unterminated {tag} quote starting on line {line_at(pos)}')
+            pos = close + len(tag)
+            continue
+        if kind == 'word':
+            word = m.group().upper()
+            if len(keywords) < KEYWORD_COUNT:
+                keywords.append(word)
+            if keywords[0] == 'CREATE':
+                # Same rule as psql: semicolons inside BEGIN ... END of a CREATE don't end it
+                if word in ('BEGIN', 'CASE'):
+                    depth += 1
+                elif word == 'END' and depth:
+                    depth -= 1
+        pos = m.end()
+
+    flush(end)
+    return statements
+
+
+def needs_autocommit(stmt: Statement) -> bool:
+    """True for statements PostgreSQL refuses to run inside a transaction block."""
+    kw = stmt.keywords
+    if not kw:
+        return False
+    if kw[0] == 'VACUUM' or stmt.starts_with('ALTER', 'SYSTEM'):
+        return True
+    if kw[0] in ('CREATE', 'DROP') and len(kw) > 1 and kw[1] in ('DATABASE', 'TABLESPACE'):
+        return True
+    return kw[0] in ('CREATE', 'DROP', 'REINDEX') and 'CONCURRENTLY' in kw
+
+
+def split_file(path: str) -> List[Statement]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return split_statements(f.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the statements of SQL files as the migration runner sees them.')
+    parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    for path in args.files:
+        try:
+            statements = split_file(path)
+        except SqlLexError as e:
+            print(f'{path}: {e}', file=sys.stderr)
+            sys.exit(1)
+        print(f'{path}: {len(statements)} statements')
+        for s in statements:
+            print(f'  {s.index:>3}  line {s.line:>4}  {s.summary()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Generate tenant RLS policies from a declarative spec and diff them against pg_policies.
+
+The spec lives in attached_assets/tenancy_spec.json:
+
+    {
+      "helper": "get_current_tenant_id",      (or schema-qualified, e.g. "auth.get_current_tenant_id")
+      "tables": {
+        "athletes": {"strategy": "column"},
+        "tenants": {"strategy": "column", "column": "id"},
+        "athlete_skills": {"strategy": "parent", "parent": "athletes", "fk": "athlete_id"},
+        "users": {"strategy": "parent", "parent": "tenant_users", "fk": "id", "parent_key": "user_id"},
+        "genders": {"strategy": "public_read", "policy": "public_read"}
+      }
+    }
+
+Strategies (every table's policy is "tenant_isolation" unless "policy" says otherwise):
+
+    column       <column> = (SELECT helper())                   column defaults to tenant_id
+    parent       EXISTS (SELECT 1 FROM <parent> p WHERE p.<parent_key> = <table>.<fk>
+                         AND <parent's own predicate on p>)   parent_key defaults to id;
+                 when the table has its own NOT NULL tenant_id column (see
+                 denormalize_tenant_policies.py) the column predicate is used instead;
+                 a tenant_id that is still NULLable may not be backfilled yet, so
+                 those tables keep the EXISTS form
+    public_read  FOR SELECT USING (true)
+    open         FOR ALL USING (true)
+
+The helper is always called as `(SELECT helper())`. That is an uncorrelated
+subquery, so the planner hoists it into an initplan and evaluates it once per
+query instead of once per row.
+
+An optional "context" picks where the helper reads the tenant from, and the
+helper is (re)defined to match:
+
+    jwt   the tenant_id claim of auth.jwt() (top level, then app_metadata)
+    guc   current_setting('<setting>', true), set once per request with
+          `select set_config('app.tenant_id', $1, true)`; requests that did
+          not set it fall back to the JWT claim
+
+Either way the policies are the same. Setting "context" changes live tenant
+isolation: the helper create-rls-policies.py installs returns the default
+tenant for everyone, and is replaced by one that resolves it per request.
+The shipped spec has no "context", so the helper's body is left alone and
+it is only marked STABLE PARALLEL SAFE when its body only reads (no DML, no
+volatile calls). tenant_context_bench.py compares the two modes on the
+largest tables before one is chosen.
+
+The output is the DDL that brings the database to the spec, and nothing
+else: ENABLE ROW LEVEL SECURITY where it is off, CREATE POLICY where the
+policy is missing, ALTER POLICY where its predicate or roles differ, and a
+DROP + CREATE in one DO block where its command changed. Existing
+predicates are compared with the server's deparsed pg_policies text after
+normalizing parentheses, aliases and schema qualification, so running it
+twice emits nothing the second time. Policies the spec does not name are
+listed but left alone.
+
+    python scripts/tenancy_policies.py                  (print the diff)
+    python scripts/tenancy_policies.py --apply          (apply it, one short transaction per statement)
+"""
+import argparse
+import json
+import os
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from ddl_graph import tokenize
+from migration_runner import MigrationError, print_result, run_script
+from online_ddl import OnlinePolicy
+from sql_lexer import TOKEN_RE
+from tenant_backfill import DEFAULT_TENANT_ID
+
+SPEC_PATH = os.path.join(os.path.dirname(__file__), '..', 'attached_assets', 'tenancy_spec.json')
+
+STRATEGIES = ('column', 'parent', 'public_read', 'open')
+CONTEXT_MODES = ('jwt', 'guc')
+SPEC_KEYS = {'helper', 'context', 'setting', 'tables'}
+TABLE_KEYS = {'strategy', 'policy', 'column', 'parent', 'fk', 'parent_key', 'roles'}
+DEFAULT_POLICY = 'tenant_isolation'
+
+# Words in a function body that rule out STABLE (and so PARALLEL SAFE)
+WRITES = {'insert', 'update', 'delete', 'merge', 'truncate', 'create', 'drop', 'alter', 'perform',
+          'nextval', 'setval', 'random', 'clock_timestamp', 'timeofday', 'gen_random_uuid', 'uuid_generate_v4'}
+# Additionally ruled out for PARALLEL SAFE
+PARALLEL_UNSAFE = {'set_config', 'pg_temp', 'currval', 'lastval'}
+
+CATALOG_SQL = """
+select c.relname as table_name, c.relrowsecurity as rls,
+       exists (select 1 from pg_attribute a where a.attrelid = c.oid and a.attname = 'tenant_id' and not a.attisdropped) as has_tenant_id,
+       exists (select 1 from pg_attribute a where a.attrelid = c.oid and a.attname = 'tenant_id' and not a.attisdropped
+               and a.attnotnull) as tenant_id_not_null
+from pg_class c
+join pg_namespace n on n.oid = c.relnamespace
+where n.nspname = 'public' and c.relkind in ('r', 'p') and c.relname = any(%s)
+"""
+
+POLICIES_SQL = """
+select tablename, policyname, permissive, roles::text[] as roles, cmd, qual, with_check
+from pg_policies
+where schemaname = 'public' and tablename = any(%s)
+"""
+
+HELPER_SQL = """
+select p.oid::regprocedure::text as signature, p.provolatile as volatile, p.proparallel as parallel, p.prosrc as body
+from pg_proc p
+join pg_namespace n on n.oid = p.pronamespace
+where n.nspname = %s and p.proname = %s and p.pronargs = 0
+"""
+
+
+JWT_TENANT = """(auth.jwt() ->> 'tenant_id')::UUID,
+    (auth.jwt() -> 'app_metadata' ->> 'tenant_id')::UUID"""
+
+
+class SpecError(Exception):
+    pass
+
+
+@dataclass
+class DesiredPolicy:
+    table: str
+    name: str
+    cmd: str
+    roles: List[str]
+    using: str
+
+    def create_sql(self) -> str:
+        roles = '' if self.roles == ['public'] else f" TO {', '.join(self.roles)}"
+        return f'CREATE POLICY "{self.name}" ON {self.table} FOR {self.cmd}{roles} USING ({self.using});'
+
+
+def load_spec(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    unknown = set(spec) - SPEC_KEYS
+    if unknown:
+        raise SpecError(f'unknown keys {sorted(unknown)}')
+    if spec.get('context', 'jwt') not in CONTEXT_MODES:
+        raise SpecError(f'context must be one of {", ".join(CONTEXT_MODES)}')
+    tables = spec.get('tables', {})
+    for table, entry in tables.items():
+        unknown = set(entry) - TABLE_KEYS
+        if unknown:
+            raise SpecError(f'{table}: unknown keys {sorted(unknown)}')
+        if entry.get('strategy') not in STRATEGIES:
+            raise SpecError(f'{table}: strategy must be one of {", ".join(STRATEGIES)}')
+        if entry['strategy'] == 'parent':
+            if 'parent' not in entry or 'fk' not in entry:
+                raise SpecError(f'{table}: parent strategy needs "parent" and "fk"')
+            if entry['parent'] not in tables:
+                raise SpecError(f'{table}: parent {entry["parent"]} is not in the spec')
+    return spec
+
+
+def helper_name(spec: Dict) -> Tuple[str, str]:
+    """(schema, function) of the spec's helper; "auth.get_current_tenant_id" or unqualified for public."""
+    schema, _, name = spec.get('helper', 'get_current_tenant_id').rpartition('.')
+    return schema or 'public', name
+
+
+def _tokens(expr: str) -> List[Tuple[str, str]]:
+    """Like ddl_graph.tokenize(), but string literals are kept: they are part of what an expression means."""
+    out: List[Tuple[str, str]] = []
+    pos = 0
+    while pos < len(expr):
+        m = TOKEN_RE.match(expr, pos)
+        kind, text = m.lastgroup, m.group()
+        pos = m.end()
+        if kind == 'block_comment':
+            close = expr.find('*/', pos)
+            pos = len(expr) if close == -1 else close + 2
+        elif kind == 'word':
+            out.append(('word', text.lower()))
+        elif kind in ('string', 'estring', 'ident', 'other', 'dollar'):
+            out.append(('punct' if kind == 'other' else kind, text))
+    return out
+
+
+def normalize(expr: Optional[str]) -> Tuple[str, ...]:
+    """Token form of an expression that ignores parentheses, column aliases, case, comments and public. qualification."""
+    if expr is None:
+        return ()
+    out: List[str] = []
+    tokens = _tokens(expr)
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if kind == 'punct' and text in ('(', ')'):
+            i += 1
+        elif kind == 'word' and text == 'as' and i + 1 < len(tokens):
+            i += 2
+        elif kind == 'word' and text == 'public' and i + 1 < len(tokens) and tokens[i + 1] == ('punct', '.'):
+            i += 2
+        else:
+            out.append(text)
+            i += 1
+    return tuple(out)
+
+
+class PolicyGenerator:
+    def __init__(self, spec: Dict, has_tenant_id: Set[str]):
+        self.spec = spec
+        self.tables: Dict[str, Dict] = spec['tables']
+        self.helper = spec.get('helper', 'get_current_tenant_id')
+        # Tables with a NOT NULL tenant_id column, whose parent strategy filters on it directly
+        self.has_tenant_id = has_tenant_id
+
+    def tenant(self) -> str:
+        return f'(SELECT {self.helper}())'
+
+    def predicate(self, table: str, alias: Optional[str] = None, depth: int = 0) -> str:
+        """Isolation predicate of `table`, with its columns qualified by `alias` (unqualified at the top)."""
+        entry = self.tables[table]
+        prefix = f'{alias}.' if alias else ''
+        if entry['strategy'] == 'column':
+            return f"{prefix}{entry.get('column', 'tenant_id')} = {self.tenant()}"
+        if entry['strategy'] == 'parent':
+            if table in self.has_tenant_id:
+                return f'{prefix}tenant_id = {self.tenant()}'
+            if depth > len(self.tables):
+                raise SpecError(f'{table}: parent chain loops')
+            parent = entry['parent']
+            p = f'p{depth + 1}'
+            outer = alias or table
+            return (f"EXISTS (SELECT 1 FROM {parent} {p} WHERE {p}.{entry.get('parent_key', 'id')} = {outer}.{entry['fk']} "
+                    f'AND {self.predicate(parent, p, depth + 1)})')
+        return 'true'
+
+    def desired(self, table: str) -> DesiredPolicy:
+        entry = self.tables[table]
+        cmd = 'SELECT' if entry['strategy'] == 'public_read' else 'ALL'
+        return DesiredPolicy(table, entry.get('policy', DEFAULT_POLICY), cmd,
+                             entry.get('roles', ['public']), self.predicate(table))
+
+
+def helper_body(mode: str, setting: str = 'app.tenant_id') -> str:
+    """Body of the tenant helper for context `mode`, falling back to the legacy tenant."""
+    sources = JWT_TENANT
+    if mode == 'guc':
+        sources = f"NULLIF(current_setting('{setting}', true), '')::UUID,\n    {sources}"
+    return f"""
+  SELECT COALESCE(
+    {sources},
+    '{DEFAULT_TENANT_ID}'::UUID
+  );
+"""
+
+
+def helper_sql(name: str, mode: str, setting: str = 'app.tenant_id') -> str:
+    return f"""CREATE OR REPLACE FUNCTION {name}()
+RETURNS UUID
+LANGUAGE SQL
+STABLE
+PARALLEL SAFE
+SECURITY DEFINER
+AS $${helper_body(mode, setting)}$$;"""
+
+
+def helper_ddl(helper: Optional[Dict], spec: Optional[Dict] = None) -> List[str]:
+    """DDL bringing the helper to the spec's context mode, or just marking it STABLE / PARALLEL SAFE."""
+    if spec is not None and 'context' in spec:
+        name = spec.get('helper', 'get_current_tenant_id')
+        body = helper_body(spec['context'], spec.get('setting', 'app.tenant_id'))
+        if helper is None or normalize(helper['body']) != normalize(body):
+            return [helper_sql(name, spec['context'], spec.get('setting', 'app.tenant_id'))]
+    if helper is None:
+        return []
+    words = {text.lower() for kind, text in tokenize(helper['body']) if kind == 'word'}
+    if words & WRITES:
+        return [f"-- {helper['signature']} is not marked STABLE: its body may write or call volatile functions"]
+    marks = []
+    if helper['volatile'] == 'v':
+        marks.append('STABLE')
+    if helper['parallel'] != 's' and not words & PARALLEL_UNSAFE:
+        marks.append('PARALLEL SAFE')
+    return [f"ALTER FUNCTION {helper['signature']} {' '.join(marks)};"] if marks else []
+
+
+def policy_diff(desired: DesiredPolicy, existing: Optional[Dict]) -> List[str]:
+    if existing is None:
+        return [desired.create_sql()]
+    if existing['cmd'] != desired.cmd or existing['permissive'] != 'PERMISSIVE' or (
+            existing['with_check'] is not None and normalize(existing['with_check']) != normalize(desired.using)):
+        # ALTER POLICY can change neither the command nor drop a WITH CHECK; swap atomically
+        return [f'DO $$\nBEGIN\n  DROP POLICY "{desired.name}" ON {desired.table};\n  {desired.create_sql()}\nEND $$;']
+    changes = []
+    if sorted(existing['roles']) != sorted(desired.roles):
+        changes.append(f"TO {', '.join(desired.roles)}")
+    if normalize(existing['qual']) != normalize(desired.using):
+        changes.append(f'USING ({desired.using})')
+    if not changes:
+        return []
+    return [f'ALTER POLICY "{desired.name}" ON {desired.table} {" ".join(changes)};']
+
+
+def generate(conn, spec: Dict) -> Tuple[List[str], List[str]]:
+    """(DDL bringing the database to `spec`, notes about what was left alone)."""
+    tables = sorted(spec['tables'])
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(CATALOG_SQL, (tables,))
+        catalog = {row['table_name']: row for row in cur.fetchall()}
+        cur.execute(POLICIES_SQL, (tables,))
+        existing: Dict[Tuple[str, str], Dict] = {(r['tablename'], r['policyname']): r for r in cur.fetchall()}
+        cur.execute(HELPER_SQL, helper_name(spec))
+        helper = cur.fetchone()
+    conn.commit()
+
+    generator = PolicyGenerator(spec, {t for t, row in catalog.items() if row['tenant_id_not_null']})
+    ddl: List[str] = helper_ddl(helper, spec)
+    notes: List[str] = []
+    for table in tables:
+        row = catalog.get(table)
+        if row and row['has_tenant_id'] and not row['tenant_id_not_null'] and spec['tables'][table]['strategy'] == 'parent':
+            # A NULLable tenant_id may predate its backfill; filtering on it would hide existing rows
+            notes.append(f'{table}: tenant_id is NULLable (backfill not finished?), kept the EXISTS predicate')
+    if helper is None and 'context' not in spec:
+        notes.append(f"helper {generator.helper}() does not exist in {helper_name(spec)[0]}; create it before applying")
+    managed = set()
+    for table in tables:
+        if table not in catalog:
+            notes.append(f'{table}: table does not exist, skipped')
+            continue
+        desired = generator.desired(table)
+        managed.add((table, desired.name))
+        if not catalog[table]['rls']:
+            ddl.append(f'ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;')
+        ddl.extend(policy_diff(desired, existing.get((table, desired.name))))
+    for table, name in sorted(set(existing) - managed):
+        notes.append(f'{table}: policy "{name}" is not in the spec, left alone')
+    return ddl, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff tenant RLS policies against a declarative spec.')
+    parser.add_argument('--spec', default=SPEC_PATH, help='Tenancy spec (default: attached_assets/tenancy_spec.json)')
+    parser.add_argument('--apply', action='store_true', help='Apply the diff, each statement under lock_timeout')
+    parser.add_argument('--lock-timeout', type=int, default=OnlinePolicy.lock_timeout_ms, metavar='MS', help='lock_timeout per statement with --apply')
+    args = parser.parse_args()
+
+    try:
+        spec = load_spec(args.spec)
+    except (SpecError, OSError, ValueError) as e:
+        print(f'ERROR {args.spec}: {e}', file=sys.stderr)
+        sys.exit(2)
+
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    with psycopg.connect(db_url) as conn:
+        try:
+            ddl, notes = generate(conn, spec)
+        except SpecError as e:
+            print(f'ERROR {args.spec}: {e}', file=sys.stderr)
+            sys.exit(2)
+        for note in notes:
+            print(f'-- {note}')
+        statements = [s for s in ddl if not s.startswith('--')]
+        if not statements:
+            print('-- policies match the spec')
+            return
+        print('\n'.join(ddl))
+        if not args.apply:
+            return
+        try:
+            result = run_script(conn, 'attached_assets/tenancy_spec.json', '\n'.join(statements),
+                                online=OnlinePolicy(lock_timeout_ms=args.lock_timeout))
+        except MigrationError as e:
+            print(f'ERROR {e}', file=sys.stderr)
+            sys.exit(2)
+    print_result(result, verbose=True)
+    sys.exit(1 if result.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Chunked, resumable tenant_id backfill.
+
+A single UPDATE per table inside one DO block would be one transaction holding
+row locks on every table at once, bloating each table by a full copy of its
+rows and shipping all of the WAL to replicas in one burst. This walks each
+table in primary-key order instead, --batch-size rows per transaction,
+sleeping --sleep ms between chunks.
+
+Each chunk is one statement and one commit, pipelined into a single round
+trip. Its CTEs update the rows that still have no tenant_id and advance the
+table's checkpoint in migration_meta.backfill_checkpoint. Because both happen
+in the same transaction, an interrupted run resumes exactly after the last
+committed chunk.
+
+Root tables get --tenant (the legacy tenant by default). Child and junction
+tables (PARENTS) take tenant_id from their parent row; parents are
+backfilled first, and rows without a parent fall back to --tenant. Each
+table is ANALYZEd once it is done so the planner sees the new column.
+
+Stage 2 runs in three steps, with this script in the middle:
+
+    python scripts/migration_runner.py migrations/stage2-add-tenant-id-remaining-tables.sql
+    python scripts/tenant_backfill.py
+    python scripts/migration_runner.py migrations/stage2-tenant-id-not-null.sql
+
+    python scripts/tenant_backfill.py
+    python scripts/tenant_backfill.py --batch-size 2000 --sleep 250 booking_athletes athlete_skills
+    python scripts/tenant_backfill.py --restart skills
+"""
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from online_ddl import RETRY_SQLSTATES, OnlinePolicy, set_lock_timeout
+
+DEFAULT_TENANT_ID = '00000000-0000-0000-0000-000000000001'
+
+# should_have_tenant_id in analyze-migration-progress.py, plus the other tables stage 2 adds tenant_id to
+TABLES = [
+    'parents', 'athletes', 'skills', 'focus_areas', 'bookings',
+    'availability', 'events', 'waivers', 'testimonials', 'site_content',
+    'site_faqs', 'lesson_types', 'apparatus', 'archived_waivers',
+    'blog_posts', 'site_inquiries', 'side_quests', 'tips',
+    'gym_payout_rates', 'gym_payout_runs', 'athlete_skills',
+    'athlete_skill_videos', 'booking_athletes', 'booking_focus_areas',
+    'skills_prerequisites', 'parent_password_reset_tokens',
+    'skill_components', 'admins', 'parent_auth_codes', 'slot_reservations',
+    'blog_email_signups',
+]
+
+# table -> (foreign key column, parent table); the row takes its parent's tenant_id
+PARENTS = {
+    'athletes': ('parent_id', 'parents'),
+    'athlete_skills': ('athlete_id', 'athletes'),
+    'athlete_skill_videos': ('athlete_skill_id', 'athlete_skills'),
+    'booking_athletes': ('booking_id', 'bookings'),
+    'booking_focus_areas': ('booking_id', 'bookings'),
+    'skills_prerequisites': ('skill_id', 'skills'),
+    'skill_components': ('parent_skill_id', 'skills'),
+    'parent_password_reset_tokens': ('parent_id', 'parents'),
+}
+
+CREATE_SQL = (
+    'create schema if not exists migration_meta',
+    """
+    create table if not exists migration_meta.backfill_checkpoint (
+      table_name text primary key,
+      last_key text,
+      rows_scanned bigint not null default 0,
+      rows_updated bigint not null default 0,
+      started_at timestamptz not null default now(),
+      updated_at timestamptz not null default now(),
+      finished_at timestamptz
+    )
+    """,
+)
+
+# Single-column primary key and row estimate of every table that has a tenant_id column
+TABLES_SQL = """
+select c.relname as name, a.attname as pk, format_type(a.atttypid, a.atttypmod) as pk_type,
+       greatest(c.reltuples, 0)::bigint as estimate
+from pg_class c
+join pg_namespace n on n.oid = c.relnamespace
+join pg_index i on i.indrelid = c.oid and i.indisprimary and i.indnkeyatts = 1
+join pg_attribute a on a.attrelid = c.oid and a.attnum = i.indkey[0]
+where n.nspname = 'public' and c.relname = any(%s)
+  and exists (select 1 from pg_attribute t where t.attrelid = c.oid and t.attname = 'tenant_id' and not t.attisdropped)
+"""
+
+CHECKPOINT_SQL = 'select table_name, last_key, rows_scanned, rows_updated, finished_at from migration_meta.backfill_checkpoint'
+
+FINISH_SQL = 'update migration_meta.backfill_checkpoint set finished_at = now(), updated_at = now() where table_name = %s'
+
+RESTART_SQL = 'delete from migration_meta.backfill_checkpoint where table_name = any(%s)'
+
+
+@dataclass
+class TableState:
+    name: str
+    pk: str
+    pk_type: str
+    estimate: int
+    last_key: Optional[str] = None
+    rows_scanned: int = 0
+    rows_updated: int = 0
+    finished: bool = False
+    # Row of migration_meta.backfill_checkpoint tracking this table (the table name unless scoped)
+    checkpoint: Optional[str] = None
+
+    def __post_init__(self):
+        if self.checkpoint is None:
+            self.checkpoint = self.name
+
+
+def _chunk_sql(state: TableState) -> sql.Composed:
+    """Update one keyset chunk and advance the checkpoint; returns (last key, rows scanned, rows updated).
+
+    The last key is taken by ordering rather than max(): there is no max(uuid).
+    """
+    table, pk = sql.Identifier(state.name), sql.Identifier(state.pk)
+    pk_type = sql.SQL(state.pk_type)
+    if state.name in PARENTS:
+        fk, parent = PARENTS[state.name]
+        value = sql.SQL('coalesce((select p.tenant_id from {parent} p where p.id = t.{fk}), %(tenant)s::uuid)').format(
+            parent=sql.Identifier(parent), fk=sql.Identifier(fk))
+    else:
+        value = sql.SQL('%(tenant)s::uuid')
+    return sql.SQL("""
+with batch as (
+  select {pk} as key from {table}
+  where %(after)s::text is null or {pk} > %(after)s::text::{pk_type}
+  order by {pk}
+  limit %(size)s
+), updated as (
+  update {table} t set tenant_id = {value}
+  from batch b
+  where t.{pk} = b.key and t.tenant_id is null
+  returning 1
+), checkpoint as (
+  insert into migration_meta.backfill_checkpoint as c (table_name, last_key, rows_scanned, rows_updated)
+  select %(table)s, (select key::text from batch order by key desc limit 1), count(*), (select count(*) from updated) from batch
+  having count(*) > 0
+  on conflict (table_name) do update
+    set last_key = excluded.last_key,
+        rows_scanned = c.rows_scanned + excluded.rows_scanned,
+        rows_updated = c.rows_updated + excluded.rows_updated,
+        updated_at = now()
+)
+select (select key::text from batch order by key desc limit 1), (select count(*) from batch), (select count(*) from updated)
+""").format(table=table, pk=pk, pk_type=pk_type, value=value)
+
+
+def ordered(tables: Sequence[str]) -> List[str]:
+    """`tables` with every parent (PARENTS) ahead of its children."""
+    out: List[str] = []
+
+    def visit(name: str) -> None:
+        if name in out:
+            return
+        parent = PARENTS.get(name, (None, None))[1]
+        if parent in tables:
+            visit(parent)
+        out.append(name)
+
+    for name in tables:
+        visit(name)
+    return out
+
+
+def load_states(conn, tables: Sequence[str], scope: Optional[str] = None) -> Dict[str, TableState]:
+    """Backfill state per table; with `scope`, progress is checkpointed as "<scope>:<table>"
+    so it is independent of plain tenant_backfill.py runs."""
+    for statement in CREATE_SQL:
+        conn.execute(statement)
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(TABLES_SQL, (list(tables),))
+        states = {row['name']: TableState(**row, checkpoint=f"{scope}:{row['name']}" if scope else None)
+                  for row in cur.fetchall()}
+        by_checkpoint = {state.checkpoint: state for state in states.values()}
+        cur.execute(CHECKPOINT_SQL)
+        for row in cur.fetchall():
+            state = by_checkpoint.get(row['table_name'])
+            if state is not None:
+                state.last_key = row['last_key']
+                state.rows_scanned = row['rows_scanned']
+                state.rows_updated = row['rows_updated']
+                state.finished = row['finished_at'] is not None
+    conn.commit()
+    return states
+
+
+def _progress(state: TableState, started: float, scanned: int) -> str:
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    total = max(state.estimate, state.rows_scanned)
+    pct = f' ({100 * state.rows_scanned / total:.0f}%)' if total else ''
+    return (f'  {state.name}: {state.rows_scanned:,}/{total:,} rows scanned{pct}, '
+            f'{state.rows_updated:,} updated, {scanned / elapsed:,.0f} rows/s')
+
+
+def backfill_table(conn, state: TableState, tenant: str, batch_size: int, sleep_ms: float,
+                   policy: OnlinePolicy) -> None:
+    statement = _chunk_sql(state)
+    started = time.perf_counter()
+    scanned = 0
+    attempt = 0
+    while True:
+        params = {'after': state.last_key, 'size': batch_size, 'tenant': tenant, 'table': state.checkpoint}
+        try:
+            with conn.pipeline():
+                # Unprepared, so `after is null` folds away and the chunk stays an index range scan
+                cur = conn.execute(statement, params, prepare=False)
+                conn.commit()
+        except psycopg.Error as e:
+            conn.rollback()
+            attempt += 1
+            if getattr(e, 'sqlstate', None) not in RETRY_SQLSTATES or attempt >= policy.attempts:
+                raise
+            time.sleep(policy.backoff(attempt))
+            continue
+        attempt = 0
+        last_key, rows, updated = cur.fetchone()
+        if not rows:
+            break
+        state.last_key = last_key
+        state.rows_scanned += rows
+        state.rows_updated += updated
+        scanned += rows
+        print('\r' + _progress(state, started, scanned), end='', flush=True)
+        if sleep_ms:
+            time.sleep(sleep_ms / 1000.0)
+
+    with conn.pipeline():
+        conn.execute(FINISH_SQL, (state.checkpoint,))
+        conn.execute(sql.SQL('analyze {}').format(sql.Identifier(state.name)))
+        conn.commit()
+    state.finished = True
+    print('\r' + _progress(state, started, scanned) + ', analyzed')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill tenant_id in primary-key chunks, resumably.')
+    parser.add_argument('tables', nargs='*', help=f'Tables to backfill (default: all {len(TABLES)} tenant tables)')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT_ID, help='tenant_id for rows without a parent row')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per chunk (one transaction each)')
+    parser.add_argument('--sleep', type=float, default=100.0, metavar='MS', help='Pause between chunks')
+    parser.add_argument('--lock-timeout', type=int, default=OnlinePolicy.lock_timeout_ms, metavar='MS', help='lock_timeout per chunk; timed-out chunks are retried')
+    parser.add_argument('--restart', action='store_true', help='Forget the checkpoints of the selected tables first')
+    args = parser.parse_args()
+
+    tables = args.tables or TABLES
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    policy = OnlinePolicy(lock_timeout_ms=args.lock_timeout)
+    with psycopg.connect(db_url) as conn:
+        if args.restart:
+            for statement in CREATE_SQL:
+                conn.execute(statement)
+            conn.execute(RESTART_SQL, (list(tables),))
+            conn.commit()
+        states = load_states(conn, tables)
+        missing = [t for t in tables if t not in states]
+        if missing:
+            print(f'Skipping (no tenant_id column or no single-column primary key): {", ".join(missing)}')
+
+        set_lock_timeout(conn, policy)
+        started = time.perf_counter()
+        try:
+            for name in ordered([t for t in tables if t in states]):
+                state = states[name]
+                if state.finished:
+                    print(f'  {name}: already backfilled ({state.rows_updated:,} rows updated)')
+                    continue
+                if state.last_key is not None:
+                    print(f'  {name}: resuming after {state.pk} = {state.last_key}')
+                backfill_table(conn, state, args.tenant, args.batch_size, args.sleep, policy)
+        except KeyboardInterrupt:
+            print('\nInterrupted; rerun to resume from the last committed chunk.')
+            sys.exit(130)
+        finally:
+            if not conn.closed and not conn.broken:
+                conn.rollback()
+                set_lock_timeout(conn, None)
+
+    updated = sum(s.rows_updated for s in states.values())
+    print(f'Backfill complete: {updated:,} rows updated in {time.perf_counter() - started:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
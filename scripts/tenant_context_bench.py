@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark the two tenant context modes of get_current_tenant_id().
+
+tenancy_policies.py defines the helper for one of two modes (see "context" in
+attached_assets/tenancy_spec.json):
+
+    jwt   parses auth.jwt() ->> 'tenant_id' (request.jwt.claims as jsonb) on every call
+    guc   reads current_setting('app.tenant_id', true), set once per request
+
+On the largest RLS-enabled tables (by pg_class estimate), each query in
+rls_profiler.QUERIES is run under EXPLAIN ANALYZE three ways, --runs times
+each, alternating, keeping the median:
+
+    bypass   as --bypass-role (service_role), no policy applied
+    jwt      as authenticated with the tenant JWT claims, helper defined for jwt
+    guc      the same claims plus app.tenant_id, helper defined for guc
+
+The overhead of a mode is its time minus bypass. The helper is redefined
+inside each measured transaction, which is rolled back, so other sessions
+never see a change. The CREATE OR REPLACE does briefly lock the function's
+catalog row, so run this against a staging copy.
+
+With the policies wrapping the helper as (SELECT helper()), it runs once per
+query, so table queries mostly show the per-query difference. `calls`
+evaluates the helper --calls times in one query to get the cost of a single
+call, which is what an unwrapped policy pays for every row.
+
+    python scripts/tenant_context_bench.py
+    python scripts/tenant_context_bench.py --top 3 --runs 9 --json context-bench.json bookings athletes
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from rls_profiler import DEFAULT_TENANT_ID, QUERIES, claims, explain_as
+from tenancy_policies import CONTEXT_MODES, SPEC_PATH, helper_sql, load_spec
+
+SIDES = ('bypass',) + CONTEXT_MODES
+
+# Largest RLS-enabled tables with their own tenant_id column
+TABLES_SQL = """
+select c.relname as name, greatest(c.reltuples, 0)::bigint as estimate
+from pg_class c
+join pg_namespace n on n.oid = c.relnamespace
+where n.nspname = 'public' and c.relkind in ('r', 'p') and c.relrowsecurity
+  and exists (select 1 from pg_attribute a where a.attrelid = c.oid and a.attname = 'tenant_id' and not a.attisdropped)
+  and (%(tables)s::text[] is null or c.relname = any(%(tables)s))
+order by c.reltuples desc, c.relname
+limit %(limit)s
+"""
+
+
+@dataclass
+class QueryBench:
+    table: str
+    query: str
+    # side (bypass, jwt, guc) -> median execution ms / rows returned
+    ms: Dict[str, float] = field(default_factory=dict)
+    rows: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def overhead_ms(self, mode: str) -> float:
+        return self.ms[mode] - self.ms['bypass']
+
+
+class ContextBench:
+    def __init__(self, conn, helper: str, setting: str, tenant: str, bypass_role: str,
+                 runs: int, timeout_ms: int):
+        self.conn = conn
+        self.helper = helper
+        self.setting = setting
+        self.tenant = tenant
+        self.bypass_role = bypass_role
+        self.runs = runs
+        self.timeout_ms = timeout_ms
+        self.jwt = claims(tenant)
+
+    def _setup(self, mode: str) -> List:
+        # Fail fast rather than queue behind a session holding the function's row
+        setup = [("select set_config('lock_timeout', '2s', true)", None),
+                 (helper_sql(self.helper, mode, self.setting), None)]
+        if mode == 'guc':
+            setup.append(('select set_config(%s, %s, true)', (self.setting, self.tenant)))
+        return setup
+
+    def _run(self, side: str, query: sql.Composable):
+        if side == 'bypass':
+            return explain_as(self.conn, query, self.bypass_role, None, self.timeout_ms, False)
+        return explain_as(self.conn, query, 'authenticated', self.jwt, self.timeout_ms, False, self._setup(side))
+
+    def measure(self, table: str, name: str, query: sql.Composable, sides: Sequence[str] = SIDES) -> QueryBench:
+        bench = QueryBench(table, name)
+        samples: Dict[str, List[float]] = {side: [] for side in sides}
+        try:
+            for _ in range(self.runs):
+                # Alternate so cache warm-up doesn't favour one side
+                for side in sides:
+                    m = self._run(side, query)
+                    samples[side].append(m.execution_ms)
+                    bench.rows[side] = m.rows
+        except psycopg.Error as e:
+            if not self.conn.closed:
+                self.conn.rollback()
+            bench.error = (str(e).strip() or type(e).__name__).splitlines()[0]
+            return bench
+        bench.ms = {side: statistics.median(values) for side, values in samples.items()}
+        return bench
+
+    def tables(self, tables: Optional[Sequence[str]], limit: int) -> List[str]:
+        with self.conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(TABLES_SQL, {'tables': list(tables) if tables else None, 'limit': limit})
+            names = [row['name'] for row in cur.fetchall()]
+        self.conn.commit()
+        return names
+
+    def call_cost(self, calls: int) -> QueryBench:
+        query = sql.SQL('select count({helper}()) from generate_series(1, {calls})').format(
+            helper=sql.Identifier(*self.helper.split('.')), calls=sql.Literal(calls))
+        return self.measure('', 'calls', query, CONTEXT_MODES)
+
+
+def print_report(results: Sequence[QueryBench], call: QueryBench, calls: int) -> None:
+    print(f'{"table":<28} {"query":<6} {"bypass ms":>9} {"jwt ms":>9} {"+jwt":>8} {"guc ms":>9} {"+guc":>8} {"rows":>9}')
+    label = None
+    for r in results:
+        shown = r.table if r.table != label else ''
+        label = r.table
+        if r.error:
+            print(f'{shown:<28} {r.query:<6} ERROR {r.error}')
+            continue
+        rows = f'{r.rows["guc"]}' + ('' if r.rows['jwt'] == r.rows['guc'] else f' != {r.rows["jwt"]}')
+        print(f'{shown:<28} {r.query:<6} {r.ms["bypass"]:9.2f} {r.ms["jwt"]:9.2f} {r.overhead_ms("jwt"):+8.2f} '
+              f'{r.ms["guc"]:9.2f} {r.overhead_ms("guc"):+8.2f} {rows:>9}')
+
+    if call.error:
+        print(f'helper call cost: ERROR {call.error}')
+    else:
+        per_call = {mode: 1000.0 * call.ms[mode] / calls for mode in CONTEXT_MODES}
+        print(f'helper call cost ({calls:,} calls): jwt {per_call["jwt"]:.2f} us, guc {per_call["guc"]:.2f} us per call')
+
+    ok = [r for r in results if r.error is None]
+    if ok:
+        total = {mode: sum(r.overhead_ms(mode) for r in ok) for mode in CONTEXT_MODES}
+        faster = min(CONTEXT_MODES, key=lambda mode: total[mode])
+        print(f'Total RLS overhead over {len(ok)} queries: jwt {total["jwt"]:+.2f} ms, guc {total["guc"]:+.2f} ms; '
+              f'faster: {faster} ("context": "{faster}" in attached_assets/tenancy_spec.json)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the JWT and setting-based tenant context modes of the RLS helper.')
+    parser.add_argument('tables', nargs='*', help='Limit to these tables')
+    parser.add_argument('--spec', default=SPEC_PATH, help='Tenancy spec naming the helper and setting')
+    parser.add_argument('--top', type=int, default=5, help='Number of largest tables benchmarked')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT_ID, help='tenant_id of the simulated request')
+    parser.add_argument('--bypass-role', default='service_role', help='BYPASSRLS role used for the baseline')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per side; the median is reported')
+    parser.add_argument('--calls', type=int, default=100000, help='Helper calls in the per-call measurement')
+    parser.add_argument('--timeout', type=int, default=30000, metavar='MS', help='statement_timeout per query')
+    parser.add_argument('--json', metavar='PATH', help='Write every measurement as JSON')
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    with psycopg.connect(db_url) as conn:
+        bench = ContextBench(conn, spec.get('helper', 'get_current_tenant_id'), spec.get('setting', 'app.tenant_id'),
+                             args.tenant, args.bypass_role, args.runs, args.timeout)
+        tables = bench.tables(args.tables or None, args.top)
+        if not tables:
+            print('No RLS-enabled tables with a tenant_id column found.')
+            return
+        results = [bench.measure(table, name, sql.SQL(template).format(table=sql.Identifier(table)))
+                   for table in tables for name, template in QUERIES.items()]
+        call = bench.call_cost(args.calls)
+
+    print_report(results, call, args.calls)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'queries': [asdict(r) for r in results], 'calls': dict(asdict(call), count=args.calls)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
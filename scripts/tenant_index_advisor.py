@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Find RLS-protected tables that no index serves for the tenant predicate, and propose indexes for them.
+
+Every query on a tenant-isolated table gets `tenant_id = (SELECT
+get_current_tenant_id())` from its policy. A btree index can only use that
+predicate if tenant_id is its leading column. This reads pg_class, pg_index,
+pg_constraint and pg_stats, and flags each RLS-enabled table in public that
+has a tenant_id column but no valid, non-partial index leading with it.
+
+For a flagged table, it proposes composite indexes (tenant_id, ...) matching
+the columns the table is already filtered and sorted by:
+
+    index    the key columns of each existing index, prefixed with tenant_id
+             (the old index then only serves queries that skip RLS)
+    fk       single-column foreign keys with no index of their own
+    sort     when neither applies: the date/timestamp column most correlated
+             with the physical row order (a created_at-style sort key), or
+             else the primary key, so keyset pagination stays an index range scan
+
+Proposals whose columns are a prefix of another proposal are dropped. Each
+comes as CREATE INDEX CONCURRENTLY IF NOT EXISTS with its estimated size:
+rows x (index tuple header + the pg_stats average widths, MAXALIGNed) at the
+default 90% leaf fillfactor. Tables are listed largest first. Tables with
+RLS but no tenant_id column isolate through an EXISTS policy and are listed
+for denormalize_tenant_policies.py instead.
+
+    python scripts/tenant_index_advisor.py
+    python scripts/tenant_index_advisor.py --out migrations/add-tenant-indexes.sql bookings athletes events availability
+    python scripts/migration_runner.py --online migrations/add-tenant-indexes.sql
+"""
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+TENANT_COLUMN = 'tenant_id'
+
+# btree leaf page: 8 kB minus page header and btree special space, filled to the default 90%
+PAGE_BYTES = 8192
+LEAF_BYTES = (PAGE_BYTES - 24 - 16) * 0.90
+# IndexTupleData header plus its line pointer
+TUPLE_OVERHEAD = 8 + 4
+# Internal pages and the metapage, roughly
+UPPER_LEVEL_FACTOR = 1.01
+
+TEMPORAL_TYPES = ('date', 'timestamp without time zone', 'timestamp with time zone')
+
+TABLES_SQL = """
+select c.relname as name, greatest(c.reltuples, 0)::bigint as rows, pg_table_size(c.oid) as table_bytes,
+       exists (select 1 from pg_attribute a where a.attrelid = c.oid and a.attname = %(column)s and not a.attisdropped) as has_tenant
+from pg_class c
+join pg_namespace n on n.oid = c.relnamespace
+where n.nspname = 'public' and c.relkind in ('r', 'p') and c.relrowsecurity
+  and (%(tables)s::text[] is null or c.relname = any(%(tables)s))
+order by c.reltuples desc, c.relname
+"""
+
+# Key columns in order; expression columns come back as NULL
+INDEXES_SQL = """
+select t.relname as table_name, ic.relname as name, i.indisunique as is_unique, i.indisprimary as is_primary,
+       i.indpred is not null as partial, i.indisvalid as valid, pg_relation_size(ic.oid) as bytes,
+       array(select a.attname::text
+             from unnest(i.indkey::int2[]) with ordinality k(attnum, ord)
+             left join pg_attribute a on a.attrelid = i.indrelid and a.attnum = k.attnum
+             where k.ord <= i.indnkeyatts
+             order by k.ord) as columns
+from pg_index i
+join pg_class t on t.oid = i.indrelid
+join pg_class ic on ic.oid = i.indexrelid
+join pg_namespace n on n.oid = t.relnamespace
+where n.nspname = 'public' and t.relname = any(%s) and ic.relam = (select oid from pg_am where amname = 'btree')
+order by t.relname, ic.relname
+"""
+
+FOREIGN_KEYS_SQL = """
+select t.relname as table_name, a.attname as column_name
+from pg_constraint con
+join pg_class t on t.oid = con.conrelid
+join pg_namespace n on n.oid = t.relnamespace
+join pg_attribute a on a.attrelid = con.conrelid and a.attnum = con.conkey[1]
+where n.nspname = 'public' and con.contype = 'f' and cardinality(con.conkey) = 1 and t.relname = any(%s)
+"""
+
+COLUMNS_SQL = """
+select c.relname as table_name, a.attname as name, format_type(a.atttypid, a.atttypmod) as type, t.typlen,
+       s.null_frac, s.avg_width, s.n_distinct, s.correlation
+from pg_attribute a
+join pg_class c on c.oid = a.attrelid
+join pg_namespace n on n.oid = c.relnamespace
+join pg_type t on t.oid = a.atttypid
+left join pg_stats s on s.schemaname = n.nspname and s.tablename = c.relname and s.attname = a.attname
+where n.nspname = 'public' and c.relname = any(%s) and a.attnum > 0 and not a.attisdropped
+order by c.relname, a.attnum
+"""
+
+
+@dataclass
+class Column:
+    name: str
+    type: str
+    typlen: int
+    null_frac: Optional[float] = None
+    avg_width: Optional[int] = None
+    n_distinct: Optional[float] = None
+    correlation: Optional[float] = None
+
+    def width(self) -> int:
+        if self.avg_width is not None:
+            return self.avg_width
+        return self.typlen if self.typlen > 0 else 32
+
+
+@dataclass
+class Index:
+    name: str
+    columns: List[Optional[str]]
+    is_unique: bool
+    is_primary: bool
+    partial: bool
+    valid: bool
+    bytes: int
+
+    @property
+    def serves_tenant(self) -> bool:
+        return self.valid and not self.partial and bool(self.columns) and self.columns[0] == TENANT_COLUMN
+
+
+@dataclass
+class Proposal:
+    table: str
+    columns: Tuple[str, ...]
+    reason: str
+    est_bytes: int
+
+    @property
+    def name(self) -> str:
+        name = f"{self.table}_{'_'.join(self.columns)}_idx"
+        return name if len(name) <= 63 else name[:59] + '_idx'
+
+    def sql(self) -> str:
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} ({', '.join(self.columns)});"
+
+
+@dataclass
+class TableAdvice:
+    table: str
+    rows: int
+    table_bytes: int
+    has_tenant: bool
+    tenants: Optional[int] = None
+    indexes: List[Index] = field(default_factory=list)
+    proposals: List[Proposal] = field(default_factory=list)
+
+    @property
+    def flagged(self) -> bool:
+        return self.has_tenant and not any(i.serves_tenant for i in self.indexes)
+
+
+def distinct_values(column: Column, rows: int) -> Optional[int]:
+    """pg_stats n_distinct as a count; negative values are a fraction of the rows."""
+    if column.n_distinct is None:
+        return None
+    if column.n_distinct < 0:
+        return max(1, round(-column.n_distinct * rows))
+    return round(column.n_distinct)
+
+
+def _maxalign(n: float) -> int:
+    return int((n + 7) // 8 * 8)
+
+
+def index_bytes(rows: int, columns: Sequence[Column]) -> int:
+    """Estimated size of a fresh btree on `columns` over `rows` rows."""
+    per_tuple = TUPLE_OVERHEAD + _maxalign(sum(c.width() for c in columns))
+    leaf_pages = max(1, -(-int(rows * per_tuple) // int(LEAF_BYTES)))
+    return int(leaf_pages * UPPER_LEVEL_FACTOR + 1) * PAGE_BYTES
+
+
+def sort_column(columns: Dict[str, Column], pk: Optional[Sequence[str]]) -> Optional[Tuple[str, str]]:
+    temporal = [c for c in columns.values() if c.type in TEMPORAL_TYPES]
+    if temporal:
+        best = max(temporal, key=lambda c: (abs(c.correlation or 0.0), c.name == 'created_at'))
+        return best.name, f'sort column {best.name}'
+    if pk and len(pk) == 1 and pk[0] != TENANT_COLUMN:
+        return pk[0], f'primary key {pk[0]} (keyset pagination)'
+    return None
+
+
+def propose(advice: TableAdvice, columns: Dict[str, Column], foreign_keys: Sequence[str]) -> List[Proposal]:
+    candidates: List[Tuple[Tuple[str, ...], str]] = []
+    pk: Optional[List[str]] = None
+    indexed_leads = set()
+    for index in advice.indexes:
+        if index.is_primary:
+            pk = [c for c in index.columns if c]
+        if not index.valid or not index.columns or index.columns[0] is None:
+            continue
+        indexed_leads.add(index.columns[0])
+        if index.is_primary or None in index.columns:
+            continue
+        rest = tuple(c for c in index.columns if c != TENANT_COLUMN)
+        if rest:
+            keep = ' (keep it: unique)' if index.is_unique else ''
+            candidates.append((rest, f'filter/sort columns of {index.name}{keep}'))
+    for fk in foreign_keys:
+        if fk != TENANT_COLUMN and fk not in indexed_leads:
+            candidates.append(((fk,), f'foreign key {fk}, not indexed'))
+    if not candidates:
+        fallback = sort_column(columns, pk)
+        candidates.append(((fallback[0],), fallback[1]) if fallback else ((), 'tenant predicate only'))
+
+    proposals: List[Proposal] = []
+    seen = set()
+    for rest, reason in candidates:
+        key = (TENANT_COLUMN,) + rest
+        if key in seen:
+            continue
+        seen.add(key)
+        # A proposal that is a prefix of a longer one is served by the longer one
+        if any(other[:len(rest)] == rest and len(other) > len(rest) for other, _ in candidates):
+            continue
+        cols = [columns[c] for c in key if c in columns]
+        proposals.append(Proposal(advice.table, key, reason, index_bytes(advice.rows, cols)))
+    return proposals
+
+
+def advise(conn, tables: Optional[Sequence[str]] = None) -> List[TableAdvice]:
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(TABLES_SQL, {'column': TENANT_COLUMN, 'tables': list(tables) if tables else None})
+        advice = {row['name']: TableAdvice(row['name'], row['rows'], row['table_bytes'], row['has_tenant'])
+                  for row in cur.fetchall()}
+        names = list(advice)
+        cur.execute(INDEXES_SQL, (names,))
+        for row in cur.fetchall():
+            table = row.pop('table_name')
+            advice[table].indexes.append(Index(**row))
+        cur.execute(FOREIGN_KEYS_SQL, (names,))
+        foreign_keys: Dict[str, List[str]] = {}
+        for row in cur.fetchall():
+            foreign_keys.setdefault(row['table_name'], []).append(row['column_name'])
+        cur.execute(COLUMNS_SQL, (names,))
+        columns: Dict[str, Dict[str, Column]] = {}
+        for row in cur.fetchall():
+            columns.setdefault(row.pop('table_name'), {})[row['name']] = Column(**row)
+    conn.commit()
+
+    for table in advice.values():
+        tenant = columns.get(table.table, {}).get(TENANT_COLUMN)
+        if tenant is not None:
+            table.tenants = distinct_values(tenant, table.rows)
+        if table.flagged:
+            table.proposals = propose(table, columns.get(table.table, {}), foreign_keys.get(table.table, []))
+    return list(advice.values())
+
+
+def _size(n: float) -> str:
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024.0
+    return f'{n:.1f} GB'
+
+
+def print_report(advice: Sequence[TableAdvice]) -> None:
+    flagged = [a for a in advice if a.flagged]
+    served = [a for a in advice if a.has_tenant and not a.flagged]
+    no_column = [a for a in advice if not a.has_tenant]
+    for a in flagged:
+        tenants = f', {a.tenants} tenant(s) in pg_stats' if a.tenants is not None else ', not analyzed'
+        print(f'{a.table}: {a.rows:,} rows, {_size(a.table_bytes)}{tenants}; no index leads with {TENANT_COLUMN}')
+        for p in a.proposals:
+            print(f'  ({", ".join(p.columns)})  ~{_size(p.est_bytes)}  {p.reason}')
+    if served:
+        print(f'Served by a {TENANT_COLUMN}-leading index: {", ".join(a.table for a in served)}')
+    if no_column:
+        print(f'RLS without a {TENANT_COLUMN} column (EXISTS policies, see denormalize_tenant_policies.py): '
+              f'{", ".join(a.table for a in no_column)}')
+    total = sum(p.est_bytes for a in flagged for p in a.proposals)
+    print(f'{len(flagged)} table(s) flagged, {sum(len(a.proposals) for a in flagged)} index(es) proposed, ~{_size(total)} in total')
+
+
+def script(advice: Sequence[TableAdvice]) -> str:
+    lines = ['-- Tenant-leading indexes proposed by scripts/tenant_index_advisor.py',
+             '-- Apply with: python scripts/migration_runner.py --online <this file>']
+    for a in advice:
+        for p in a.proposals:
+            lines.append(f'\n-- {a.table}: {p.reason}; ~{_size(p.est_bytes)} for {a.rows:,} rows')
+            lines.append(p.sql())
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Propose tenant_id-leading indexes for RLS-protected tables.')
+    parser.add_argument('tables', nargs='*', help='Limit to these tables')
+    parser.add_argument('--out', metavar='PATH', help='Write the CREATE INDEX CONCURRENTLY statements to a migration file')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: DIRECT_DATABASE_URL (or DATABASE_URL) not set in environment.', file=sys.stderr)
+        sys.exit(2)
+
+    with psycopg.connect(db_url) as conn:
+        advice = advise(conn, args.tables or None)
+    if not advice:
+        print('No RLS-enabled tables found.')
+        return
+    print_report(advice)
+    if not any(a.proposals for a in advice):
+        return
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(script(advice))
+        print(f'Wrote {args.out}')
+    else:
+        print()
+        print(script(advice), end='')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import json
 import os
 import sys
@@ -8,56 +9,16 @@ import psycopg
 from psycopg.rows import dict_row
 from dotenv import load_dotenv
 
+from schema_history import HistoryStore
+from schema_snapshot import fetch_snapshot
+from snapshot_file import write_snapshot_file
+
 SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'attached_assets', 'complete_current_schema.txt')
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), '..', 'attached_assets', 'complete_current_schema.snapshot')
 
 def fetch_live_schema(conn) -> Dict:
     """Return complete schema information from the live database"""
-    # Get all tables
-    tables_q = """
-    select table_name 
-    from information_schema.tables 
-    where table_schema = 'public' and table_type = 'BASE TABLE'
-    order by table_name
-    """
-    cur = conn.execute(tables_q)
-    table_rows = cur.fetchall()
-    table_names = [r['table_name'] for r in table_rows]
-    
-    # Get detailed column info for each table
-    columns_q = """
-    select c.table_name,
-           c.column_name,
-           case
-             when c.udt_name = 'hstore' then 'hstore'
-             when c.data_type = 'ARRAY' then 'ARRAY'
-             when c.data_type ilike 'USER-DEFINED' then c.udt_name
-             else c.data_type
-           end as data_type
-    from information_schema.columns c
-    join information_schema.tables t on t.table_name = c.table_name and t.table_schema = c.table_schema
-    where c.table_schema = 'public' and t.table_type = 'BASE TABLE'
-    order by c.table_name, c.ordinal_position
-    """
-    cur = conn.execute(columns_q)
-    column_rows = cur.fetchall()
-    
-    # Group columns by table
-    tables = {}
-    for table_name in table_names:
-        tables[table_name] = {
-            "exists": True,
-            "columns": []
-        }
-    
-    for row in column_rows:
-        tables[row['table_name']]["columns"].append({
-            "column_name": row['column_name'],
-            "data_type": row['data_type']
-        })
-    
-    return {
-        "tables": tables
-    }
+    return fetch_snapshot(conn).to_dict()
 
 def generate_schema_file(schema_data: Dict):
     """Generate the complete schema file content"""
@@ -75,6 +36,11 @@ def generate_schema_file(schema_data: Dict):
     return content
 
 def main():
+    parser = argparse.ArgumentParser(description='Refresh the schema snapshot from the live database.')
+    parser.add_argument('--no-text', action='store_true', help=f'Skip re-exporting the plain-text schema file ({os.path.basename(SCHEMA_PATH)})')
+    parser.add_argument('--no-history', action='store_true', help='Do not record this snapshot in the schema history store')
+    args = parser.parse_args()
+
     load_dotenv()
     db_url = os.getenv('DATABASE_URL') or os.getenv('DIRECT_DATABASE_URL')
     if not db_url:
@@ -86,15 +52,24 @@ def main():
         schema_data = fetch_live_schema(conn)
 
     print(f"Found {len(schema_data['tables'])} tables in the database.")
-    
-    # Generate new schema file content
-    new_content = generate_schema_file(schema_data)
-    
-    # Write to file
-    with open(SCHEMA_PATH, 'w', encoding='utf-8') as f:
-        f.write(new_content)
-    
-    print(f"Updated schema file: {SCHEMA_PATH}")
+
+    if not args.no_text:
+        # Generate new schema file content
+        new_content = generate_schema_file(schema_data)
+
+        # Write to file
+        with open(SCHEMA_PATH, 'w', encoding='utf-8') as f:
+            f.write(new_content)
+
+        print(f"Updated schema file: {SCHEMA_PATH}")
+
+    # Written after the text so its header records the text's checksum
+    write_snapshot_file(SNAPSHOT_PATH, schema_data, None if args.no_text else SCHEMA_PATH)
+    print(f"Updated schema snapshot: {SNAPSHOT_PATH}")
+
+    if not args.no_history:
+        manifest = HistoryStore().record(schema_data)
+        print(f"Recorded schema history snapshot {manifest['taken_at']}")
     print("Schema file now reflects the current database state.")
 
 if __name__ == '__main__':
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Long-running schema watcher driven by DDL event triggers.
+
+Installs `ddl_command_end` / `sql_drop` event triggers that pg_notify the
+names of the public tables each DDL command touched. The watcher keeps an
+in-memory snapshot, re-fetches only the notified tables and reports drift
+against the stored schema snapshot the moment a migration lands. With
+--write it instead patches the stored snapshot for the affected tables.
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import psycopg
+from psycopg.rows import dict_row
+from dotenv import load_dotenv
+
+from check_schema_sync import SNAPSHOT_PATH, compare, load_schema_file
+from schema_snapshot import catalog_hash, fetch_snapshot
+from snapshot_file import write_snapshot_file
+from update_schema_file import SCHEMA_PATH, generate_schema_file
+
+CHANNEL = 'schema_watch'
+
+# pg_notify payloads are capped at 8000 bytes; past this we ask for a full refresh
+MAX_PAYLOAD = 7900
+
+INSTALL_SQL = f"""
+create or replace function public.schema_watch_notify() returns event_trigger
+language plpgsql as $$
+declare
+  obj record;
+  rel oid;
+  tables text[] := '{{}}';
+  refresh_all boolean := false;
+  other boolean := false;
+  payload text;
+begin
+  if tg_event = 'sql_drop' then
+    for obj in select * from pg_event_trigger_dropped_objects() loop
+      if obj.object_type in ('table', 'table column', 'table constraint', 'policy', 'trigger')
+         and obj.address_names[1] = 'public' then
+        tables := array_append(tables, obj.address_names[2]);
+      elsif obj.object_type = 'index' and obj.schema_name = 'public' then
+        -- the parent table is already gone from the catalog
+        refresh_all := true;
+      elsif obj.object_type in ('type', 'function', 'procedure') and obj.schema_name = 'public' then
+        other := true;
+      end if;
+    end loop;
+  else
+    for obj in select * from pg_event_trigger_ddl_commands() loop
+      continue when obj.schema_name is distinct from 'public';
+      rel := case obj.classid
+        when 'pg_class'::regclass then coalesce((select indrelid from pg_index where indexrelid = obj.objid), obj.objid)
+        when 'pg_policy'::regclass then (select polrelid from pg_policy where oid = obj.objid)
+        when 'pg_constraint'::regclass then (select conrelid from pg_constraint where oid = obj.objid)
+        when 'pg_trigger'::regclass then (select tgrelid from pg_trigger where oid = obj.objid)
+      end;
+      other := other or obj.classid in ('pg_type'::regclass, 'pg_proc'::regclass);
+      tables := tables || array(select relname::text from pg_class where oid = rel and relkind in ('r', 'p'));
+    end loop;
+  end if;
+
+  payload := json_build_object(
+    'tables', (select coalesce(json_agg(distinct t), '[]') from unnest(tables) t),
+    'all', refresh_all,
+    'other', other
+  )::text;
+  if length(payload) > {MAX_PAYLOAD} then
+    payload := '{{"tables": [], "all": true, "other": true}}';
+  end if;
+  perform pg_notify('{CHANNEL}', payload);
+end;
+$$;
+
+drop event trigger if exists schema_watch_ddl;
+create event trigger schema_watch_ddl on ddl_command_end execute function public.schema_watch_notify();
+drop event trigger if exists schema_watch_drop;
+create event trigger schema_watch_drop on sql_drop execute function public.schema_watch_notify();
+"""
+
+UNINSTALL_SQL = """
+drop event trigger if exists schema_watch_ddl;
+drop event trigger if exists schema_watch_drop;
+drop function if exists public.schema_watch_notify();
+"""
+
+
+class SchemaWatcher:
+    """Keeps the live snapshot and the drift against the reference in memory."""
+
+    def __init__(self, conn, reference: Dict, write: bool = False, text: bool = False,
+                 state_path: Optional[str] = None):
+        self.conn = conn
+        self.reference = reference
+        self.write = write
+        self.text = text
+        self.state_path = state_path
+        self.live = fetch_snapshot(conn).to_dict()
+        self.problems: List[str] = []
+
+    def live_columns(self) -> Dict[str, List[tuple]]:
+        return {
+            name: [(c['column_name'], c['data_type']) for c in table['columns']]
+            for name, table in self.live['tables'].items()
+        }
+
+    def refresh(self, tables: Optional[Set[str]]) -> None:
+        """Re-fetch `tables` (every table when None) and fold them into the live snapshot."""
+        fresh = fetch_snapshot(self.conn, tables=None if tables is None else sorted(tables)).to_dict()
+        if tables is None:
+            self.live = fresh
+        else:
+            live_fingerprints = self.live['fingerprint']['tables']
+            for name in tables:
+                if name in fresh['tables']:
+                    self.live['tables'][name] = fresh['tables'][name]
+                    live_fingerprints[name] = fresh['fingerprint']['tables'][name]
+                else:
+                    self.live['tables'].pop(name, None)
+                    live_fingerprints.pop(name, None)
+            self.live['fingerprint']['catalog'] = catalog_hash(live_fingerprints)
+            # Enums and functions come back with every snapshot and are cheap to replace
+            self.live['enums'] = fresh['enums']
+            self.live['functions'] = fresh['functions']
+        if self.write:
+            self.write_reference(tables)
+
+    def write_reference(self, tables: Optional[Set[str]]) -> None:
+        """Patch only the affected tables of the stored snapshot and rewrite it."""
+        if tables is None:
+            self.reference = copy.deepcopy(self.live)
+        else:
+            ref_tables = dict(self.reference.get('tables', {}))
+            ref_fingerprints = dict((self.reference.get('fingerprint') or {}).get('tables', {}))
+            live_fingerprints = self.live['fingerprint']['tables']
+            for name in tables:
+                if name in self.live['tables']:
+                    ref_tables[name] = self.live['tables'][name]
+                    ref_fingerprints[name] = live_fingerprints[name]
+                else:
+                    ref_tables.pop(name, None)
+                    ref_fingerprints.pop(name, None)
+            # Untouched tables keep their stored fingerprints, so drift elsewhere stays visible
+            fingerprint = {'catalog': catalog_hash(ref_fingerprints), 'tables': ref_fingerprints}
+            self.reference = {**copy.deepcopy(self.live), 'tables': ref_tables, 'fingerprint': fingerprint}
+        if self.text:
+            with open(SCHEMA_PATH, 'w', encoding='utf-8') as f:
+                f.write(generate_schema_file(self.reference))
+        write_snapshot_file(SNAPSHOT_PATH, self.reference, SCHEMA_PATH if self.text else None)
+
+    def check(self) -> List[str]:
+        self.problems = compare(self.reference, self.live_columns())
+        if self.state_path:
+            state = {'checked_at': time.time(), 'drift': bool(self.problems), 'problems': self.problems}
+            tmp = self.state_path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp, self.state_path)
+        return self.problems
+
+
+def report(problems: List[str], affected: Optional[Set[str]]) -> None:
+    stamp = time.strftime('%H:%M:%S')
+    scope = 'all tables' if affected is None else ', '.join(sorted(affected)) or 'enums/functions'
+    if problems:
+        print(f'[{stamp}] SCHEMA DRIFT DETECTED ({scope}):')
+        for p in problems:
+            print('-', p)
+    else:
+        print(f'[{stamp}] Schema file matches live database ({scope}).')
+    sys.stdout.flush()
+
+
+def collect(listener, debounce: float) -> Tuple[Optional[Set[str]], bool]:
+    """
+    Block for the next notification, then merge any arriving within `debounce`
+    seconds so a multi-statement migration triggers one refresh. Returns the
+    affected tables (None means refresh all) and whether enums/functions changed.
+    """
+    # notifies() generators must not be nested, so drain them one after another
+    notifies = list(listener.notifies(stop_after=1))
+    notifies.extend(listener.notifies(timeout=debounce))
+    payloads = [json.loads(n.payload) for n in notifies]
+    other = any(p.get('other') for p in payloads)
+    if any(p.get('all') for p in payloads):
+        return None, other
+    return {t for p in payloads for t in p.get('tables', [])}, other
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Watch the live database for DDL and report schema drift immediately.')
+    parser.add_argument('--write', action='store_true', help='Rewrite the stored snapshot for affected tables instead of only reporting drift')
+    parser.add_argument('--no-text', action='store_true', help='With --write, do not re-export the plain-text schema file')
+    parser.add_argument('--state-file', help='Keep the current drift state as JSON at this path')
+    parser.add_argument('--debounce', type=float, default=0.5, help='Seconds to batch notifications before refreshing')
+    parser.add_argument('--no-install', action='store_true', help='Assume the event triggers are already installed')
+    parser.add_argument('--uninstall', action='store_true', help='Remove the event triggers and exit')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db_url = os.getenv('DIRECT_DATABASE_URL') or os.getenv('DATABASE_URL')
+    if not db_url:
+        print('ERROR: Neither DIRECT_DATABASE_URL nor DATABASE_URL set in environment.', file=sys.stderr)
+        sys.exit(1)
+
+    # Notifications need a session connection; one for LISTEN, one for catalog queries
+    with psycopg.connect(db_url, autocommit=True) as listener, \
+            psycopg.connect(db_url, autocommit=True, row_factory=dict_row) as conn:
+        if args.uninstall:
+            conn.execute(UNINSTALL_SQL)
+            print('Removed schema watch event triggers.')
+            return
+        if not args.no_install:
+            conn.execute(INSTALL_SQL)
+        listener.execute(f'listen {CHANNEL}')
+
+        watcher = SchemaWatcher(conn, load_schema_file(), write=args.write, text=not args.no_text,
+                                state_path=args.state_file)
+        report(watcher.check(), None)
+        print(f'Listening for DDL on channel "{CHANNEL}" (Ctrl+C to stop)...')
+        sys.stdout.flush()
+
+        try:
+            while True:
+                affected, other = collect(listener, args.debounce)
+                if affected is not None and not affected and not other:
+                    continue
+                watcher.refresh(affected)
+                report(watcher.check(), affected)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()